@@ -0,0 +1,120 @@
+"""
+房间 Actor：每个房间一个信箱，消息与计时器事件按到达顺序逐条处理
+
+各房间的信箱由各自的 asyncio 任务处理，每处理一小批就让出事件循环，
+所以消息刷屏的房间只会拉长自己的队列，其他房间照常轮流推进；信箱有
+上限，超出后不回复直接丢弃，只计入统计，与准入控制的限流一致。游戏
+逻辑都在事件循环线程上执行，不需要加锁；写文件、序列化大对象这类附
+带工作通过 offload 交给线程池。
+"""
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 信箱中的一项：(结果 future 或 None, 函数, 参数)
+Letter = Tuple[Optional[asyncio.Future], Callable, tuple]
+
+
+class ActorSystem:
+    def __init__(self, registry, workers: int = 4, max_pending: int = 200, batch: int = 8):
+        self.registry = registry
+        self.max_pending = max_pending  # 每个信箱最多积压的消息数，计时器事件不受限制
+        self.batch = batch  # 每次占用事件循环处理的条数
+        self.mailboxes: Dict[int, Deque[Letter]] = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xpwolf")
+        self._tasks: Set[asyncio.Task] = set()  # 正在处理信箱的任务，持有引用以免被回收
+        self.dropped = 0  # 信箱已满被丢弃的消息数
+        self.max_depth = 0
+
+    def post(self, group_id: int, fn: Callable, *args, wait: bool = True,
+             force: bool = False) -> Optional[asyncio.Future]:
+        """
+        向房间信箱投递 fn(*args)。wait 为 True 时返回结果 future；信箱满时
+        丢弃并返回结果为 None 的 future，force 为 True（计时器事件）时不受上限限制。
+        """
+        loop = asyncio.get_running_loop()
+        mailbox = self.mailboxes.get(group_id)
+        future = loop.create_future() if wait else None
+        if mailbox is not None and len(mailbox) >= self.max_pending and not force:
+            self.dropped += 1
+            if future is not None:
+                future.set_result(None)
+            return future
+        if mailbox is None:
+            mailbox = self.mailboxes[group_id] = deque()
+            task = loop.create_task(self._drain(group_id, mailbox))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        mailbox.append((future, fn, args))
+        self.max_depth = max(self.max_depth, len(mailbox))
+        return future
+
+    async def _drain(self, group_id: int, mailbox: Deque[Letter]):
+        """处理信箱直到清空；信箱清空即删除，下次投递时重新启动"""
+        try:
+            while mailbox:
+                for _ in range(min(self.batch, len(mailbox))):
+                    future, fn, args = mailbox.popleft()
+                    if future is not None and future.cancelled():
+                        continue
+                    try:
+                        result = fn(*args)
+                    except Exception as e:
+                        if future is None:
+                            logger.exception("房间 %s 处理事件出错", group_id)
+                        else:
+                            future.set_exception(e)
+                        continue
+                    if future is not None:
+                        future.set_result(result)
+                # 让出事件循环，其他房间轮流处理
+                await asyncio.sleep(0)
+        finally:
+            if self.mailboxes.get(group_id) is mailbox:
+                del self.mailboxes[group_id]
+
+    async def handle_message(self, user_id: int, message: str, is_private: bool = False,
+                             group_id: Optional[int] = None) -> Optional[str]:
+        """把消息投递到所属房间的信箱并等待回复"""
+        # 普通聊天不进信箱
+        if not message.startswith("#"):
+            return None
+        target = self.registry.room_of(user_id) if is_private else group_id
+        if target is None:
+            return self.registry.handle_message(user_id, message, is_private, group_id)
+        return await self.post(target, self.registry.handle_message, user_id, message, is_private, group_id)
+
+    def retarget(self, group_id: int, rebind: Callable[[Callable], Optional[Callable]]) -> int:
+        """
+        热更新换掉房间对象后，把信箱中待处理的事件改为 rebind(fn)；rebind
+        返回 None 的事件（新代码已没有对应方法）丢弃。返回丢弃的条数。
+        """
+        mailbox = self.mailboxes.get(group_id)
+        if not mailbox:
+            return 0
+        letters = []
+        for future, fn, args in mailbox:
+            fn = rebind(fn)
+            if fn is not None:
+                letters.append((future, fn, args))
+            elif future is not None:
+                future.cancel()
+        dropped = len(mailbox) - len(letters)
+        # 原地替换，正在处理该信箱的任务继续使用同一个 deque
+        mailbox.clear()
+        mailbox.extend(letters)
+        return dropped
+
+    def depth(self) -> int:
+        return sum(len(mailbox) for mailbox in self.mailboxes.values())
+
+    async def offload(self, fn: Callable, *args):
+        """在线程池中执行与房间状态无关的附带工作"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
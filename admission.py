@@ -0,0 +1,111 @@
+"""
+准入控制：在分发命令之前按玩家和房间限流，并合并重复的查询
+
+每名玩家两个令牌桶，只读查询和推进游戏的命令各用一个，超出的命令直接
+丢弃、不回复，刷查询不会耗光投票、描述这些命令的额度。只读查询在短时间
+内重复发送时，如果房间状态没有变化，回复与上一次相同，也直接丢弃；其余
+只读查询再经过房间的令牌桶。推进游戏的命令不受房间限流，别人刷屏时
+不会误伤正常对局。桶和去重记录都按需创建，定期清理已经回满或过期的项。
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 丢弃原因
+THROTTLED_USER = "user"
+THROTTLED_ROOM = "room"
+DEDUPED = "dedupe"
+
+
+def take(buckets: Dict[int, List[float]], key: int, rate: float, burst: int, now: float) -> bool:
+    """从 key 的令牌桶取一个令牌，桶为 [令牌数, 更新时间]"""
+    bucket = buckets.get(key)
+    if bucket is None:
+        buckets[key] = [burst - 1.0, now]
+        return True
+    tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if tokens < 1:
+        bucket[0] = tokens
+        return False
+    bucket[0] = tokens - 1
+    return True
+
+
+class Admission:
+    def __init__(self, read_only: Iterable[str], shared: Iterable[str] = (),
+                 user_rate: float = 1.0, user_burst: int = 8,
+                 action_rate: float = 2.0, action_burst: int = 20,
+                 room_rate: float = 5.0, room_burst: int = 20,
+                 dedupe_window: float = 3.0, prune_interval: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.read_only = tuple(read_only)  # 只读命令，参与去重
+        self.shared = tuple(shared)  # 回复与发送者无关的只读命令，同一房间内不分发送者去重
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.action_rate = action_rate  # 推进游戏的命令单独限流，额度更宽
+        self.action_burst = action_burst
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        self.dedupe_window = dedupe_window
+        self.prune_interval = prune_interval
+        self.clock = clock
+        self.users: Dict[int, List[float]] = {}
+        self.actions: Dict[int, List[float]] = {}
+        self.rooms: Dict[int, List[float]] = {}
+        # {(群号, QQ号或0, 消息, 房间版本): 时间}，按时间先后排列
+        self.recent: "OrderedDict[Tuple[int, int, str, int], float]" = OrderedDict()
+        self.admitted = 0
+        self.dropped: Dict[str, int] = {THROTTLED_USER: 0, THROTTLED_ROOM: 0, DEDUPED: 0}
+        self._next_prune = clock() + prune_interval
+
+    def admit(self, user_id: int, group_id: int, message: str, is_private: bool, version: int) -> bool:
+        """
+        是否放行。version 为房间状态的版本号，状态变化后重复的查询不再
+        视为重复。
+        """
+        now = self.clock()
+        if now >= self._next_prune:
+            self.prune(now)
+        read_only = message.startswith(self.read_only)
+        if read_only:
+            allowed = take(self.users, user_id, self.user_rate, self.user_burst, now)
+        else:
+            allowed = take(self.actions, user_id, self.action_rate, self.action_burst, now)
+        if not allowed:
+            self.dropped[THROTTLED_USER] += 1
+            return False
+        if read_only:
+            sender = 0 if not is_private and message.startswith(self.shared) else user_id
+            key = (group_id, sender, message, version)
+            seen = self.recent.get(key)
+            if seen is not None and now - seen < self.dedupe_window:
+                self.dropped[DEDUPED] += 1
+                return False
+            if not take(self.rooms, group_id, self.room_rate, self.room_burst, now):
+                self.dropped[THROTTLED_ROOM] += 1
+                return False
+            self.recent[key] = now
+            self.recent.move_to_end(key)
+        self.admitted += 1
+        return True
+
+    def prune(self, now: float):
+        """清理已回满的令牌桶和过期的去重记录"""
+        self._next_prune = now + self.prune_interval
+        for buckets, rate, burst in ((self.users, self.user_rate, self.user_burst),
+                                     (self.actions, self.action_rate, self.action_burst),
+                                     (self.rooms, self.room_rate, self.room_burst)):
+            full = [key for key, (tokens, updated) in buckets.items() if tokens + (now - updated) * rate >= burst]
+            for key in full:
+                del buckets[key]
+        recent = self.recent
+        while recent:
+            key, seen = next(iter(recent.items()))
+            if now - seen < self.dedupe_window:
+                break
+            del recent[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"admitted": self.admitted, **self.dropped,
+                "tracked_users": len(self.users.keys() | self.actions.keys())}
@@ -0,0 +1,336 @@
+"""
+XP 档案：保存历次对局公开过的 XP，按字单元和二元组建倒排索引
+
+XP 多是几个字的中文短串，不分词，直接按字和相邻两字建索引，另外每个
+群一张倒排表。查询时在查询串的二元组（单字查询用单字）和所在群中取
+最稀有的一项，沿它的倒排表从新到旧逐条核对，凑够条数即停。
+
+档案记录追加写入 entries.jsonl；倒排表定期压缩成段文件，段文件按
+映射到内存的方式读取，倒排表不占 Python 对象。段文件之后新增的记录
+只建内存索引，攒够一定数量再在线程池中重建段文件。
+
+段文件格式（本机字节序）：
+  8 字节魔数 b"XPIX0001" | uint32 记录数 | uint32 词表长度 |
+  词表 JSON {gram: [起始位置, 长度]} | 补齐到 4 字节 | uint32 倒排表
+"""
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+import unicodedata
+from array import array
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+MAGIC = b"XPIX0001"
+HEADER = struct.Struct("=8sII")
+ENTRIES_FILE = "entries.jsonl"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".bin"
+
+logger = logging.getLogger(__name__)
+
+# (时间, 群号, QQ号, XP)
+Entry = Tuple[float, int, int, str]
+
+
+def normalize(text: str) -> str:
+    """全半角统一、转小写，去掉空白和标点"""
+    return "".join(ch for ch in unicodedata.normalize("NFKC", text).lower() if ch.isalnum())
+
+
+def bigrams(norm: str) -> Set[str]:
+    """相邻两字；只有一个字时为该字本身"""
+    if len(norm) < 2:
+        return {norm} if norm else set()
+    return {norm[i:i + 2] for i in range(len(norm) - 1)}
+
+
+def group_key(group_id: int) -> str:
+    """群的倒排表键，以控制字符开头，不会与规范化后的文本冲突"""
+    return f"\0{group_id}"
+
+
+def index_keys(norm: str, group_id: int) -> Set[str]:
+    """一条记录的全部索引键：单字、二元组与所在群"""
+    keys = set(norm) | bigrams(norm)
+    keys.add(group_key(group_id))
+    return keys
+
+
+class Segment:
+    """映射到内存的段文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.docs, table_length = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f"不是 XP 档案段文件: {path}")
+        start = HEADER.size
+        self.table: Dict[str, List[int]] = json.loads(self.mm[start:start + table_length].decode("utf-8"))
+        start += table_length
+        start += -start % 4
+        self.raw = memoryview(self.mm)
+        self.postings = self.raw[start:].cast("I")
+
+    def count(self, gram: str) -> int:
+        entry = self.table.get(gram)
+        return entry[1] if entry else 0
+
+    def newest_first(self, gram: str) -> Iterator[int]:
+        entry = self.table.get(gram)
+        if entry:
+            postings = self.postings
+            offset, length = entry
+            for i in range(offset + length - 1, offset - 1, -1):
+                yield postings[i]
+
+    def close(self):
+        self.postings.release()
+        self.raw.release()
+        self.mm.close()
+
+    @staticmethod
+    def build(path: str, norms: List[str], groups: List[int]):
+        """为前 len(norms) 条记录写段文件，先写临时文件再改名"""
+        lists: Dict[str, array] = {}
+        for doc, norm in enumerate(norms):
+            for gram in index_keys(norm, groups[doc]):
+                postings = lists.get(gram)
+                if postings is None:
+                    postings = lists[gram] = array("I")
+                postings.append(doc)
+        table = {}
+        offset = 0
+        for gram, postings in lists.items():
+            table[gram] = [offset, len(postings)]
+            offset += len(postings)
+        table_bytes = json.dumps(table, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(norms), len(table_bytes)))
+            f.write(table_bytes)
+            f.write(b"\0" * (-(HEADER.size + len(table_bytes)) % 4))
+            for postings in lists.values():
+                postings.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+class XPArchive:
+    def __init__(self, directory: str, compact_every: int = 5000, flush_interval: float = 1.0):
+        self.directory = directory
+        self.compact_every = compact_every  # 内存索引攒够多少条重建段文件
+        self.flush_interval = flush_interval
+        self.entries: List[Entry] = []
+        self.norms: List[str] = []
+        self.segment: Optional[Segment] = None
+        self.delta: Dict[str, List[int]] = {}  # 段文件之后新增记录的内存倒排表
+        self.pending: List[str] = []  # 尚未写入 entries.jsonl 的行
+        self.compacting = False
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    # ---------- 加载与写入 ----------
+
+    def load(self):
+        path = os.path.join(self.directory, ENTRIES_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        when, group_id, user_id, xp = json.loads(line)
+                    except ValueError:
+                        break  # 崩溃时写了一半的最后一行
+                    self.entries.append((when, group_id, user_id, xp))
+                    self.norms.append(normalize(xp))
+
+        # 取记录数不超过现有记录的最新段文件，其余的删除
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                docs = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+                if docs.isdigit():
+                    segments.append((int(docs), name))
+        for docs, name in sorted(segments, reverse=True):
+            path = os.path.join(self.directory, name)
+            if self.segment is None and docs <= len(self.entries):
+                try:
+                    self.segment = Segment(path)
+                    continue
+                except ValueError:
+                    pass
+            os.remove(path)
+        self.rebuild_delta()
+
+    def rebuild_delta(self):
+        self.delta = {}
+        for doc in range(self.indexed, len(self.norms)):
+            self.index_delta(doc)
+
+    def index_delta(self, doc: int):
+        for gram in index_keys(self.norms[doc], self.entries[doc][1]):
+            postings = self.delta.get(gram)
+            if postings is None:
+                postings = self.delta[gram] = []
+            postings.append(doc)
+
+    @property
+    def indexed(self) -> int:
+        """段文件覆盖的记录数"""
+        return self.segment.docs if self.segment is not None else 0
+
+    def add(self, group_id: int, user_id: int, xp: str):
+        """收录一条公开的 XP"""
+        norm = normalize(xp)
+        if not norm:
+            return
+        entry = (round(time.time(), 3), group_id, user_id, xp)
+        self.entries.append(entry)
+        self.norms.append(norm)
+        self.index_delta(len(self.norms) - 1)
+        self.pending.append(json.dumps(entry, ensure_ascii=False))
+
+    def take_pending(self) -> List[str]:
+        pending, self.pending = self.pending, []
+        return pending
+
+    def write_entries(self, lines: List[str]):
+        if lines:
+            with open(os.path.join(self.directory, ENTRIES_FILE), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def segment_path(self, docs: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{docs}{SEGMENT_SUFFIX}")
+
+    def swap_segment(self, docs: int):
+        """换用新建好的段文件，旧段文件关闭并删除"""
+        old = self.segment
+        self.segment = Segment(self.segment_path(docs))
+        self.rebuild_delta()
+        if old is not None:
+            old.close()
+            if old.path != self.segment.path:
+                os.remove(old.path)
+
+    def compact(self):
+        """同步重建段文件，覆盖当前全部记录"""
+        docs = len(self.norms)
+        if docs == self.indexed:
+            return
+        Segment.build(self.segment_path(docs), self.norms[:docs], [entry[1] for entry in self.entries[:docs]])
+        self.swap_segment(docs)
+
+    def flush(self):
+        self.write_entries(self.take_pending())
+
+    async def run(self):
+        """定期在线程池中追加记录；内存索引够多时重建段文件"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            lines = self.take_pending()
+            if lines:
+                try:
+                    await loop.run_in_executor(None, self.write_entries, lines)
+                except Exception:
+                    logger.exception("写入 XP 档案失败，丢弃 %d 条记录", len(lines))
+            docs = len(self.norms)
+            if docs - self.indexed >= self.compact_every:
+                groups = [entry[1] for entry in self.entries[:docs]]
+                try:
+                    await loop.run_in_executor(None, Segment.build, self.segment_path(docs), self.norms[:docs], groups)
+                except Exception:
+                    # 内存索引照常可查，下一轮再重建
+                    logger.exception("重建 XP 索引段失败")
+                else:
+                    self.swap_segment(docs)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+    def close(self):
+        self.stop()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    # ---------- 查询 ----------
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def count(self, gram: str) -> int:
+        postings = self.delta.get(gram)
+        return (len(postings) if postings else 0) + (self.segment.count(gram) if self.segment else 0)
+
+    def newest_first(self, gram: str) -> Iterator[int]:
+        postings = self.delta.get(gram)
+        if postings:
+            yield from reversed(postings)
+        if self.segment is not None:
+            yield from self.segment.newest_first(gram)
+
+    def search(self, query: str, group_id: Optional[int] = None, limit: int = 10) -> List[Entry]:
+        """包含 query 的记录，从新到旧；group_id 不为 None 时只查该群"""
+        norm = normalize(query)
+        if not norm:
+            return []
+        keys = list(bigrams(norm))
+        if group_id is not None:
+            keys.append(group_key(group_id))
+        gram = min(keys, key=self.count)
+        results = []
+        for doc in self.newest_first(gram):
+            entry = self.entries[doc]
+            if (group_id is None or entry[1] == group_id) and norm in self.norms[doc]:
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def similar(self, xp: str, group_id: Optional[int] = None, threshold: float = 0.6,
+                limit: int = 3) -> List[Tuple[float, Entry]]:
+        """
+        与 xp 相似（二元组 Jaccard 系数不低于 threshold）的记录。相似的
+        记录至少包含 xp 最稀有的前 |A| - ceil(threshold*|A|) + 1 个二元组
+        之一，只需沿这几个倒排表取候选；群的倒排表更短时直接用它。
+        """
+        grams = bigrams(normalize(xp))
+        if not grams:
+            return []
+        prefix = len(grams) - math.ceil(threshold * len(grams)) + 1
+        sources = sorted(grams, key=self.count)[:prefix]
+        if group_id is not None and self.count(group_key(group_id)) < sum(map(self.count, sources)):
+            sources = [group_key(group_id)]
+        seen = set()
+        scored = []
+        for gram in sources:
+            for doc in self.newest_first(gram):
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                entry = self.entries[doc]
+                if group_id is not None and entry[1] != group_id:
+                    continue
+                other = bigrams(self.norms[doc])
+                score = len(grams & other) / len(grams | other)
+                if score >= threshold:
+                    scored.append((score, doc))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return [(score, self.entries[doc]) for score, doc in scored[:limit]]
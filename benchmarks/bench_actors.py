@@ -0,0 +1,127 @@
+"""
+房间信箱基准：一个房间刷屏时，其他房间的命令响应延迟
+
+普通房间各自按固定间隔发送一局游戏的命令并等待回复，刷屏房间每隔一段
+时间一次性塞进大量查询命令。分别用房间信箱和全局单队列处理，比较普通
+房间的响应延迟，以及刷屏房间被丢弃的消息数。
+
+用法: python benchmarks/bench_actors.py [--rooms N] [--burst B] [--max-pending M]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from actors import ActorSystem  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+FLOOD_ROOM = 1
+
+
+class GlobalQueue:
+    """对照组：所有房间共用一个先进先出队列"""
+
+    def __init__(self, registry: RoomRegistry, batch: int = 8):
+        self.registry = registry
+        self.batch = batch
+        self.queue = asyncio.Queue()
+        self.dropped = 0
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            future, args = await self.queue.get()
+            future.set_result(self.registry.handle_message(*args))
+            for _ in range(min(self.batch - 1, self.queue.qsize())):
+                future, args = self.queue.get_nowait()
+                future.set_result(self.registry.handle_message(*args))
+            await asyncio.sleep(0)
+
+    def post(self, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((future, args))
+        return future
+
+    async def handle_message(self, user_id, message, is_private=False, group_id=None):
+        return await self.post(user_id, message, is_private, group_id)
+
+    def shutdown(self):
+        self.task.cancel()
+
+
+async def normal_room(system, registry, group_id: int, players: int, interval: float,
+                      latencies: list, stop: asyncio.Event):
+    rnd = random.Random(group_id)
+    base = group_id * 1000
+    while not stop.is_set():
+        room = registry.get_or_create(group_id)
+        for user_id, message, is_private in random_game_messages(room.game, rnd, players, base_qq=base):
+            start = time.perf_counter()
+            await system.handle_message(user_id, message, is_private, None if is_private else group_id)
+            latencies.append(time.perf_counter() - start)
+            if stop.is_set():
+                return
+            await asyncio.sleep(interval)
+
+
+async def flood_room(system, burst: int, period: float, stop: asyncio.Event):
+    await system.handle_message(FLOOD_ROOM * 1000, "#创建游戏副本", group_id=FLOOD_ROOM)
+    pending = []
+    while not stop.is_set():
+        for i in range(burst):
+            pending.append(asyncio.ensure_future(
+                system.handle_message(FLOOD_ROOM * 1000 + i % 50, "#查看状态", group_id=FLOOD_ROOM)))
+        await asyncio.sleep(period)
+    await asyncio.gather(*pending)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(mode: str, args) -> None:
+    game.metrics = None
+    registry = RoomRegistry(game.create_room, max_rooms=args.rooms + 10)
+    if mode == "actors":
+        system = ActorSystem(registry, max_pending=args.max_pending)
+    else:
+        system = GlobalQueue(registry)
+    stop = asyncio.Event()
+    latencies = []
+    tasks = [asyncio.ensure_future(normal_room(system, registry, gid, args.players, args.interval, latencies, stop))
+             for gid in range(FLOOD_ROOM + 1, FLOOD_ROOM + 1 + args.rooms)]
+    if args.burst:
+        tasks.append(asyncio.ensure_future(flood_room(system, args.burst, args.period, stop)))
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    system.shutdown()
+
+    print(f"{mode:>6}: 普通房间 {len(latencies)} 条命令，延迟 p50 {percentile(latencies, 0.5) * 1000:.2f} ms，"
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms，最大 {max(latencies) * 1000:.2f} ms；"
+          f"刷屏消息被丢弃 {system.dropped} 条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=20, help="普通房间数")
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--interval", type=float, default=0.005, help="普通房间两条命令的间隔（秒）")
+    parser.add_argument("--burst", type=int, default=2000, help="刷屏房间每次塞入的消息数，0 为不刷屏")
+    parser.add_argument("--period", type=float, default=0.2, help="刷屏间隔（秒）")
+    parser.add_argument("--max-pending", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    for mode in ("fifo", "actors"):
+        asyncio.run(run(mode, args))
+
+
+if __name__ == "__main__":
+    main()
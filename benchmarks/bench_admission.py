@@ -0,0 +1,104 @@
+"""
+准入控制基准：刷屏玩家混在正常对局中时，进入分发器的命令数与处理耗时
+
+每个房间按固定间隔推进一局随机对局，同时有几名群成员高频发送查询命令。
+用模拟时钟驱动，分别在有无准入控制时处理同一串消息，比较真正交给
+房间处理的命令数、总耗时，以及正常对局的命令是否被误伤。
+
+用法: python benchmarks/bench_admission.py [--rooms N] [--spam R]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from admission import Admission  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+SPAM = ("#存活玩家", "#存活玩家", "#票数", "#我的身份", "#查看状态", "#回顾")
+
+
+def run(args, with_admission: bool):
+    now = [0.0]
+    clock = lambda: now[0]  # noqa: E731
+    admission = Admission(game.READ_ONLY_COMMANDS, game.SHARED_QUERY_COMMANDS, clock=clock) \
+        if with_admission else None
+    registry = RoomRegistry(game.create_room, admission=admission, clock=clock)
+    rnd = random.Random(1)
+    gids = list(range(1, args.rooms + 1))
+    games = {gid: random_game_messages(registry.get_or_create(gid).game, random.Random(gid), args.players,
+                                       base_qq=gid * 1000) for gid in gids}
+    handled = legit = legit_dropped = legit_deduped = spam = 0
+    dispatch = 0.0
+
+    original = game.XPLangBotPlugin.handle_message
+
+    def counting(self, *a):
+        nonlocal handled
+        handled += 1
+        return original(self, *a)
+
+    game.XPLangBotPlugin.handle_message = counting
+    try:
+        start = time.perf_counter()
+        step = args.interval / (1 + args.spam * args.interval)
+        next_legit = 0.0
+        while games:
+            now[0] += step
+            if now[0] >= next_legit:
+                next_legit += args.interval
+                for gid in list(games):
+                    message = next(games[gid], None)
+                    if message is None:
+                        del games[gid]
+                        continue
+                    user_id, text, is_private = message
+                    legit += 1
+                    t = time.perf_counter()
+                    reply = registry.handle_message(user_id, text, is_private, None if is_private else gid)
+                    dispatch += time.perf_counter() - t
+                    if reply is None:
+                        # 与刚刚别人发过的查询相同而被合并的，不算误伤
+                        if text.startswith(tuple(game.SHARED_QUERY_COMMANDS)):
+                            legit_deduped += 1
+                        else:
+                            legit_dropped += 1
+            else:
+                for gid in gids:
+                    spammer = gid * 1000 + 500 + rnd.randrange(args.spammers)
+                    spam += 1
+                    t = time.perf_counter()
+                    registry.handle_message(spammer, rnd.choice(SPAM), False, gid)
+                    dispatch += time.perf_counter() - t
+        elapsed = time.perf_counter() - start
+    finally:
+        game.XPLangBotPlugin.handle_message = original
+
+    label = "开启准入控制" if with_admission else "不限流"
+    print(f"{label}：正常命令 {legit} 条、刷屏 {spam} 条，交给房间处理 {handled} 条，"
+          f"处理耗时 {dispatch * 1000:.0f} ms（总 {elapsed * 1000:.0f} ms），正常命令被丢弃 {legit_dropped} 条、"
+          f"与他人查询合并 {legit_deduped} 条")
+    if admission is not None:
+        print("  " + "，".join(f"{k} {v}" for k, v in admission.stats().items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--interval", type=float, default=0.5, help="每个房间正常命令的间隔（秒）")
+    parser.add_argument("--spam", type=float, default=20.0, help="每个房间每秒的刷屏消息数")
+    parser.add_argument("--spammers", type=int, default=3, help="每个房间刷屏的群成员数（不在对局中）")
+    args = parser.parse_args()
+    game.metrics = None
+    for with_admission in (False, True):
+        run(args, with_admission)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+XP 档案基准：几十万条记录下的建索引耗时、搜索与查重延迟
+
+用常见 XP 词随机拼出记录，写入临时目录并压缩成段文件，然后测量
+重新打开档案、按关键词搜索（全部群 / 单个群）和查重的延迟，并抽样
+与逐条扫描的结果对照。
+
+用法: python benchmarks/bench_archive.py [--entries N] [--queries Q]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archive import XPArchive, normalize  # noqa: E402
+
+WORDS = (
+    "萝莉", "御姐", "黑丝", "白丝", "过膝袜", "女仆", "猫耳", "兽耳", "眼镜", "双马尾", "单马尾", "短发", "长发",
+    "制服", "水手服", "旗袍", "汉服", "JK", "洛丽塔", "哥特", "巫女", "修女", "护士", "教师", "偶像", "体操服",
+    "泳装", "围裙", "吊带", "蝴蝶结", "高跟鞋", "运动鞋", "傲娇", "病娇", "三无", "元气", "腹黑", "天然呆",
+    "青梅竹马", "学姐", "学妹", "人妻", "大小姐", "精灵", "魅魔", "吸血鬼", "机娘", "兽娘", "龙娘", "狐娘",
+    "异色瞳", "虎牙", "雀斑", "麦色皮肤", "白发", "红瞳", "呆毛", "刘海", "泪痣", "绷带", "项圈", "铃铛",
+)
+MODIFIERS = ("", "", "", "超", "有点", "特别", "带", "穿", "的", "配")
+
+
+def random_xp(rnd: random.Random) -> str:
+    parts = []
+    for _ in range(rnd.randint(1, 3)):
+        parts.append(rnd.choice(MODIFIERS) + rnd.choice(WORDS))
+    return "".join(parts)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(q * len(samples)))] / 1000 for q in (0.5, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=300_000)
+    parser.add_argument("--groups", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    directory = tempfile.mkdtemp(prefix="xpwolf_archive_")
+    archive = XPArchive(directory)
+    start = time.perf_counter()
+    for i in range(args.entries):
+        archive.add(rnd.randrange(args.groups), 10000 + rnd.randrange(50_000), random_xp(rnd))
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    archive.flush()
+    archive.compact()
+    compact_time = time.perf_counter() - start
+    segment_size = os.path.getsize(archive.segment.path)
+    archive.close()
+    print(f"收录 {args.entries} 条：{add_time / args.entries * 1e6:.1f} µs/条；"
+          f"写盘并建段文件 {compact_time:.1f} 秒，段文件 {segment_size / 2 ** 20:.1f} MiB")
+
+    start = time.perf_counter()
+    archive = XPArchive(directory)
+    print(f"重新打开档案：{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = []
+    for _ in range(args.queries):
+        word = rnd.choice(WORDS)
+        kind = rnd.random()
+        if kind < 0.2:
+            word = rnd.choice(word)  # 单字
+        elif kind < 0.4:
+            word = word + rnd.choice(WORDS)[0]  # 跨词
+        queries.append(word)
+
+    for label, group in (("全部群", lambda: None), ("单个群", lambda: rnd.randrange(args.groups))):
+        samples = []
+        for query in queries:
+            group_id = group()
+            t = time.perf_counter_ns()
+            archive.search(query, group_id=group_id)
+            samples.append(time.perf_counter_ns() - t)
+        p50, p99 = percentiles(samples)
+        print(f"搜索（{label}）{len(queries)} 次：p50 {p50:.0f} µs，p99 {p99:.0f} µs")
+
+    samples = []
+    for _ in range(args.queries // 5):
+        xp = random_xp(rnd)
+        group_id = rnd.randrange(args.groups)
+        t = time.perf_counter_ns()
+        archive.similar(xp, group_id=group_id)
+        samples.append(time.perf_counter_ns() - t)
+    p50, p99 = percentiles(samples)
+    print(f"查重（单个群）{len(samples)} 次：p50 {p50:.0f} µs，p99 {p99:.0f} µs")
+
+    # 抽样对照逐条扫描
+    for query in queries[:50]:
+        group_id = rnd.randrange(args.groups)
+        norm = normalize(query)
+        expected = [entry for doc, entry in reversed(list(enumerate(archive.entries)))
+                    if entry[1] == group_id and norm in archive.norms[doc]][:10]
+        if archive.search(query, group_id=group_id) != expected:
+            sys.exit(f"搜索结果与逐条扫描不一致: {query}")
+    print("抽样 50 次与逐条扫描结果一致")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+自动推进基准：夜晚和投票在行动齐全后自动结束，对局用时缩短多少
+
+用模拟时钟驱动带时间轮的房间。每个阶段开始时，按随机的反应时间安排
+玩家的行动：狼人袭击、女巫用毒或 #过、描述、投票、遗言和狼王带走；
+主持人在该阶段最后一名玩家行动之后再过一段时间才发送 #结束夜晚 /
+#结束投票。描述超时和自由讨论由房间自己的倒计时结束。同一局在关闭
+和开启自动推进时行动完全相同，只比较用时。
+
+用法: python benchmarks/bench_autoadvance.py [--sizes 12,50] [--games N] [--grace 5]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import game  # noqa: E402
+from timers import TimingWheel  # noqa: E402
+
+HOST = 1
+
+
+def active_steps(g) -> list:
+    """当前需要玩家行动的步骤"""
+    steps = []
+    state = g.game_state
+    if state == "night":
+        steps.append(("night", g.day_count))
+    elif state == "day":
+        steps.append(("speak", g.day_count, g.current_player_index))
+    elif state == "voting":
+        steps.append(("voting", g.day_count))
+    if g.last_words_qq is not None:
+        steps.append(("words", g.last_words_qq))
+    if g.wolf_king_killed is not None:
+        steps.append(("king", g.wolf_king_killed))
+    return steps
+
+
+def plan(g, step: tuple, rnd: random.Random):
+    """一个步骤中各玩家的行动：[(延迟秒数, QQ号, 消息, 是否私聊)]"""
+    alive = [qq for qq in g.seat_order if g.is_alive(qq)]
+    number = lambda qq: g.players[qq].number  # noqa: E731
+    actions = []
+    kind = step[0]
+    if kind == "night":
+        good = [qq for qq in alive if not g.players[qq].is_wolf] or alive
+        for wolf in g.wolf_players:
+            if g.is_alive(wolf):
+                actions.append((rnd.uniform(10, 60), wolf, f"#袭击{number(rnd.choice(good))}", True))
+        witch = g.special_roles.get("女巫")
+        if witch is not None and g.is_alive(witch) and "poison_used" not in g.night_actions:
+            message = f"#毒杀{number(rnd.choice(alive))}" if rnd.random() < 0.3 else "#过"
+            actions.append((rnd.uniform(10, 60), witch, message, True))
+        end = "#结束夜晚"
+    elif kind == "speak":
+        for qq in g.speaking_group():
+            # 偶尔有人超时不描述，由描述倒计时跳过
+            if rnd.random() < 0.95:
+                actions.append((rnd.uniform(20, 58), qq, "#描述 我的XP很普通", False))
+        return actions
+    elif kind == "voting":
+        for qq in alive:
+            actions.append((rnd.uniform(5, 45), qq, f"#投票{number(rnd.choice(alive))}", False))
+        end = "#结束投票"
+    elif kind == "words":
+        return [(rnd.uniform(10, 50), step[1], "#过", False)]
+    else:
+        return [(rnd.uniform(5, 20), step[1], f"#带走{number(rnd.choice(alive))}", False)]
+    # 主持人看到大家都行动完，还要过一会儿才结束该阶段
+    last = max((delay for delay, *_ in actions), default=0)
+    actions.append((last + rnd.uniform(15, 60), HOST, end, False))
+    return actions
+
+
+def play(seed: int, player_count: int, grace):
+    """打一局，返回 (总用时, {阶段: [各次用时]})"""
+    now = [0.0]
+    wheel = TimingWheel(tick=1.0, clock=lambda: now[0])
+    plugin = game.XPLangBotPlugin(wheel=wheel)
+    g = plugin.game
+    g.auto_advance_grace = grace
+    plugin.handle_message(HOST, "#创建游戏副本")
+    for qq in range(1, player_count + 1):
+        plugin.handle_message(qq, "#加入游戏副本")
+    g.reseed(seed)
+    plugin.handle_message(HOST, "#开始游戏副本")
+    for qq in range(1, player_count + 1):
+        plugin.handle_message(qq, f"#设置XP XP{qq}", True)
+
+    events = []  # (时间, 序号, 步骤, QQ号, 消息, 是否私聊)
+    planned = set()
+    counter = 0
+    phases = {"night": [], "voting": []}
+    phase_start = (g.game_state, 0.0)
+
+    def check():
+        nonlocal counter, phase_start
+        if g.game_state != phase_start[0]:
+            if phase_start[0] in phases:
+                phases[phase_start[0]].append(now[0] - phase_start[1])
+            phase_start = (g.game_state, now[0])
+        for step in active_steps(g):
+            if step not in planned:
+                planned.add(step)
+                rnd = random.Random(f"{seed}:{step}")
+                for delay, qq, message, is_private in plan(g, step, rnd):
+                    counter += 1
+                    heapq.heappush(events, (now[0] + delay, counter, step, qq, message, is_private))
+
+    check()
+    while g.game_state != "ended" and now[0] < 6 * 3600:
+        next_tick = wheel.origin + (wheel.current_tick + 1) * wheel.tick
+        if not events or next_tick <= events[0][0]:
+            now[0] = next_tick
+            wheel.advance()
+        else:
+            when, _, step, qq, message, is_private = heapq.heappop(events)
+            now[0] = when
+            if step not in active_steps(g):
+                continue  # 该步骤已经结束
+            plugin.handle_message(qq, message, is_private)
+        check()
+    return now[0], phases
+
+
+def check_waits_for_xp(grace: float) -> bool:
+    """第一夜有人没设置 XP 时，行动齐全也不自动天亮；设置之后才在宽限后推进"""
+    now = [0.0]
+    wheel = TimingWheel(tick=1.0, clock=lambda: now[0])
+    plugin = game.XPLangBotPlugin(wheel=wheel)
+    g = plugin.game
+    g.auto_advance_grace = grace
+    plugin.handle_message(HOST, "#创建游戏副本")
+    for qq in range(1, 9):
+        plugin.handle_message(qq, "#加入游戏副本")
+    g.reseed(0)
+    plugin.handle_message(HOST, "#开始游戏副本")
+    late = g.seat_order[-1]
+    for qq in g.seat_order[:-1]:
+        plugin.handle_message(qq, f"#设置XP XP{qq}", True)
+    for step in active_steps(g):
+        for _, qq, message, is_private in plan(g, step, random.Random(0)):
+            if qq != HOST:
+                plugin.handle_message(qq, message, is_private)
+
+    def wait(seconds):
+        end = now[0] + seconds
+        while now[0] < end:
+            now[0] += wheel.tick
+            wheel.advance()
+
+    wait(grace * 4)
+    if g.game_state != "night":
+        return False
+    plugin.handle_message(late, f"#设置XP XP{late}", True)
+    wait(grace + 2 * wheel.tick)
+    return g.game_state != "night"
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="12,50")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--grace", type=float, default=5.0, help="行动齐全后的宽限时间（秒）")
+    args = parser.parse_args()
+    game.metrics = None
+    if not check_waits_for_xp(args.grace):
+        sys.exit("第一夜有人未设置 XP 时不应自动天亮")
+
+    print("人数  模式          平均每局(分)  平均每晚(秒)  平均每次投票(秒)")
+    for size in map(int, args.sizes.split(",")):
+        baseline = None
+        for label, grace in (("主持人推进", None), (f"自动推进{args.grace:g}秒", args.grace)):
+            totals = []
+            nights = []
+            votes = []
+            for seed in range(args.games):
+                total, phases = play(seed, size, grace)
+                totals.append(total)
+                nights += phases["night"]
+                votes += phases["voting"]
+            average = mean(totals)
+            saved = f"  缩短 {1 - average / baseline:.0%}" if baseline else ""
+            baseline = baseline or average
+            print(f"{size:>4}  {label:<12}  {average / 60:>12.1f}  {mean(nights):>12.1f}  "
+                  f"{mean(votes):>16.1f}{saved}")
+
+
+if __name__ == "__main__":
+    main()
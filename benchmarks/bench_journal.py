@@ -0,0 +1,85 @@
+"""
+事件日志基准：组提交写入吞吐量与启动恢复耗时
+
+用法: python benchmarks/bench_journal.py [--rooms N] [--batch K]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game import XPLangBotPlugin  # noqa: E402
+from journal import Journal  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+
+
+def play_room(registry: RoomRegistry, group_id: int, player_count: int = 12):
+    """在房间中开局并进行一个完整的昼夜"""
+    def say(user_id, message):
+        registry.handle_message(user_id, message, group_id=group_id)
+
+    base = group_id * 100
+    say(base + 1, "#创建游戏副本")
+    for qq in range(base + 1, base + player_count + 1):
+        say(qq, "#加入游戏副本")
+    say(base + 1, "#开始游戏副本")
+    game = registry.get(group_id).game
+    for qq in range(base + 1, base + player_count + 1):
+        say(qq, f"#设置XP 测试XP{qq % 97}")
+    for wolf in game.wolf_players:
+        say(wolf, f"#袭击{game.players[game.seat_order[-1]].number}")
+    say(base + 1, "#结束夜晚")
+    while game.game_state == "day":
+        say(game.discussion_order[game.current_player_index], "#描述 我的XP是……")
+
+
+def bench_writes(directory: str, rooms: int, batch: int):
+    journal = Journal(directory)
+    entry = ["c", 10001, "#投票3", False]
+    total = rooms * batch * 10
+    start = time.perf_counter()
+    for _ in range(10):
+        for room_id in range(rooms):
+            for _ in range(batch):
+                journal.append(room_id, entry)
+        journal.flush()
+    elapsed = time.perf_counter() - start
+    print(f"写入 {total} 条（{rooms}个房间，每次提交每房间{batch}条）: "
+          f"{total / elapsed:,.0f} 条/秒，{journal.commits} 次组提交")
+
+
+def bench_restore(directory: str, rooms: int):
+    journal = Journal(directory)
+    registry = RoomRegistry(lambda gid: XPLangBotPlugin(gid, journal=journal), max_rooms=rooms * 2)
+    for group_id in range(1, rooms + 1):
+        play_room(registry, group_id)
+    journal.flush()
+
+    restored_journal = Journal(directory)
+    restored = RoomRegistry(lambda gid: XPLangBotPlugin(gid, journal=restored_journal), max_rooms=rooms * 2)
+    start = time.perf_counter()
+    count = restored.restore(restored_journal)
+    elapsed = time.perf_counter() - start
+    mismatched = sum(
+        1 for group_id in range(1, rooms + 1)
+        if registry.get(group_id).to_state() != restored.get(group_id).to_state()
+    )
+    print(f"恢复 {count} 个进行中的房间: {elapsed * 1000:.1f} ms，"
+          f"每房间 {elapsed / count * 1e6:.0f} µs，状态不一致 {mismatched} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_writes(os.path.join(directory, "writes"), args.rooms // 10, args.batch)
+        bench_restore(os.path.join(directory, "restore"), args.rooms)
+
+
+if __name__ == "__main__":
+    main()
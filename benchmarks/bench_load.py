@@ -0,0 +1,163 @@
+"""
+消息处理负载基准：模拟多个房间同时游戏，统计各类命令的吞吐量与延迟分位数
+
+每个房间 8~20 名虚拟玩家，按游戏流程发送加入、设置XP、夜间行动、描述、
+投票等命令，并在命令之间穿插大量普通聊天。所有房间轮流推进，消息经由
+RoomRegistry.handle_message 进入，与线上路径一致。
+
+用法:
+  python benchmarks/bench_load.py [--rooms N] [--chatter K] [--json out.json]
+  python benchmarks/bench_load.py --compare baseline.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import XPLangBotPlugin  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+# 按最长前缀归类命令
+COMMAND_NAMES = sorted((entry[0] for entry in XPLangBotPlugin.COMMANDS), key=len, reverse=True)
+
+
+def classify(message: str) -> str:
+    if not message.startswith("#"):
+        return "普通聊天"
+    for name in COMMAND_NAMES:
+        if message.startswith(name):
+            return name
+    return "未知命令"
+
+
+def percentile(sorted_values: List[int], fraction: float) -> int:
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def run(rooms: int, chatter: int, seed: int) -> dict:
+    registry = RoomRegistry(lambda gid: XPLangBotPlugin(gid), max_rooms=rooms * 2)
+    rnd = random.Random(seed)
+    streams = []
+    for group_id in range(1, rooms + 1):
+        room = registry.get_or_create(group_id)
+        room.game.reseed(seed * 100003 + group_id)
+        player_count = rnd.randint(8, 20)
+        messages = random_game_messages(room.game, random.Random(rnd.random()), player_count,
+                                        base_qq=group_id * 100, chatter=chatter)
+        streams.append((group_id, messages))
+
+    latencies: Dict[str, List[int]] = {}
+    handle = registry.handle_message
+    clock = time.perf_counter_ns
+    wall_start = time.perf_counter()
+    while streams:
+        active = []
+        for group_id, messages in streams:
+            item = next(messages, None)
+            if item is None:
+                continue
+            user_id, message, is_private = item
+            start = clock()
+            handle(user_id, message, is_private, group_id=None if is_private else group_id)
+            elapsed = clock() - start
+            latencies.setdefault(classify(message), []).append(elapsed)
+            active.append((group_id, messages))
+        streams = active
+    wall = time.perf_counter() - wall_start
+
+    result = {
+        "meta": {
+            "rooms": rooms, "chatter": chatter, "seed": seed,
+            "python": platform.python_version(), "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "types": {},
+    }
+    total_count = 0
+    total_ns = 0
+    everything = []
+    for name, values in sorted(latencies.items(), key=lambda kv: -len(kv[1])):
+        values.sort()
+        busy = sum(values)
+        total_count += len(values)
+        total_ns += busy
+        everything.extend(values)
+        result["types"][name] = {
+            "count": len(values),
+            "throughput": len(values) / (busy / 1e9),
+            "mean_ns": busy / len(values),
+            "p50_ns": percentile(values, 0.50),
+            "p99_ns": percentile(values, 0.99),
+            "p999_ns": percentile(values, 0.999),
+        }
+    everything.sort()
+    result["overall"] = {
+        "count": total_count,
+        "throughput": total_count / (total_ns / 1e9),
+        "wall_throughput": total_count / wall,
+        "p50_ns": percentile(everything, 0.50),
+        "p99_ns": percentile(everything, 0.99),
+        "p999_ns": percentile(everything, 0.999),
+    }
+    return result
+
+
+def print_report(result: dict):
+    print(f"{'类型':<10}{'条数':>9}{'吞吐(条/秒)':>14}{'p50(µs)':>10}{'p99(µs)':>10}{'p999(µs)':>10}")
+    rows = list(result["types"].items()) + [("总计", result["overall"])]
+    for name, stats in rows:
+        print(f"{name:<10}{stats['count']:>9}{stats['throughput']:>14,.0f}"
+              f"{stats['p50_ns'] / 1000:>10.1f}{stats['p99_ns'] / 1000:>10.1f}{stats['p999_ns'] / 1000:>10.1f}")
+    print(f"含负载生成的端到端吞吐: {result['overall']['wall_throughput']:,.0f} 条/秒")
+
+
+def compare(result: dict, baseline: dict, threshold: float, min_count: int = 1000) -> List[str]:
+    """与基线比较 p50/p99，返回超过阈值的回退项；样本太少的类型分位数不稳定，不参与比较"""
+    regressions = []
+    for name, stats in list(result["types"].items()) + [("总计", result["overall"])]:
+        base = baseline["overall"] if name == "总计" else baseline["types"].get(name)
+        if not base or stats["count"] < min_count:
+            continue
+        for key in ("p50_ns", "p99_ns"):
+            if base[key] and stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name} {key}: {base[key]} -> {stats[key]} ns")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--chatter", type=int, default=3, help="每条命令之前的普通聊天条数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回退的相对增幅")
+    args = parser.parse_args()
+
+    result = run(args.rooms, args.chatter, args.seed)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for line in regressions:
+            print("回退: " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
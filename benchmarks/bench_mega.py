@@ -0,0 +1,59 @@
+"""
+大型房间基准：20 到 200 人的对局中命令耗时、回复长度与白天描述时长
+
+按人数各打若干局随机对局，统计每条命令的处理耗时、最长的一条回复
+（不含结束时公布全部身份），以及描述环节按组同时发言所需的轮数与
+逐人发言相比的时长。
+
+用法: python benchmarks/bench_mega.py [--sizes 20,50,100,200] [--games N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="20,50,100,200")
+    parser.add_argument("--games", type=int, default=10)
+    args = parser.parse_args()
+    game.metrics = None
+
+    print("人数  命令数  p50(µs)  p99(µs)  最慢(ms)  最长回复(字)  每天描述轮数  逐人描述(分)  分组描述(分)")
+    for size in map(int, args.sizes.split(",")):
+        rnd = random.Random(size)
+        samples = []
+        longest = 0
+        rounds = []
+        for _ in range(args.games):
+            plugin = game.XPLangBotPlugin()
+            g = plugin.game
+            for user_id, message, is_private in random_game_messages(g, rnd, size):
+                state_before = g.game_state
+                start = time.perf_counter_ns()
+                reply = plugin.handle_message(user_id, message, is_private)
+                samples.append(time.perf_counter_ns() - start)
+                if reply:
+                    longest = max(longest, len(reply))
+                if state_before == "night" and g.game_state == "day":
+                    alive = len(g.discussion_order)
+                    rounds.append((alive, -(-alive // g.speak_group_size)))
+        samples.sort()
+        p50 = samples[len(samples) // 2] / 1000
+        p99 = samples[int(len(samples) * 0.99)] / 1000
+        alive = sum(a for a, _ in rounds) / len(rounds)
+        groups = sum(r for _, r in rounds) / len(rounds)
+        minutes = game.XPLangGame().player_description_time / 60
+        print(f"{size:>4}  {len(samples):>6}  {p50:>7.1f}  {p99:>7.1f}  {samples[-1] / 1e6:>8.2f}  {longest:>12}  "
+              f"{groups:>12.1f}  {alive * minutes:>12.0f}  {groups * minutes:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+房间内存基准：创建大量已开局的房间，统计每个房间占用的内存
+
+用法: python benchmarks/bench_memory.py [--rooms 1000 10000] [--players 20]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game import XPLangBotPlugin  # noqa: E402
+
+
+def make_room(room_id: int, player_count: int) -> XPLangBotPlugin:
+    """创建一个已开局、所有玩家都设置了XP的房间"""
+    base = room_id * 100
+    plugin = XPLangBotPlugin()
+    plugin.handle_message(base + 1, "#创建游戏副本")
+    for qq in range(base + 1, base + player_count + 1):
+        plugin.handle_message(qq, "#加入游戏副本")
+    plugin.handle_message(base + 1, "#开始游戏副本")
+    for qq in range(base + 1, base + player_count + 1):
+        plugin.handle_message(qq, f"#设置XP 测试XP{qq % 97}")
+    return plugin
+
+
+def measure(room_count: int, player_count: int) -> int:
+    """返回创建 room_count 个房间新增的内存字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rooms = [make_room(i, player_count) for i in range(room_count)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del rooms
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--players", type=int, default=20)
+    args = parser.parse_args()
+
+    for room_count in args.rooms:
+        total = measure(room_count, args.players)
+        print(f"{room_count:>6} 个房间 × {args.players}人: "
+              f"{total / 1024 / 1024:8.2f} MiB, 每房间 {total / room_count:8.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+指标开销基准：开启与关闭统计时重放同一批对局，比较每条命令的处理耗时
+
+整局重放的差值受机器抖动影响，几次运行之间能差出几百纳秒，所以另外
+单独测量每条命令多做的统计工作（两次读时钟和一次 observe）。
+
+用法: python benchmarks/bench_metrics.py [--games N] [--repeat K]
+"""
+import argparse
+import os
+import sys
+import time
+from time import perf_counter_ns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from bench_replay import record_games  # noqa: E402
+from metrics import Histogram, Metrics  # noqa: E402
+
+
+def replay_all(records) -> float:
+    start = time.perf_counter()
+    for record in records:
+        plugin = game.XPLangBotPlugin()
+        for entry in record:
+            plugin.apply(entry)
+    return time.perf_counter() - start
+
+
+def instrumentation_ns(names) -> float:
+    """handle_message 开启统计时每条命令多做的工作"""
+    metrics = Metrics()
+    best = float("inf")
+    for _ in range(5):
+        start = perf_counter_ns()
+        for name in names:
+            started = perf_counter_ns()
+            metrics.observe(name, perf_counter_ns() - started)
+        best = min(best, perf_counter_ns() - start)
+    start = perf_counter_ns()
+    for name in names:
+        pass
+    return (best - (perf_counter_ns() - start)) / len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    game.metrics = None
+    records = [events for events, _ in record_games(args.games)]
+    commands = sum(1 for record in records for entry in record if entry[0] == "c")
+
+    # 交替测量，取各自最好的一次，减少机器抖动的影响
+    best = {"off": float("inf"), "on": float("inf")}
+    for _ in range(args.repeat):
+        for mode in ("off", "on"):
+            game.metrics = Metrics() if mode == "on" else None
+            best[mode] = min(best[mode], replay_all(records))
+    game.metrics = Metrics()
+
+    histogram = Histogram()
+    values = list(range(1000, 1000 + 100_000))
+    start = time.perf_counter_ns()
+    for value in values:
+        histogram.record(value)
+    record_ns = (time.perf_counter_ns() - start) / len(values)
+    prefixes = sorted((command[0] for command in game.XPLangBotPlugin.COMMANDS), key=len, reverse=True)
+    names = [next((p for p in prefixes if entry[2].startswith(p)), "#") for record in records
+             for entry in record if entry[0] == "c"]
+
+    per_off = best["off"] / commands * 1e9
+    per_on = best["on"] / commands * 1e9
+    print(f"重放 {commands} 条命令：关闭统计 {per_off:.0f} ns/条，开启 {per_on:.0f} ns/条，"
+          f"差值 {per_on - per_off:.0f} ns/条（含抖动）")
+    print(f"每条命令的统计工作 {instrumentation_ns(names):.0f} ns，其中直方图单次记录 {record_ns:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
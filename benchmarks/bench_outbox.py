@@ -0,0 +1,70 @@
+"""
+出站队列基准：多个房间同时开 20 人局时的发送次数、合并效果与限速
+
+用模拟的发送函数（固定网络延迟）代替平台接口，检查任意 1 秒窗口内的
+发送次数不超过令牌桶允许的上限，并输出队列深度与发送延迟。
+
+用法: python benchmarks/bench_outbox.py [--rooms N] [--rate R] [--burst B]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game import XPLangBotPlugin  # noqa: E402
+from outbox import Outbox  # noqa: E402
+
+
+async def run(rooms: int, players: int, rate: float, burst: int, concurrency: int, latency: float):
+    sent_at = []
+
+    async def sender(target_type, target_id, text):
+        await asyncio.sleep(latency)
+        sent_at.append(time.monotonic())
+
+    outbox = Outbox(sender, rate=rate, burst=burst, concurrency=concurrency)
+    outbox.start()
+    start = time.monotonic()
+    for group_id in range(1, rooms + 1):
+        room = XPLangBotPlugin(group_id, outbox=outbox)
+        base = group_id * 100
+        # 开局前后的群回复按线上路径进入队列
+        for qq, message in [(base + 1, "#创建游戏副本")] + [(base + i, "#加入游戏副本") for i in range(1, players + 1)] \
+                + [(base + 1, "#开始游戏副本")]:
+            reply = room.handle_message(qq, message)
+            outbox.group(group_id, reply)
+    # 发送任务还没有机会运行，此时的队列深度就是产生的全部群消息和私聊
+    produced = outbox.depth
+    while outbox.depth or outbox.in_flight:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - start
+    outbox.stop()
+
+    window = max(sum(1 for t in sent_at if s <= t < s + 1) for s in sent_at)
+    metrics = outbox.metrics()
+    print(f"{rooms} 个房间 × {players} 人：产生 {produced} 条消息，实际发送 {metrics['sent']} 次，"
+          f"合并 {metrics['coalesced']} 条，失败 {metrics['failed']} 次")
+    print(f"发完耗时 {elapsed:.1f} 秒，最大队列深度 {metrics['max_depth']}，"
+          f"任意 1 秒内最多发送 {window} 次（上限 {burst + rate:.0f}）")
+    print(f"入队到发出: p50 {metrics['latency_p50'] * 1000:.0f} ms，p99 {metrics['latency_p99'] * 1000:.0f} ms，"
+          f"最大 {metrics['latency_max'] * 1000:.0f} ms")
+    if window > burst + rate:
+        sys.exit("超出限速")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=20.0, help="每秒发送次数")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的单次发送耗时（秒）")
+    args = parser.parse_args()
+    asyncio.run(run(args.rooms, args.players, args.rate, args.burst, args.concurrency, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+对局记录基准：打包耗时、每局字节数、导出和统计速度，并用重放校验记录内容
+
+随机打若干局（模拟时钟，阶段倒计时照常触发），每局结束时写一条二进制
+记录，同时收集事件记录。逐局把事件重放到结束前一刻，玩家身份、座位、
+狼队和全部行动必须与解出的记录一致。随后导出成列存数组并运行统计示例。
+
+用法: python benchmarks/bench_records.py [--games 5000] [--mega-every 50] [--keep out/]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from export_records import export  # noqa: E402
+from gamerecord import RecordWriter, read_records  # noqa: E402
+from timers import TimingWheel  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+
+def play_games(count: int, mega_every: int, writer: RecordWriter, now: list):
+    """打 count 局，返回 ([每局的事件记录], 打包总耗时秒)"""
+    finished = []
+    game.record_sink = lambda room_id, events: finished.append(events)
+    wheel = TimingWheel(clock=lambda: now[0])
+    packing = 0.0
+    add = writer.add
+
+    def timed_add(*args):
+        nonlocal packing
+        start = time.perf_counter()
+        add(*args)
+        packing += time.perf_counter() - start
+
+    writer.add = timed_add
+    for i in range(count):
+        rnd = random.Random(i)
+        plugin = game.XPLangBotPlugin(room_id=i, wheel=wheel, records=writer)
+        plugin.game.reseed(i)
+        players = 60 if mega_every and i % mega_every == mega_every - 1 else 8 + i % 13
+        for user_id, message, is_private in random_game_messages(plugin.game, rnd, players, base_qq=i * 1000):
+            # 玩家思考、打字的时间，倒计时到点时自动推进
+            now[0] += rnd.uniform(0.5, 12.0)
+            wheel.advance()
+            plugin.handle_message(user_id, message, is_private)
+    writer.add = add
+    game.record_sink = None
+    return finished, packing
+
+
+def check(records, histories) -> int:
+    """重放每局到打包的那一刻（分出胜负或结束游戏副本之前），与解出的记录逐项核对，返回不一致的局数"""
+    mismatched = 0
+    for (header, seats, actions, phases), events in zip(records, histories):
+        plugin = game.XPLangBotPlugin()
+        for entry in events[:-1]:  # 最后一条是结束游戏副本，重放它会重置游戏
+            plugin.apply(entry)
+            if plugin.game.game_state == "ended":
+                break  # 分出胜负时已打包，之后的 #带走、#设置XP 不在记录中
+        g = plugin.game
+        seat = {qq: p.number for qq, p in g.players.items()}
+        seat[0] = 0
+        expected_seats = [(qq, g.players[qq].number, int(g.players[qq].role_code), g.team_of.get(qq, -1) + 1)
+                          for qq in g.seat_order]
+        expected_actions = [(kind, detail, r, seat[actor], seat[target])
+                            for kind, detail, r, actor, target in g.action_log]
+        starts = [start for _, _, start in phases]
+        if (seats != expected_seats or actions != expected_actions or header[1] != g.seed
+                or header[5] != g.day_count or not phases or starts != sorted(starts)):
+            mismatched += 1
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=5000)
+    parser.add_argument("--mega-every", type=int, default=50, help="每多少局有一局 60 人的大型房间，0 为没有")
+    parser.add_argument("--keep", help="导出的列存数组保留在此目录")
+    args = parser.parse_args()
+    game.metrics = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        now = [1.7e9]
+        writer = RecordWriter(os.path.join(tmp, "records"), clock=lambda: now[0])
+        histories, packing = play_games(args.games, args.mega_every, writer, now)
+        packed = sum(len(record) for record in writer.pending)
+        jsonl = sum(len(json.dumps({"room": i, "events": events}, ensure_ascii=False).encode("utf-8")) + 1
+                    for i, events in enumerate(histories))
+        writer.flush()
+        print(f"{args.games} 局，打包 {packing / args.games * 1e6:.1f} µs/局；"
+              f"二进制记录 {packed / args.games:.0f} 字节/局，事件记录 JSONL {jsonl / args.games:.0f} 字节/局"
+              f"（{jsonl / packed:.1f} 倍）")
+
+        start = time.perf_counter()
+        records = list(read_records(os.path.join(tmp, "records")))
+        elapsed = time.perf_counter() - start
+        print(f"读取 {len(records)} 局: {elapsed * 1000:.1f} ms")
+        if len(records) != args.games:
+            sys.exit("记录局数与对局数不一致")
+        start = time.perf_counter()
+        mismatched = check(records, histories)
+        print(f"重放核对 {len(records)} 局: {time.perf_counter() - start:.2f} 秒，不一致 {mismatched} 局")
+        if mismatched:
+            sys.exit(1)
+
+        out = args.keep or os.path.join(tmp, "columns")
+        start = time.perf_counter()
+        counts = export(os.path.join(tmp, "records"), out)
+        print(f"导出列存数组: {(time.perf_counter() - start) * 1000:.0f} ms，"
+              f"玩家 {counts['players']} 行，行动 {counts['actions']} 行，阶段 {counts['phases']} 行")
+
+        import report_records
+        if report_records.np is None:
+            print("未安装 numpy，跳过统计示例")
+            return
+        print()
+        start = time.perf_counter()
+        report_records.report(out)
+        print(f"\n统计用时 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
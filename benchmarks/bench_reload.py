@@ -0,0 +1,187 @@
+"""
+热更新基准：数百个进行中的房间换上新代码时的暂停时长，以及更新前后行为是否一致
+
+许多房间轮流推进各自的随机对局（模拟时钟驱动倒计时），途中若干次把
+game 模块热更新为磁盘上的同一份代码，记录每次暂停中导出、执行新代码、
+载入、换入各步骤的耗时。同一组对局再不做热更新完整打一遍，两次所有
+回复必须完全一致；每次更新前后房间状态和倒计时到期时间也逐一核对。
+
+最后演示状态格式升级：把源码中的 STATE_VERSION 加一并登记一个迁移函数
+后热更新，所有房间经迁移载入；再换回原来的代码时因状态版本过新被拒绝，
+模块和房间保持不变。
+
+用法: python benchmarks/bench_reload.py [--rooms 500] [--players 12] [--reloads 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from reload import TIMERS, Frozen, compile_source, rehearse, swap, thaw  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from timers import TimingWheel  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+
+class LiveGame:
+    """总是读取房间表中当前的游戏对象，热更新换掉房间后生成器看到的仍是最新状态"""
+
+    def __init__(self, registry: RoomRegistry, group_id: int):
+        self.registry = registry
+        self.group_id = group_id
+
+    def __getattr__(self, name):
+        return getattr(self.registry.get(self.group_id).game, name)
+
+
+def room_view(registry: RoomRegistry) -> dict:
+    """{群号: (不含版本号的状态, 各倒计时到期刻度)}，核对热更新前后是否一致"""
+    view = {}
+    for group_id, room in registry.rooms():
+        state = room.to_state()
+        del state["version"]
+        timers = tuple(getattr(room.game, name).expires if getattr(room.game, name) else None for name in TIMERS)
+        view[group_id] = (state, timers)
+    return view
+
+
+def run(rooms: int, players: int, reloads: int, reload=None, budget: float = 0.002):
+    """
+    打完所有房间的对局，途中调用 reload(code) 热更新 reloads 次，返回
+    (回复摘要, [每次热更新的 (进行中房间数, 各步骤耗时)])。第一次热更新后
+    立即载入所有房间并核对状态和倒计时，之后的每次都和后台任务一样，每处理
+    一条消息载入一批（最多占用 budget 秒），其间被用到的房间当场载入。
+    """
+    now = [0.0]
+    wheel = TimingWheel(clock=lambda: now[0])
+    game.timing_wheel = wheel
+    game.game_instance = registry = RoomRegistry(game.create_room, clock=lambda: now[0])
+    scripts = {}
+    for group_id in range(1, rooms + 1):
+        registry.get_or_create(group_id)
+        rnd = random.Random(group_id)
+        scripts[group_id] = random_game_messages(LiveGame(registry, group_id), rnd, players,
+                                                 base_qq=group_id * 1000)
+    replies = {group_id: [] for group_id in scripts}
+    results = []
+    frozen = []
+    position = 0
+    step = 0
+    # 按消息总数估计一局的长度，在此之间均匀地热更新
+    every = max(1, rooms * players * 8 // (reloads + 1)) if reload is not None else None
+    while scripts:
+        for group_id, script in list(scripts.items()):
+            message = next(script, None)
+            if message is None:
+                del scripts[group_id]
+                continue
+            user_id, text, is_private = message
+            if text.startswith("#开始游戏副本"):
+                registry.get(group_id).game.reseed(group_id)  # 两次运行身份分配相同
+            reply = registry.handle_message(user_id, text, is_private, None if is_private else group_id)
+            replies[group_id].append(reply)
+            step += 1
+            now[0] += 0.02
+            wheel.advance()
+            if position < len(frozen):
+                mark = time.perf_counter()
+                position = thaw(frozen, position, budget)
+                timings = results[-1][1]
+                timings["thaw_batch"] = max(timings["thaw_batch"], (time.perf_counter() - mark) * 1000)
+            if every and step % every == 0 and len(results) < reloads:
+                before = room_view(registry) if not results else None
+                playing = sum(1 for _, room in registry.rooms() if room.game.game_state != "waiting")
+                frozen, timings = reload()
+                position = 0
+                timings["thaw_batch"] = 0.0
+                results.append((playing, timings))
+                if before is not None:
+                    if room_view(registry) != before:
+                        sys.exit("热更新前后房间状态或倒计时不一致")
+                    if any(isinstance(room, Frozen) for _, room in registry.rooms()):
+                        sys.exit("载入后房间表中仍有占位")
+    return hash(tuple(tuple(r) for r in replies.values())), results
+
+
+def bump_version(source: str) -> str:
+    """把源码中的状态版本加一，并登记一个不改动内容的迁移函数"""
+    version = int(re.search(r"^STATE_VERSION = (\d+)", source, re.M).group(1))
+    source = re.sub(r"^STATE_VERSION = \d+", f"STATE_VERSION = {version + 1}", source, flags=re.M)
+    return source.replace("STATE_MIGRATIONS = {", f"STATE_MIGRATIONS = {{{version}: lambda state: state, ", 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--reloads", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="试运行和载入每批最多占用的毫秒数")
+    args = parser.parse_args()
+    game.metrics = None
+
+    code = compile_source(game)
+
+    count = 0
+
+    def reload(target=code):
+        # 隔一次不沿用试运行导出的状态，相当于试运行之后所有房间都有变化的最坏情况
+        nonlocal count
+        count += 1
+        exported = asyncio.run(rehearse(game, target, args.budget / 1000))
+        return swap(game, target, exported if count % 2 else None)
+
+    expected, _ = run(args.rooms, args.players, 0)
+    digest, results = run(args.rooms, args.players, args.reloads, reload, args.budget / 1000)
+    if digest != expected:
+        sys.exit("热更新后的回复与不更新时不一致")
+    print(f"{args.rooms} 个房间，{args.players} 人局，热更新 {len(results)} 次，回复与不更新时一致，"
+          "状态和倒计时核对一致")
+    print("进行中  重新导出  导出(ms)  执行(ms)  占位(ms)  暂停(ms)  最长一批载入(ms)")
+    for playing, t in results:
+        print(f"{playing:>6}  {args.rooms - t['reused']:>8}  {t['capture']:>8.2f}  {t['exec']:>8.2f}  "
+              f"{t['freeze']:>8.2f}  {t['pause']:>8.2f}  {t['thaw_batch']:>16.2f}")
+    pauses = [t["pause"] for _, t in results]
+    print(f"暂停中位数 {statistics.median(pauses):.2f} ms，最长 {max(pauses):.2f} ms")
+
+    with open(game.__file__, encoding="utf-8") as f:
+        upgraded = compile(bump_version(f.read()), game.__file__, "exec")
+    version = game.STATE_VERSION
+
+    def migrate():
+        # 状态格式升级：所有房间经迁移载入新版本
+        frozen, timings = reload(upgraded)
+        for room in frozen:
+            room.thaw()
+        states = [room.to_state()["version"] for _, room in game.game_instance.rooms()]
+        print(f"\n状态版本 {version} -> {game.STATE_VERSION}：{len(frozen)} 个房间经迁移载入，"
+              f"暂停 {timings['pause']:.2f} ms，新版本 {states.count(game.STATE_VERSION)}/{len(states)}")
+        # 换回旧代码：试运行时状态版本过新，拒绝并保持原样
+        rooms = dict(game.game_instance.rooms())
+        before = room_view(game.game_instance)
+        try:
+            reload(code)
+        except ValueError as e:
+            unchanged = (game.STATE_VERSION == version + 1 and room_view(game.game_instance) == before
+                         and all(game.game_instance.get(gid) is room for gid, room in rooms.items()))
+            print(f"换回旧代码被拒绝（{e}），模块和房间{'保持不变' if unchanged else '被改动'}")
+            if not unchanged:
+                sys.exit(1)
+        else:
+            sys.exit("旧代码载入了更新版本的状态")
+        return [], timings
+
+    digest, _ = run(args.rooms, args.players, 1, migrate, args.budget / 1000)
+    if digest != expected:
+        sys.exit("状态格式升级后的回复与不更新时不一致")
+    print("状态格式升级后回复与不更新时一致")
+
+
+if __name__ == "__main__":
+    main()
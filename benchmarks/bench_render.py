@@ -0,0 +1,97 @@
+"""
+渲染缓存基准：刷屏查询下存活名单、身份、夜间信息的缓存命中率与耗时
+
+按人数打若干局随机对局，每条正常命令之后穿插一条查询（#存活玩家、
+#存活玩家2、#我的身份、#查看状态），自由讨论时穿插多条，模拟讨论期间
+刷屏。分别在关闭和开启渲染缓存时处理同一串消息，比较查询的处理耗时
+和缓存命中率。
+
+用法: python benchmarks/bench_render.py [--sizes 12,50,200] [--games N] [--spam K]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+QUERIES = (("#存活玩家", False), ("#存活玩家2", False), ("#我的身份", True), ("#查看状态", False))
+
+
+def run(size: int, games: int, spam: int, cached: bool):
+    """返回 (查询条数, 查询总耗时秒数, 渲染调用次数, 实际渲染次数, 回复摘要)"""
+    original = game.XPLangGame.rendered
+    calls = misses = 0
+
+    def counting(self, key, render, *args):
+        nonlocal calls
+
+        def miss(*a):
+            nonlocal misses
+            misses += 1
+            return render(*a)
+
+        calls += 1
+        if cached:
+            return original(self, key, miss, *args)
+        return miss(*args)
+
+    game.XPLangGame.rendered = counting
+    queries = 0
+    elapsed = 0.0
+    replies = []
+    try:
+        for seed in range(games):
+            rnd = random.Random(seed)
+            plugin = game.XPLangBotPlugin()
+            g = plugin.game
+            host = 10001
+            for user_id, message, is_private in random_game_messages(g, rnd, size):
+                if message.startswith("#开始游戏副本"):
+                    g.reseed(seed)  # 两次运行身份分配相同，回复可以对照
+                plugin.handle_message(user_id, message, is_private)
+                if not g.players:
+                    continue
+                for _ in range(spam if g.game_state == "discussion" else 1):
+                    query, is_private = rnd.choice(QUERIES)
+                    sender = host if query == "#查看状态" else rnd.randint(10001, 10000 + size)
+                    start = time.perf_counter()
+                    reply = plugin.handle_message(sender, query, is_private)
+                    elapsed += time.perf_counter() - start
+                    queries += 1
+                    replies.append(hash(reply))
+    finally:
+        game.XPLangGame.rendered = original
+    return queries, elapsed, calls, misses, hash(tuple(replies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="12,50,200")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--spam", type=int, default=40, help="自由讨论时每条正常命令之后的查询条数")
+    args = parser.parse_args()
+    game.metrics = None
+
+    print("人数  查询数   不缓存(µs/条)  缓存(µs/条)  命中率  加速")
+    no_gain = []
+    for size in map(int, args.sizes.split(",")):
+        queries, plain, _, _, expected = run(size, args.games, args.spam, cached=False)
+        _, fast, calls, misses, digest = run(size, args.games, args.spam, cached=True)
+        if digest != expected:
+            sys.exit(f"{size}人：开启缓存后回复不一致")
+        print(f"{size:>4}  {queries:>7}  {plain / queries * 1e6:>13.2f}  {fast / queries * 1e6:>11.2f}  "
+              f"{1 - misses / calls:>6.1%}  {plain / fast:>4.1f}x")
+        if plain / fast < 1.1:
+            no_gain.append(size)
+    if no_gain:
+        # 人多时 #我的身份 按玩家分别缓存，多数查询是该玩家在这个版本中的第一次查询
+        print(f"{'、'.join(map(str, no_gain))}人：命中率低，缓存没有明显收益")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+重放基准：生成随机对局的记录，测量重放速度并校验结果可复现
+
+用法: python benchmarks/bench_replay.py [--games N] [--out games.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from replay import digest, replay  # noqa: E402
+from workload import play_random_game  # noqa: E402
+
+
+def record_games(count: int):
+    """打若干局随机对局，返回 [(记录, 原始回复摘要), ...]"""
+    finished = []
+    game.record_sink = lambda room_id, events: finished.append(events)
+    results = []
+    for i in range(count):
+        plugin = game.XPLangBotPlugin(room_id=i)
+        plugin.game.reseed(i)  # 固定种子，每次运行生成相同的对局
+        replies = []
+
+        def say(user_id, message, is_private):
+            reply = plugin.handle_message(user_id, message, is_private)
+            if message.startswith("#") and message[1:5] not in ("我的身份", "查看状态", "存活玩家"):
+                replies.append((None, reply))
+            return reply
+
+        play_random_game(say, plugin.game, random.Random(i), 8 + i % 13)
+        results.append((finished[-1], digest(replies)))
+    game.record_sink = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--out", help="把生成的记录写入文件，供 replay.py 使用")
+    args = parser.parse_args()
+
+    results = record_games(args.games)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for events, _ in results:
+                f.write(json.dumps({"events": events}, ensure_ascii=False) + "\n")
+
+    events = sum(len(r) for r, _ in results)
+    start = time.perf_counter()
+    # 跳过首条种子事件，其余事件与原始对局的命令一一对应
+    mismatched = sum(1 for record, expected in results if digest(replay(record)[1:]) != expected)
+    elapsed = time.perf_counter() - start
+    print(f"重放 {len(results)} 局 / {events} 个事件: {elapsed:.2f} 秒，"
+          f"{len(results) / elapsed:,.0f} 局/秒，结果不一致 {mismatched} 局")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+多进程分片基准：跨进程转发相对本进程处理的开销，以及重新分配分片的耗时
+
+每个房间按固定脚本打一局（不依赖看不到的身份，只投票淘汰已知的玩家），
+房间各自顺序发送、等待回复，许多房间同时进行。分别在本进程（房间信箱）
+和 N 个工作进程中处理，比较每条消息的往返延迟和总吞吐；单个房间的
+结果即为一条消息跨进程往返的固定开销。
+
+加 --rebalance 时带持久化运行：对局打到一半把分片数从 N 改为 N+1，
+核对被移动的房间状态与移动前一致；再在继续打完对局的同时改回 N 个
+分片，确认期间到达的消息只是等待，没有丢失。
+
+用法: python benchmarks/bench_shards.py [--rooms R] [--shards 1,2,4] [--rebalance]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import game  # noqa: E402
+from actors import ActorSystem  # noqa: E402
+from shards import RESTARTING_REPLY, HashRing, ShardPool  # noqa: E402
+
+
+def scripted_game(group_id: int, players: int, rounds: int, rnd: random.Random):
+    """一局的消息 [(QQ号, 消息, 是否私聊)]：每晚直接结束，白天依次描述，然后全体投给同一人"""
+    base = group_id * 1000
+    host = base + 1
+    seats = list(range(base + 1, base + players + 1))
+    messages = [(host, "#创建游戏副本", False)]
+    messages += [(qq, "#加入游戏副本", False) for qq in seats]
+    messages.append((host, "#开始游戏副本", False))
+    messages += [(qq, f"#设置XP 测试XP{rnd.randint(1, 50)}", True) for qq in seats]
+    alive = list(seats)
+    for _ in range(rounds):
+        messages.append((host, "#结束夜晚", False))
+        messages += [(qq, "#描述 我的XP很普通", False) for qq in alive]
+        messages.append((rnd.choice(alive), "#存活玩家", False))
+        messages.append((host, "#结束讨论", False))
+        target = rnd.choice(alive[1:])  # 不投主持人，保证之后还能推进
+        messages += [(qq, f"#投票{target - base}", False) for qq in alive]
+        messages.append((rnd.choice(alive), "#我的身份", True))
+        messages.append((host, "#结束投票", False))
+        messages.append((target, "#过", False))
+        alive.remove(target)
+    messages.append((host, "#结束游戏副本", False))
+    return messages
+
+
+async def drive(handle, scripts, start=0, stop=None):
+    """各房间并发、房间内顺序发送，返回每条消息的往返延迟（纳秒）与异常回复数"""
+    latencies = []
+    failures = 0
+
+    async def room(group_id, messages):
+        nonlocal failures
+        for user_id, message, is_private in messages[start:stop]:
+            t = time.perf_counter_ns()
+            reply = await handle(user_id, message, is_private, None if is_private else group_id)
+            latencies.append(time.perf_counter_ns() - t)
+            if reply == RESTARTING_REPLY:
+                failures += 1
+
+    await asyncio.gather(*(room(gid, messages) for gid, messages in scripts.items()))
+    return latencies, failures
+
+
+def report(label, latencies, elapsed, failures=0):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] / 1000
+    p99 = latencies[int(len(latencies) * 0.99)] / 1000
+    print(f"{label:<10}  {len(latencies):>7}  {len(latencies) / elapsed:>10,.0f}  {p50:>8.0f}  {p99:>8.0f}"
+          + (f"  服务重启回复 {failures}" if failures else ""))
+
+
+def make_scripts(args, rooms):
+    rnd = random.Random(1)
+    return {gid: scripted_game(gid, args.players, args.rounds, rnd) for gid in range(1, rooms + 1)}
+
+
+async def run_inprocess(scripts):
+    game.game_instance = registry = game.RoomRegistry(game.create_room)
+    actors = game.actors = ActorSystem(registry)
+    start = time.perf_counter()
+    latencies, _ = await drive(actors.handle_message, scripts)
+    elapsed = time.perf_counter() - start
+    actors.shutdown()
+    game.actors = None
+    return latencies, elapsed
+
+
+async def run_sharded(scripts, count):
+    pool = ShardPool(count, admission=False)
+    await pool.start()
+    try:
+        start = time.perf_counter()
+        latencies, failures = await drive(pool.handle_message, scripts)
+        elapsed = time.perf_counter() - start
+    finally:
+        await pool.stop()
+    return latencies, elapsed, failures
+
+
+async def run_rebalance(args, scripts):
+    data_dir = tempfile.mkdtemp(prefix="xpwolf_shards_")
+    count = args.rebalance_from
+    pool = ShardPool(count, data_dir, admission=False)
+    await pool.start()
+    try:
+        half = len(next(iter(scripts.values()))) // 2
+        await drive(pool.handle_message, scripts, stop=half)
+        groups = list(scripts)
+        before = await pool.room_states(groups)
+        old_ring, new_ring = HashRing(count), HashRing(count + 1)
+        moved = [gid for gid in groups if old_ring.node_for(gid) != new_ring.node_for(gid)]
+
+        start = time.perf_counter()
+        await pool.rebalance(count + 1)
+        elapsed = time.perf_counter() - start
+        after = await pool.room_states(groups)
+        mismatched = [gid for gid in groups if before.get(gid) != after.get(gid)]
+        print(f"分片 {count} -> {count + 1}：{len(groups)} 个房间中移动 {len(moved)} 个"
+              f"（{len(moved) / len(groups):.0%}），耗时 {elapsed * 1000:.0f} ms，状态不一致 {len(mismatched)} 个")
+
+        # 改回原分片数的同时继续打完对局，期间到达的消息等待而不是丢失
+        shrink = asyncio.get_running_loop().create_task(pool.rebalance(count))
+        latencies, failures = await drive(pool.handle_message, scripts, start=half)
+        await shrink
+        finished = sum(1 for state in (await pool.room_states(groups)).values()
+                       if state["game"]["game_state"] == "waiting" and not state["game"]["players"])
+        latencies.sort()
+        print(f"边改回 {count} 个分片边打完：{len(latencies)} 条消息，最慢 {latencies[-1] / 1e6:.0f} ms，"
+              f"服务重启回复 {failures} 条，已结束的房间 {finished}/{len(groups)}")
+    finally:
+        await pool.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--rebalance", action="store_true", help="测试持久化下的重新分配")
+    parser.add_argument("--rebalance-from", type=int, default=2)
+    args = parser.parse_args()
+    game.metrics = None
+    game.game_instance.admission = None
+
+    if args.rebalance:
+        await run_rebalance(args, make_scripts(args, args.rooms))
+        return
+
+    print("模式        消息数   吞吐(条/秒)  p50(µs)  p99(µs)")
+    for rooms in (1, args.rooms):
+        print(f"-- {rooms} 个房间同时进行")
+        scripts = make_scripts(args, rooms)
+        latencies, elapsed = await run_inprocess(scripts)
+        report("本进程", latencies, elapsed)
+        for count in map(int, args.shards.split(",")):
+            latencies, elapsed, failures = await run_sharded(scripts, count)
+            report(f"{count}个分片", latencies, elapsed, failures)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
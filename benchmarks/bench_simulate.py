@@ -0,0 +1,113 @@
+"""
+模拟器基准：与逐局调用 XPLangGame 的参照实现对比速度，并校验两者胜率一致
+
+参照实现用与 simulate.py 默认策略相同的随机策略，直接调用游戏方法打完
+整局，胜负完全由游戏判定；两边胜率的差异应在抽样误差之内。
+
+用法: python benchmarks/bench_simulate.py [--games N] [--reference-games M]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game import XPLangGame  # noqa: E402
+from simulate import simulate  # noqa: E402
+
+POISON_RATE = 0.3
+DUEL_RATE = 0.2
+
+
+def reference_game(seed: int, player_count: int, max_days: int = 30) -> str:
+    """用随机策略逐条调用游戏方法打一局，返回 good / wolf / undecided"""
+    # 策略与发牌各用一个随机源，同一个种子会让两者相关
+    rnd = random.Random(f"strategy-{seed}")
+    game = XPLangGame()
+    game.reseed(seed)
+    game.start_game([(qq, qq) for qq in range(1, player_count + 1)])
+    players = game.players
+
+    def alive(exclude=None, good_only=False):
+        return [qq for qq, p in players.items()
+                if p.alive and qq != exclude and not (good_only and p.is_wolf)]
+
+    def take():
+        king = game.wolf_king_killed
+        if king is not None and alive(good_only=True):
+            game.wolf_king_skill(king, rnd.choice(alive(good_only=True)))
+
+    def finished():
+        if game.game_state != "ended":
+            return None
+        return "good" if game.alive_wolf_count == 0 else "wolf"
+
+    witch = game.special_roles.get("女巫")
+    knight = game.special_roles.get("骑士")
+    for _ in range(max_days):
+        if game.wolf_players and alive(good_only=True):
+            game.wolf_attack(game.wolf_players[0], rnd.choice(alive(good_only=True)))
+        if witch is not None and players[witch].alive and "poison_used" not in game.night_actions:
+            if rnd.random() < POISON_RATE and alive(exclude=witch):
+                game.witch_poison(witch, rnd.choice(alive(exclude=witch)))
+        game.end_night()
+        if finished():
+            return finished()
+        take()
+
+        if knight is not None and players[knight].alive and not game.knight_used:
+            if rnd.random() < DUEL_RATE and alive(exclude=knight):
+                game.knight_duel(knight, rnd.choice(alive(exclude=knight)))
+        if game.game_state == "night":
+            continue
+        game.start_voting()
+        for qq in alive():
+            others = alive(exclude=qq)
+            if others:
+                game.vote(qq, rnd.choice(others))
+        game.end_voting()
+        if finished():
+            return finished()
+        take()
+    return "undecided"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=200_000, help="模拟器每个人数的局数")
+    parser.add_argument("--reference-games", type=int, default=5_000, help="参照实现每个人数的局数")
+    args = parser.parse_args()
+
+    sim_games = ref_games = 0
+    sim_time = ref_time = 0.0
+    worst = 0.0
+    print(f"{'人数':>4} {'模拟器狼胜':>10} {'参照狼胜':>10} {'z':>6}")
+    for player_count in range(8, 21):
+        start = time.perf_counter()
+        result = simulate(player_count, args.games, seed=player_count,
+                          poison_rate=POISON_RATE, duel_rate=DUEL_RATE)
+        sim_time += time.perf_counter() - start
+        sim_games += args.games
+
+        start = time.perf_counter()
+        outcomes = [reference_game(player_count * 1_000_003 + i, player_count) for i in range(args.reference_games)]
+        ref_time += time.perf_counter() - start
+        ref_games += args.reference_games
+
+        p_sim = result["wolf"] / result["games"]
+        p_ref = outcomes.count("wolf") / len(outcomes)
+        # 两样本比例检验
+        pooled = (result["wolf"] + outcomes.count("wolf")) / (result["games"] + len(outcomes))
+        se = math.sqrt(max(pooled * (1 - pooled), 1e-12) * (1 / result["games"] + 1 / len(outcomes)))
+        z = (p_sim - p_ref) / se
+        worst = max(worst, abs(z))
+        print(f"{player_count:>6} {p_sim:>13.2%} {p_ref:>12.2%} {z:>7.2f}")
+
+    print(f"模拟器: {sim_games / sim_time:,.0f} 局/秒；参照实现: {ref_games / ref_time:,.0f} 局/秒；"
+          f"加速 {sim_games / sim_time / (ref_games / ref_time):.0f} 倍；最大 |z| = {worst:.2f}")
+
+
+if __name__ == "__main__":
+    main()
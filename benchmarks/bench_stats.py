@@ -0,0 +1,106 @@
+"""
+战绩库基准：百万局数据下的写入吞吐、入队开销与查询延迟
+
+先用随机对局把数据库填到指定局数（已有的数据库会复用），再测：
+游戏逻辑调用 record_game 的入队耗时、后台线程的写入速度，以及
+#我的战绩 和 #战绩排行 背后两个查询的延迟。
+
+用法: python benchmarks/bench_stats.py [--games N] [--db PATH]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stats import DEATH_CAUSES, StatsStore  # noqa: E402
+
+
+def random_game(rnd: random.Random, users: int, groups: int):
+    """(群号, 随机种子, 天数, 获胜方, 玩家结果)"""
+    group_id = rnd.randrange(groups)
+    # 同一个群的玩家来自固定的一小批人，排行榜才有意义
+    base = group_id * 40 % users
+    count = rnd.randint(8, 20)
+    wolf_won = rnd.random() < 0.45
+    wolves = 1 if count <= 10 else 2 if count <= 15 else 3
+    results = []
+    for i, offset in enumerate(rnd.sample(range(60), count)):
+        wolf = i < wolves
+        cause = rnd.choice(DEATH_CAUSES) if rnd.random() < 0.5 else None
+        results.append(((base + offset) % users, int(wolf), wolf, wolf == wolf_won, cause))
+    return group_id, rnd.getrandbits(63), rnd.randint(1, 6), 2 if wolf_won else 1, results
+
+
+def populate(store: StatsStore, target: int, users: int, groups: int, rnd: random.Random):
+    existing = store.writer.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+    if existing >= target:
+        print(f"复用已有数据库：{existing} 局")
+        return
+    start = time.perf_counter()
+    done = existing
+    while done < target:
+        size = min(5000, target - done)
+        store.write_batch([(g, time.time(), seed, days, winner, results)
+                           for g, seed, days, winner, results in
+                           (random_game(rnd, users, groups) for _ in range(size))])
+        done += size
+    elapsed = time.perf_counter() - start
+    print(f"填充 {target - existing} 局：{elapsed:.1f} 秒，{(target - existing) / elapsed:,.0f} 局/秒")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(q * len(samples)))] / 1000 for q in (0.5, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--groups", type=int, default=5_000)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "xpwolf_stats_bench.db"))
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--live", type=int, default=20000, help="经后台线程写入的局数")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    store = StatsStore(args.db)
+    populate(store, args.games, args.users, args.groups, rnd)
+
+    # 游戏逻辑侧：入队耗时与后台写入速度
+    games = [random_game(rnd, args.users, args.groups) for _ in range(args.live)]
+    store.start()
+    start = time.perf_counter()
+    enqueue_ns = []
+    for group_id, seed, days, winner, results in games:
+        t = time.perf_counter_ns()
+        store.record_game(group_id, seed, days, winner, results)
+        enqueue_ns.append(time.perf_counter_ns() - t)
+    store.flush()
+    elapsed = time.perf_counter() - start
+    p50, p99 = percentiles(enqueue_ns)
+    print(f"后台写入 {args.live} 局：{args.live / elapsed:,.0f} 局/秒，{store.commits} 个事务；"
+          f"入队 p50 {p50:.1f} µs，p99 {p99:.1f} µs")
+
+    for name, query, keys in (
+        ("#我的战绩", store.player_summary, [rnd.randrange(args.users) for _ in range(args.queries)]),
+        ("#战绩排行", store.leaderboard, [rnd.randrange(args.groups) for _ in range(args.queries)]),
+    ):
+        samples = []
+        for key in keys:
+            t = time.perf_counter_ns()
+            query(key)
+            samples.append(time.perf_counter_ns() - t)
+        p50, p99 = percentiles(samples)
+        print(f"{name} 查询 {args.queries} 次：p50 {p50:.0f} µs，p99 {p99:.0f} µs")
+
+    total = store.writer.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+    store.close()
+    print(f"数据库共 {total} 局，文件 {os.path.getsize(args.db) / 2 ** 20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
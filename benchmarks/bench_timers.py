@@ -0,0 +1,52 @@
+"""
+时间轮基准：大量挂起定时器下的启动、取消和推进耗时
+
+用法: python benchmarks/bench_timers.py [--timers N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timers import TimingWheel  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--timers", type=int, default=50000)
+    args = parser.parse_args()
+
+    now = [0.0]
+    wheel = TimingWheel(clock=lambda: now[0])
+    rnd = random.Random(0)
+    delays = [rnd.choice((60, 150, 60)) + rnd.random() * 30 for _ in range(args.timers)]
+    fired = []
+
+    start = time.perf_counter_ns()
+    handles = [wheel.call_later(delay, fired.append, i) for i, delay in enumerate(delays)]
+    arm_ns = (time.perf_counter_ns() - start) / args.timers
+
+    start = time.perf_counter_ns()
+    for handle in handles[::2]:
+        handle.cancel()
+    cancel_ns = (time.perf_counter_ns() - start) / len(handles[::2])
+
+    pending = wheel.pending
+    worst_tick = 0
+    start = time.perf_counter_ns()
+    for second in range(1, 200):
+        now[0] = second
+        tick_start = time.perf_counter_ns()
+        wheel.advance()
+        worst_tick = max(worst_tick, time.perf_counter_ns() - tick_start)
+    total_ms = (time.perf_counter_ns() - start) / 1e6
+
+    print(f"启动 {args.timers} 个定时器: {arm_ns:.0f} ns/个")
+    print(f"取消 {len(handles[::2])} 个定时器: {cancel_ns:.0f} ns/个")
+    print(f"推进 199 秒触发 {len(fired)}/{pending} 个: 共 {total_ms:.1f} ms，单刻度最慢 {worst_tick / 1e6:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+锦标赛基准：同一组对局在不同进程数下的吞吐量与扩展效率
+
+每个对局的种子固定，所以不同进程数下的汇总结果必须完全相同。
+
+用法: python benchmarks/bench_tournament.py [--games N] [--max-workers K]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tournament import STRATEGIES, run_tournament  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=200, help="每对策略每个阵营的局数")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    names = list(STRATEGIES)
+    counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    baseline = None
+    reference = None
+    print(f"{'进程数':>6}{'局/秒':>10}{'加速比':>8}{'效率':>8}")
+    for workers in counts:
+        start = time.perf_counter()
+        standings = run_tournament(names, args.games, workers)
+        rate = standings.games / (time.perf_counter() - start)
+        baseline = baseline or rate
+        if reference is None:
+            reference = standings.by_side
+        elif standings.by_side != reference:
+            sys.exit(f"{workers} 个进程的结果与单进程不一致")
+        print(f"{workers:>8}{rate:>12,.0f}{rate / baseline:>10.2f}{rate / baseline / workers:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
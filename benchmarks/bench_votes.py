@@ -0,0 +1,54 @@
+"""
+计票基准：投票（含改票）与结束投票的耗时
+
+用法: python benchmarks/bench_votes.py [--players N] [--changes K]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from game import Player, XPLangGame  # noqa: E402
+
+
+def setup(player_count: int) -> XPLangGame:
+    """直接摆好全是平民的座位，不受开局人数限制"""
+    game = XPLangGame()
+    game.players = {qq: Player(qq) for qq in range(1, player_count + 1)}
+    game.build_indexes()
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=3, help="每名玩家改票次数")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    players = list(range(1, args.players + 1))
+    plans = [[(voter, rnd.choice(players)) for _ in range(args.changes + 1) for voter in players]
+             for _ in range(args.rounds)]
+    games = [setup(args.players) for _ in range(args.rounds)]
+
+    vote_ns = end_ns = 0
+    for game, plan in zip(games, plans):
+        game.start_voting()
+        start = time.perf_counter_ns()
+        for voter, target in plan:
+            game.vote(voter, target)
+        vote_ns += time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        game.end_voting()
+        end_ns += time.perf_counter_ns() - start
+
+    votes = args.rounds * len(plans[0])
+    print(f"{args.players} 人、每人改票 {args.changes} 次：每次投票 {vote_ns / votes:.0f} ns，"
+          f"结束投票 {end_ns / args.rounds / 1000:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+长时间浸泡测试：反复打完整局游戏，检查内存、对象数、房间字段和延迟是否随局数增长
+
+几个群轮流开局：创建 → 加入 → 随机打完 → #结束游戏副本，全部经由
+RoomRegistry.handle_message，带准入控制、时间轮（模拟时钟）和运行指标，
+与线上进程的内存结构相同，只是不写盘、不发消息。
+
+每隔一个窗口的局数做一次检查点，记录：
+  - 已分配的内存块数（sys.getallocatedblocks）与 tracemalloc 跟踪的内存
+  - gc 跟踪的各类型对象数
+  - 房间、游戏、房间表、准入控制、时间轮中各容器字段的长度之和
+  - 窗口内每条消息的平均处理耗时
+预热的局数内各类命令的直方图、准入控制的令牌桶等首次用到时才分配，
+不计入判断。预热之后，内存按局数做最小二乘拟合，斜率超过阈值即判为泄漏；对象数
+和字段长度后三分之一的最小值仍高于前三分之一的最大值，判为持续增长；
+后三分之一的延迟中位数比前三分之一高出容忍度，判为变慢。任一项不
+通过时打印增长最多的对象类型、字段和 tracemalloc 分配位置，退出码为 1。
+
+另外每局结束后把各房间与新建的房间比较，列出结束后仍有残留的字段。
+
+用法: python benchmarks/soak.py [--cycles 200000] [--window 2000] [--rooms 4] [--players 12]
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import game  # noqa: E402
+from admission import Admission  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from timers import TimingWheel  # noqa: E402
+from workload import random_game_messages  # noqa: E402
+
+
+def field_sizes(obj, prefix: str, sizes: Dict[str, int]):
+    """把对象各容器字段的长度累加进 sizes，键为 前缀.字段名"""
+    for name, value in vars(obj).items():
+        if isinstance(value, (list, dict, set, tuple)) or type(value).__name__ == "Transcript":
+            key = f"{prefix}.{name}"
+            sizes[key] = sizes.get(key, 0) + len(value)
+
+
+def object_counts() -> Dict[str, int]:
+    """gc 跟踪的各类型对象数"""
+    counts: Dict[str, int] = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def residue(room) -> List[str]:
+    """对局结束后与新建房间相比仍非空的字段"""
+    fresh = game.XPLangBotPlugin()
+    found = []
+    for prefix, obj, clean in (("plugin", room, fresh), ("game", room.game, fresh.game)):
+        for name, value in vars(obj).items():
+            if isinstance(value, (list, dict, set)) and len(value) > len(getattr(clean, name)):
+                found.append(f"{prefix}.{name}")
+    return found
+
+
+def slope(xs: List[float], ys: List[float]) -> float:
+    """最小二乘斜率"""
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0.0
+
+
+def grew(series: List[float], margin: float) -> bool:
+    """后三分之一的最小值仍高于前三分之一的最大值加余量"""
+    third = max(1, len(series) // 3)
+    return min(series[-third:]) > max(series[:third]) + margin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=200_000, help="总局数")
+    parser.add_argument("--window", type=int, default=2000, help="每隔多少局做一次检查点")
+    parser.add_argument("--warmup", type=int, default=2000, help="不计入判断的前多少局，与 --window 无关")
+    parser.add_argument("--rooms", type=int, default=4, help="轮流开局的群数")
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--max-bytes", type=float, default=2.0, help="每局允许的内存增长（字节）")
+    parser.add_argument("--max-blocks", type=float, default=0.05, help="每局允许增加的内存块数")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25, help="延迟允许上升的比例")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc 记录的调用栈层数")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="不跟踪分配位置，只看内存块数（更快）")
+    args = parser.parse_args()
+
+    now = [0.0]
+    clock = lambda: now[0]  # noqa: E731
+    wheel = TimingWheel(clock=clock)
+    game.timing_wheel = wheel
+    game.metrics = Metrics()
+    admission = Admission(game.READ_ONLY_COMMANDS, game.SHARED_QUERY_COMMANDS, user_rate=1e6, user_burst=10 ** 6,
+                          action_rate=1e6, action_burst=10 ** 6, room_rate=1e6, room_burst=10 ** 6, clock=clock)
+    registry = RoomRegistry(game.create_room, admission=admission, clock=clock)
+    rnd = random.Random(1)
+    group_ids = list(range(1, args.rooms + 1))
+    trace = not args.no_tracemalloc
+    if trace:
+        tracemalloc.start(args.frames)
+
+    checkpoints = []  # [(局数, 内存块数, 跟踪字节数, 每条消息微秒, {类型: 对象数}, {字段: 长度})]
+    snapshots = []
+    overhead = [0, 0]  # 检查点数据本身占用的内存块数和字节数，从测量值中扣除
+    residues = Counter()
+    messages = 0
+    busy = 0
+    for cycle in range(1, args.cycles + 1):
+        group_id = group_ids[cycle % len(group_ids)]
+        room = registry.get_or_create(group_id)
+        # 一半的局换一批新玩家，另一半从老玩家里抽，检查按玩家记录的状态是否只增不减
+        base = 10 ** 6 + cycle * 100 if cycle % 2 else 10000 + (cycle % 50) * 100
+        for user_id, message, is_private in random_game_messages(room.game, rnd, args.players, base_qq=base):
+            now[0] += 0.05
+            start = time.perf_counter_ns()
+            registry.handle_message(user_id, message, is_private, None if is_private else group_id)
+            busy += time.perf_counter_ns() - start
+            messages += 1
+            wheel.advance()
+        residues.update(residue(room) if cycle % args.window == 0 else ())
+
+        if cycle % args.window == 0:
+            gc.collect()
+            blocks = sys.getallocatedblocks()
+            traced = tracemalloc.get_traced_memory()[0] if trace else 0
+            types = object_counts()
+            sizes: Dict[str, int] = {}
+            for _, r in registry.rooms():
+                field_sizes(r, "plugin", sizes)
+                field_sizes(r.game, "game", sizes)
+            field_sizes(registry, "registry", sizes)
+            field_sizes(admission, "admission", sizes)
+            sizes["wheel.pending"] = wheel.pending
+            checkpoints.append((cycle, blocks - overhead[0], traced - overhead[1], busy / messages / 1000,
+                                types, sizes))
+            if trace and ((not snapshots and cycle > args.warmup) or cycle + args.window > args.cycles):
+                snapshots.append(tracemalloc.take_snapshot().filter_traces(
+                    (tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__))))
+            del types, sizes
+            gc.collect()
+            overhead[0] += sys.getallocatedblocks() - blocks
+            overhead[1] += tracemalloc.get_traced_memory()[0] - traced if trace else 0
+            print(f"{cycle:>8} 局  内存块 {checkpoints[-1][1]:>9,}  跟踪 {checkpoints[-1][2] / 2 ** 20:7.2f} MiB  "
+                  f"{checkpoints[-1][3]:6.2f} µs/条  定时器 {wheel.pending:>4}  房间 {len(registry)}", flush=True)
+            messages = busy = 0
+
+    samples = [c for c in checkpoints if c[0] > args.warmup]
+    if len(samples) < 3:
+        sys.exit("预热之后的检查点太少，请增加 --cycles 或减小 --window、--warmup")
+    cycles = [c[0] for c in samples]
+    failures = []
+
+    # 斜率超过阈值，且后三分之一整体高于前三分之一，才算增长；只靠斜率容易被起伏误判
+    blocks = [c[1] for c in samples]
+    block_slope = slope(cycles, blocks)
+    print(f"\n内存块：每局 {block_slope:+.4f} 块（阈值 {args.max_blocks}）")
+    if block_slope > args.max_blocks and grew(blocks, 0):
+        failures.append(f"内存块数随局数增长：每局 {block_slope:+.4f} 块")
+    if trace:
+        traced = [c[2] for c in samples]
+        byte_slope = slope(cycles, traced)
+        print(f"tracemalloc：每局 {byte_slope:+.2f} 字节（阈值 {args.max_bytes}）")
+        if byte_slope > args.max_bytes and grew(traced, 0):
+            failures.append(f"跟踪的内存随局数增长：每局 {byte_slope:+.2f} 字节")
+
+    latencies = [c[3] for c in samples]
+    third = max(1, len(latencies) // 3)
+    early, late = statistics.median(latencies[:third]), statistics.median(latencies[-third:])
+    print(f"延迟：前三分之一 {early:.2f} µs/条，后三分之一 {late:.2f} µs/条")
+    if late > early * (1 + args.latency_tolerance):
+        failures.append(f"处理延迟上升：{early:.2f} -> {late:.2f} µs/条")
+
+    growing_types = [(name, samples[0][4].get(name, 0), samples[-1][4].get(name, 0))
+                     for name in samples[-1][4]
+                     if grew([c[4].get(name, 0) for c in samples], max(10, samples[0][4].get(name, 0) * 0.05))]
+    growing_fields = [(name, samples[0][5].get(name, 0), samples[-1][5].get(name, 0))
+                      for name in samples[-1][5]
+                      if grew([c[5].get(name, 0) for c in samples], max(10, samples[0][5].get(name, 0) * 0.05))]
+    for label, growing in (("对象类型", growing_types), ("字段", growing_fields)):
+        for name, first, last in sorted(growing, key=lambda item: item[1] - item[2])[:10]:
+            failures.append(f"{label} {name} 持续增长：{first} -> {last}")
+
+    if residues:
+        print("结束后仍有残留的字段（对局之间不增长则不算泄漏）：" +
+              "，".join(f"{name}" for name in sorted(residues)))
+
+    if failures:
+        print("\n不通过：")
+        for failure in failures:
+            print("  " + failure)
+        if len(snapshots) == 2:
+            print("分配增长最多的位置：")
+            for stat in snapshots[1].compare_to(snapshots[0], "lineno")[:10]:
+                print(f"  {stat}")
+        sys.exit(1)
+    print("\n通过：内存、对象数、字段长度和延迟都没有随局数增长")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+基准共用的虚拟玩家：按游戏规则随机发送命令，把一局游戏从创建打到结束
+"""
+import random
+from typing import Callable, Iterator, Optional, Tuple
+
+# (user_id, message, is_private)
+Message = Tuple[int, str, bool]
+
+# say(user_id, message, is_private) -> 回复
+Say = Callable[[int, str, bool], Optional[str]]
+
+CHATTER = ("哈哈哈", "我觉得3号有点怪", "过过过", "？", "这把我是好人", "笑死", "[图片]", "在吗")
+
+
+def random_game_messages(game, rnd: random.Random, player_count: int, base_qq: int = 10000,
+                         chatter: int = 0, max_rounds: int = 60) -> Iterator[Message]:
+    """
+    生成一整局游戏的消息：从创建游戏副本到主持人结束游戏副本。
+
+    game 为房间的 XPLangGame，只用来读取当前阶段和轮到谁，所以每条消息
+    都要在取下一条之前送进房间处理；chatter 为每个命令之前穿插的普通
+    聊天条数。
+    """
+    host = base_qq + 1
+    players = list(range(base_qq + 1, base_qq + player_count + 1))
+
+    def send(user_id: int, message: str, is_private: bool = False):
+        for _ in range(chatter):
+            yield rnd.choice(players), rnd.choice(CHATTER), False
+        yield user_id, message, is_private
+
+    yield from send(host, "#创建游戏副本")
+    for qq in players:
+        yield from send(qq, "#加入游戏副本")
+    yield from send(host, "#开始游戏副本")
+    for qq in players:
+        yield from send(qq, f"#设置XP 测试XP{rnd.randint(1, 50)}", True)
+
+    for _ in range(max_rounds):
+        state = game.game_state
+        if state == "night":
+            for wolf in list(game.wolf_players):
+                yield from send(wolf, f"#袭击{rnd.randint(1, player_count)}", True)
+            witch = game.special_roles.get("女巫")
+            if witch is not None and rnd.random() < 0.3:
+                yield from send(witch, f"#毒杀{rnd.randint(1, player_count)}", True)
+            yield from send(host, "#结束夜晚")
+        elif state == "day":
+            knight = game.special_roles.get("骑士")
+            if knight is not None and rnd.random() < 0.05:
+                yield from send(knight, f"#决斗{rnd.randint(1, player_count)}")
+            if game.game_state == "day":
+                # 大型房间一组人同时描述
+                for qq in game.speaking_group():
+                    yield from send(qq, "#描述 我的XP很普通")
+        elif state == "discussion":
+            yield from send(rnd.choice(players), "#存活玩家")
+            yield from send(host, "#结束讨论")
+        elif state == "voting":
+            for qq in players:
+                if game.is_alive(qq):
+                    yield from send(qq, f"#投票{rnd.randint(1, player_count)}")
+            yield from send(host, "#结束投票")
+        else:
+            break
+        if game.last_words_qq is not None:
+            yield from send(game.last_words_qq, "#过")
+        if game.wolf_king_killed is not None:
+            yield from send(game.wolf_king_killed, f"#带走{rnd.randint(1, player_count)}")
+
+    yield from send(host, "#结束游戏副本")
+
+
+def play_random_game(say: Say, game, rnd: random.Random, player_count: int, **kwargs) -> int:
+    """用 say 把一整局随机对局送进房间，返回发送的消息总数"""
+    sent = 0
+    for user_id, message, is_private in random_game_messages(game, rnd, player_count, **kwargs):
+        say(user_id, message, is_private)
+        sent += 1
+    return sent
@@ -0,0 +1,116 @@
+"""
+对局记录导出：把一个目录下的二进制对局记录转成按列存放的 .npy 数组
+
+每张表一个子目录，每列一个 .npy 文件，可用 numpy.load 直接读入（也可
+mmap_mode="r" 映射），按列做筛选、分组和聚合。导出只用标准库，不依赖 numpy。
+
+  games/    room seed started ended players rounds winner teams player_start
+  players/  game qq seat role team won death_round cause
+  actions/  game kind detail round actor target actor_role target_role
+  phases/   game phase round start duration
+
+game 列为所属对局在 games 表中的行号；一局的玩家按序号连续存放，序号
+为 s 的玩家在 players 表中的行号为 player_start[game] + s - 1。出局原因、
+行动种类和阶段编码见 gamerecord.py；没有对应玩家时身份为 -1，存活的
+玩家出局回合为 0；阶段耗时为到下一阶段（最后一个阶段到结束）的秒数。
+
+用法: python export_records.py data/records out/
+"""
+import argparse
+import os
+import sys
+import time
+from array import array
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import WIN_GOOD, WIN_WOLF, WOLF_CODES  # noqa: E402
+from gamerecord import ACT_DEATH, read_records  # noqa: E402
+
+# 表名 -> {列名: array 类型码}
+COLUMNS = {
+    "games": {"room": "q", "seed": "Q", "started": "d", "ended": "d", "players": "H", "rounds": "H",
+              "winner": "B", "teams": "B", "player_start": "q"},
+    "players": {"game": "i", "qq": "q", "seat": "H", "role": "B", "team": "B", "won": "B",
+                "death_round": "H", "cause": "B"},
+    "actions": {"game": "i", "kind": "B", "detail": "B", "round": "H", "actor": "H", "target": "H",
+                "actor_role": "b", "target_role": "b"},
+    "phases": {"game": "i", "phase": "B", "round": "H", "start": "f", "duration": "f"},
+}
+KINDS = {"b": "i", "h": "i", "i": "i", "l": "i", "q": "i", "B": "u", "H": "u", "I": "u", "L": "u", "Q": "u",
+         "f": "f", "d": "f"}
+
+
+def write_npy(path: str, column: array):
+    """按 .npy 1.0 格式写出一维数组（小端）"""
+    size = column.itemsize
+    descr = ("|" if size == 1 else "<") + KINDS[column.typecode] + str(size)
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({len(column)},), }}"
+    # 魔数、版本、头长度和头部合计补齐到 64 字节的整数倍，以换行结尾
+    header += " " * (-(10 + len(header) + 1) % 64) + "\n"
+    if sys.byteorder == "big" and size > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+    with open(path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        column.tofile(f)
+
+
+def export(directory: str, out: str) -> Dict[str, int]:
+    """导出 directory 下的全部记录到 out，返回各表行数"""
+    tables = {name: {column: array(code) for column, code in columns.items()} for name, columns in COLUMNS.items()}
+    games, players, actions, phases = (tables[name] for name in ("games", "players", "actions", "phases"))
+    for index, (header, seats, moves, marks) in enumerate(read_records(directory)):
+        room, seed, started, ended, player_count, rounds, winner, teams, _, _ = header
+        for column, value in zip(("room", "seed", "started", "ended", "players", "rounds", "winner", "teams",
+                                  "player_start"),
+                                 (room, seed, started, ended, player_count, rounds, winner, teams,
+                                  len(players["game"]))):
+            games[column].append(value)
+
+        roles = [-1] * (player_count + 1)  # 按序号查身份，序号 0 为没有
+        died = {}
+        for kind, detail, round_number, _, target in moves:
+            if kind == ACT_DEATH:
+                died[target] = (round_number, detail)
+        for qq, seat, role, team in seats:
+            roles[seat] = role
+            death_round, cause = died.get(seat, (0, 0))
+            wolf = role in WOLF_CODES
+            won = winner == (WIN_WOLF if wolf else WIN_GOOD)
+            for column, value in zip(COLUMNS["players"], (index, qq, seat, role, team, won, death_round, cause)):
+                players[column].append(value)
+
+        actions["game"].extend([index] * len(moves))
+        for column, values in zip(("kind", "detail", "round", "actor", "target"), zip(*moves)):
+            actions[column].extend(values)
+        actions["actor_role"].extend(roles[move[3]] for move in moves)
+        actions["target_role"].extend(roles[move[4]] for move in moves)
+
+        phases["game"].extend([index] * len(marks))
+        for column, values in zip(("phase", "round", "start"), zip(*marks)):
+            phases[column].extend(values)
+        starts = [mark[2] for mark in marks]
+        phases["duration"].extend(b - a for a, b in zip(starts, starts[1:] + [ended - started]))
+
+    for name, columns in tables.items():
+        os.makedirs(os.path.join(out, name), exist_ok=True)
+        for column, values in columns.items():
+            write_npy(os.path.join(out, name, column + ".npy"), values)
+    return {name: len(columns["game" if name != "games" else "room"]) for name, columns in tables.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="记录目录，含子目录")
+    parser.add_argument("out", help="输出目录")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = export(args.directory, args.out)
+    elapsed = time.perf_counter() - start
+    print(f"导出 {counts['games']} 局（玩家 {counts['players']} 行，行动 {counts['actions']} 行，"
+          f"阶段 {counts['phases']} 行）到 {args.out}，用时 {elapsed:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
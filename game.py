@@ -1,29 +1,296 @@
 import json
+import os
 import random
+import secrets
 import time
-from typing import Dict, List, Optional, Tuple
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Tuple
 import asyncio
+import heapq
+from enum import IntEnum
+
+from rooms import RoomRegistry
+from actors import ActorSystem
+from admission import Admission
+from archive import XPArchive
+from gamerecord import ACT_ATTACK, ACT_DEATH, ACT_DUEL, ACT_POISON, ACT_TAKE, ACT_VOTE, RecordWriter
+from journal import Journal
+from metrics import Metrics
+from outbox import Outbox
+from stats import DEATH_CODES, StatsStore
+from timers import TimingWheel
+from transcript import Transcript
+
+class Role(IntEnum):
+    """角色编码，成员为单例，比较时可直接用 is"""
+    VILLAGER = 0
+    WOLF = 1
+    WOLF_KING = 2
+    KNIGHT = 3
+    WITCH = 4
+
+    @property
+    def label(self) -> str:
+        return ROLE_LABELS[self]
+
+# 角色显示名，按 Role 编码索引
+ROLE_LABELS = ("平民", "狼人", "狼王", "骑士", "女巫")
+ROLE_BY_LABEL = {label: Role(code) for code, label in enumerate(ROLE_LABELS)}
+
+# 狼人阵营角色
+WOLF_ROLES = ("狼人", "狼王")
+WOLF_CODES = frozenset((Role.WOLF, Role.WOLF_KING))
+
+# 角色配置表：(人数上限, {角色: 人数})，按人数取第一个不小于它的配置，其余玩家为平民
+ROLE_TABLE = (
+    (10, {"狼人": 1}),
+    (15, {"狼王": 1, "狼人": 1, "骑士": 1}),
+    (20, {"狼王": 2, "狼人": 1, "骑士": 1, "女巫": 1}),
+)
+
+
+# 人数范围；超过经典局上限即为大型房间
+MIN_PLAYERS = 8
+CLASSIC_MAX_PLAYERS = ROLE_TABLE[-1][0]
+MEGA_MAX_PLAYERS = 200
+
+# 大型房间的狼人阵营按比例配置：(角色, 每多少名玩家一个)，至少一个；
+# 骑士、女巫的技能按单人设计，仍各一名
+MEGA_ROLE_RATIOS = (("狼王", 40), ("狼人", 8))
+MEGA_SPECIAL_ROLES = {"骑士": 1, "女巫": 1}
+MEGA_WOLF_TEAM_SIZE = 6  # 每支狼队最多人数，各狼队只知道自己的队友，各自袭击
+MEGA_SPEAK_GROUP = 10  # 白天每组同时描述的人数
+MEGA_VOTE_TOP = 5  # 投票结果只列出得票最多的几名
+MEGA_VOTER_LIST = 10  # 每名目标最多列出的投票人
+ROSTER_PAGE_SIZE = 40  # 名单每页人数
+REVEAL_PAGE_LENGTH = 1400  # 结束时公布身份每条消息的长度上限，留出页码行，不超过出站队列的单条上限
+
+
+def role_config(player_count: int, overrides: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """按人数查角色配置；大型房间按比例计算，overrides 可改写狼人阵营人数"""
+    for limit, config in ROLE_TABLE:
+        if player_count <= limit:
+            return config
+    config = {role: max(1, player_count // per) for role, per in MEGA_ROLE_RATIOS}
+    if overrides:
+        config.update(overrides)
+    config.update(MEGA_SPECIAL_ROLES)
+    return config
+
+
+# 胜负编码
+WIN_NONE = 0
+WIN_GOOD = 1
+WIN_WOLF = 2
+WIN_MESSAGES = {WIN_GOOD: "好人阵营获胜！", WIN_WOLF: "狼人阵营获胜！"}
+
+
+def win_code(wolf_count, good_count):
+    """
+    胜负规则：狼人全部出局好人胜，好人不多于狼人时狼人胜。
+
+    只用比较和位运算，传入整数得到整数，传入 numpy 数组则逐局判定，
+    模拟器与游戏共用这一条规则。
+    """
+    return (wolf_count == 0) * WIN_GOOD + ((wolf_count != 0) & (good_count <= wolf_count)) * WIN_WOLF
+
+class Player:
+    """
+    玩家记录。使用 __slots__ 避免每个玩家一个属性字典；角色存为 Role
+    编码，显示名通过 role 属性查表得到。
+
+    保留 player["number"] 这类下标访问，兼容原先的字典写法。
+    """
+    __slots__ = ("number", "xp", "alive", "role_code")
+
+    def __init__(self, number: int, xp: str = "", alive: bool = True, role_code: Role = Role.VILLAGER):
+        self.number = number
+        self.xp = xp
+        self.alive = alive
+        self.role_code = role_code
+
+    @property
+    def role(self) -> str:
+        return ROLE_LABELS[self.role_code]
+
+    @role.setter
+    def role(self, value):
+        self.role_code = value if isinstance(value, Role) else ROLE_BY_LABEL[value]
+
+    @property
+    def is_wolf(self) -> bool:
+        return self.role_code in WOLF_CODES
+
+    def __getitem__(self, key: str):
+        if key not in PLAYER_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in PLAYER_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __repr__(self) -> str:
+        return f"Player(number={self.number}, xp={self.xp!r}, alive={self.alive}, role={self.role!r})"
+
+# 兼容字典写法的字段名
+PLAYER_FIELDS = frozenset(("number", "xp", "alive", "role"))
+
+class VoteTally:
+    """
+    增量计票。投票、改票时 O(1) 更新各目标票数、投票人集合，以及
+    按票数分组的目标集合，最高票和是否平票随时可直接读出。
+    """
+    __slots__ = ("counts", "voters", "by_count", "max_votes", "version")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}  # {target_qq: 票数}
+        self.voters: Dict[int, set] = {}  # {target_qq: {voter_qq}}
+        self.by_count: Dict[int, set] = {}  # {票数: {target_qq}}
+        self.max_votes = 0
+        self.version = 0  # 每次变化加一，用于缓存渲染结果
+
+    def add(self, voter_qq: int, target_qq: int):
+        by_count = self.by_count
+        count = self.counts.get(target_qq, 0)
+        if count:
+            by_count[count].discard(target_qq)
+            self.voters[target_qq].add(voter_qq)
+        else:
+            self.voters[target_qq] = {voter_qq}
+        count += 1
+        self.counts[target_qq] = count
+        group = by_count.get(count)
+        if group is None:
+            by_count[count] = {target_qq}
+        else:
+            group.add(target_qq)
+        if count > self.max_votes:
+            self.max_votes = count
+        self.version += 1
+
+    def remove(self, voter_qq: int, target_qq: int):
+        count = self.counts[target_qq]
+        self.by_count[count].discard(target_qq)
+        self.voters[target_qq].discard(voter_qq)
+        if count == 1:
+            del self.counts[target_qq]
+            del self.voters[target_qq]
+        else:
+            self.counts[target_qq] = count - 1
+            self.by_count[count - 1].add(target_qq)
+        # 票数每次只减一，原最高票组空了时新的最高票就是 count - 1
+        if count == self.max_votes and not self.by_count[count]:
+            self.max_votes = count - 1
+        self.version += 1
+
+    def leaders(self) -> set:
+        """最高票的目标，多于一个即为平票"""
+        return self.by_count.get(self.max_votes, set()) if self.max_votes else set()
+
+    def clear(self):
+        self.counts.clear()
+        self.voters.clear()
+        self.by_count.clear()
+        self.max_votes = 0
+        self.version += 1
+
+# 开局私聊身份时附带的技能说明
+ROLE_HINTS = {
+    Role.WOLF: "\n每晚私聊发送 #袭击编号 选择袭击目标",
+    Role.WOLF_KING: "\n被袭击或被投票出局时可发送 #带走编号 带走一名玩家",
+    Role.KNIGHT: "\n白天可发送 #决斗编号 与一名玩家决斗，只能使用一次",
+    Role.WITCH: "\n你有一瓶毒药，夜晚私聊发送 #毒杀编号 使用，不用时发送 #过",
+}
+
+# 预编译的消息模板
+STATUS_TEXT = {
+    "waiting": "游戏等待开始",
+    "night": "夜晚阶段",
+    "day": "描述阶段",
+    "discussion": "自由讨论阶段",
+    "voting": "投票阶段",
+    "ended": "游戏结束",
+}
+NIGHT_INFO = ("游戏副本已开启，请各位玩家私聊主持人发送自己的XP\n"
+              "狼人阵营请注意，夜晚降临，请私聊主持人协商袭击目标\n"
+              "当前存活玩家: {}人\n")
+ROSTER_LINE = "{}号 - {}".format
+IDENTITY_LINE = "你的身份：{}号 [{}] {}".format
+REVEAL_LINE = "{}号 [{}] {} - XP: {}\n".format
+
+# 房间状态序列化格式版本，改动 to_state 的格式时加一，并在 STATE_MIGRATIONS 中登记升级函数
+STATE_VERSION = 2
+
+
+def migrate_v1(state: dict) -> dict:
+    """版本1没有随机种子，恢复时重新生成"""
+    state["game"].setdefault("seed", None)
+    return state
+
+
+# {旧版本: 升级到下一版本的函数}，日志快照和热更新导出的状态都经此升级
+STATE_MIGRATIONS = {1: migrate_v1}
+
+
+def migrate_state(state: dict) -> dict:
+    """把旧版本的房间状态逐版升级到 STATE_VERSION，版本比当前代码新时拒绝加载"""
+    version = state.get("version", 1)
+    if version > STATE_VERSION:
+        raise ValueError(f"房间状态版本 {version} 高于当前支持的 {STATE_VERSION}")
+    while version < STATE_VERSION:
+        state = STATE_MIGRATIONS[version](state)
+        version += 1
+    state["version"] = version
+    return state
+
+# 每条命令处理后校验索引一致性（调试用）
+DEBUG_INDEX_CHECK = os.environ.get("XPWOLF_DEBUG") == "1"
 
 class XPLangGame:
     def __init__(self):
         self.game_state = "waiting"  # waiting, night, day, discussion, voting, ended
-        self.players = {}  # {qq_id: {"number": int, "xp": str, "alive": bool, "role": str}}
+        self.players = {}  # {qq_id: Player}
         self.wolf_players = []  # 狼人QQ号列表
         self.special_roles = {}  # {role_name: qq_id}
         self.dead_players = []  # 死亡玩家QQ号列表
-        self.current_player_index = 0
+        self.death_causes = {}  # {qq_id: 出局原因}
+        self.seat_index = {}  # {number: qq_id} 序号索引
+        self.seat_order = []  # 按序号排列的QQ号
+        # 存活状态只记在 Player.alive 上，另外维护阵营存活计数
+        self.alive_wolf_count = 0
+        self.alive_good_count = 0
+        self.current_player_index = 0  # 描述环节当前一组的第一人
         self.discussion_order = []
+        self.spoken = set()  # 大型房间中当前一组已描述的玩家
+        self.mega = False  # 超过经典局人数的大型房间
+        self.wolf_teams = []  # 大型房间的狼队，每队为QQ号列表；经典局为空
+        self.team_of = {}  # {狼人阵营QQ号: 狼队序号}
         self.votes = {}  # {voter_qq: target_qq}
         self.vote_results = {}
+        self.tally = VoteTally()  # 与 votes 同步维护的计票
+        self.tally_render = (-1, "")  # (计票版本, 渲染结果)
+        self.transcript = Transcript()  # 当天的描述记录
         self.night_actions = {}  # 夜间行动记录
         self.knight_used = False
         self.wolf_king_killed = None  # 狼王技能目标
         self.current_victim = None
         self.game_creator = None
-        self.discussion_timer = None
+        self.day_count = 0  # 第几个白天
+        self.version = 0  # 状态版本，每次变化加一，只增不减
+        self.render_cache = {}  # {(消息种类, 参数): (状态版本, 渲染结果)}
+        self.action_log = []  # 结算后的行动 (种类, 细节, 回合, 行动者QQ, 目标QQ)，见 gamerecord.py
+        self.phase_log = []  # 阶段切换 (阶段编码, 回合, 时间)，由房间在记录对局时写入
+        self.reseed()
+        self.last_words_qq = None  # 正在发表遗言的玩家
+        self.discussion_timer = None  # 描述/自由讨论倒计时
+        self.last_words_timer = None  # 遗言倒计时
+        self.advance_timer = None  # 行动齐全后自动结束夜晚/投票的倒计时
         self.free_discussion_time = 150  # 2分30秒
         self.player_description_time = 60  # 1分钟
         self.last_speech_time = 60  # 遗言时间
+        self.auto_advance_grace = 5  # 行动齐全后自动推进前的宽限时间，None 为不自动推进
         
     def reset_game(self):
         """重置游戏状态"""
@@ -32,103 +299,237 @@ class XPLangGame:
         self.wolf_players = []
         self.special_roles = {}
         self.dead_players = []
+        self.death_causes = {}
+        self.seat_index = {}
+        self.seat_order = []
+        self.alive_wolf_count = 0
+        self.alive_good_count = 0
         self.current_player_index = 0
         self.discussion_order = []
+        self.spoken = set()
+        self.mega = False
+        self.wolf_teams = []
+        self.team_of = {}
         self.votes = {}
         self.vote_results = {}
+        self.tally.clear()
+        self.transcript.clear()
         self.night_actions = {}
         self.knight_used = False
         self.wolf_king_killed = None
         self.current_victim = None
         self.game_creator = None
+        self.day_count = 0
+        self.last_words_qq = None
+        self.version += 1
+        self.render_cache = {}
+        self.action_log = []
+        self.phase_log = []
+        self.reseed()
         if self.discussion_timer:
             self.discussion_timer.cancel()
             self.discussion_timer = None
+        if self.last_words_timer:
+            self.last_words_timer.cancel()
+            self.last_words_timer = None
+        if self.advance_timer:
+            self.advance_timer.cancel()
+            self.advance_timer = None
 
-    def start_game(self, player_list: List[Tuple[int, int]]) -> str:
-        """开始游戏，player_list为[(qq_id, number), ...]"""
-        if len(player_list) < 8 or len(player_list) > 20:
-            return f"游戏人数必须在8-20人之间，当前{len(player_list)}人"
+    def start_game(self, player_list: List[Tuple[int, int]],
+                   overrides: Optional[Dict[str, int]] = None) -> str:
+        """开始游戏，player_list为[(qq_id, number), ...]；overrides 仅对大型房间生效"""
+        if len(player_list) < MIN_PLAYERS or len(player_list) > MEGA_MAX_PLAYERS:
+            return f"游戏人数必须在{MIN_PLAYERS}-{MEGA_MAX_PLAYERS}人之间，当前{len(player_list)}人"
+        special_config = role_config(len(player_list), overrides)
+        wolf_total = sum(special_config.get(role, 0) for role in WOLF_ROLES)
+        if wolf_total < 1:
+            return "狼人阵营至少需要1人"
+        if wolf_total * 2 >= len(player_list):
+            return f"狼人阵营{wolf_total}人，须少于总人数的一半"
         
         # 初始化玩家
         for qq_id, number in player_list:
-            self.players[qq_id] = {
-                "number": number,
-                "xp": "",
-                "alive": True,
-                "role": "平民"
-            }
+            self.players[qq_id] = Player(number)
         
         # 确定特殊角色配置
-        player_count = len(self.players)
-        if player_count <= 10:
-            wolf_count = 1
-            special_config = {"狼人": 1}
-        elif player_count <= 15:
-            wolf_count = 1
-            special_config = {"狼王": 1, "狼人": 1, "骑士": 1}
-        else:
-            wolf_count = 1
-            special_config = {"狼王": 2, "狼人": 1, "骑士": 1, "女巫": 1}
+        wolf_count = special_config.get("狼人", 0)
         
         # 随机分配特殊角色
         available_players = list(self.players.keys())
-        random.shuffle(available_players)
+        # 随机数只在这里用一次，用完即弃，房间不常驻梅森旋转的状态（约 2.5 KB）
+        random.Random(self.seed).shuffle(available_players)
         
         # 分配狼人
         wolf_players = available_players[:wolf_count]
         for qq_id in wolf_players:
-            self.players[qq_id]["role"] = "狼人"
+            self.players[qq_id].role_code = Role.WOLF
             self.wolf_players.append(qq_id)
         
-        # 分配特殊角色
+        # 分配特殊角色，依次取洗牌后的下一位玩家
         start_index = wolf_count
         for role, count in special_config.items():
             if role == "狼人":
                 continue
-            for i in range(count):
-                if start_index + i < len(available_players):
-                    qq_id = available_players[start_index + i]
-                    self.players[qq_id]["role"] = role
+            for _ in range(count):
+                if start_index < len(available_players):
+                    qq_id = available_players[start_index]
+                    self.players[qq_id].role = role
                     self.special_roles[role] = qq_id
-                    if role != "狼人":  # 狼人已经在上面处理过了
-                        start_index += 1
-        
+                    start_index += 1
+
+        self.build_indexes()
+        if self.mega:
+            # 按洗牌顺序轮流分队，各队人数相差不超过一
+            wolves = [qq for qq in available_players[:start_index] if self.players[qq].is_wolf]
+            team_count = -(-len(wolves) // MEGA_WOLF_TEAM_SIZE)
+            self.wolf_teams = [sorted(wolves[i::team_count], key=lambda qq: self.players[qq].number)
+                               for i in range(team_count)]
+            self.build_teams()
         self.game_state = "night"
+        self.version += 1
         return self.get_night_info()
 
+    def build_indexes(self):
+        """根据玩家表重建序号索引与阵营存活计数"""
+        self.seat_index = {p.number: qq for qq, p in self.players.items()}
+        self.seat_order = [self.seat_index[n] for n in sorted(self.seat_index)]
+        self.alive_wolf_count = sum(1 for p in self.players.values() if p.alive and p.is_wolf)
+        self.alive_good_count = sum(1 for p in self.players.values() if p.alive and not p.is_wolf)
+        self.mega = len(self.players) > CLASSIC_MAX_PLAYERS
+
+    def build_teams(self):
+        self.team_of = {qq: team for team, members in enumerate(self.wolf_teams) for qq in members}
+
+    @property
+    def speak_group_size(self) -> int:
+        return MEGA_SPEAK_GROUP if self.mega else 1
+
+    def speaking_group(self) -> List[int]:
+        """当前一组描述的玩家"""
+        index = self.current_player_index
+        return self.discussion_order[index:index + self.speak_group_size]
+
+    def numbers_text(self, qq_ids) -> str:
+        return "、".join(str(self.players[qq].number) for qq in qq_ids)
+
+    @property
+    def round_number(self) -> int:
+        """当前回合：第 n 夜与其后的第 n 个白天同属第 n 回合"""
+        return self.day_count + (self.game_state == "night")
+
+    @property
+    def alive_count(self) -> int:
+        return self.alive_wolf_count + self.alive_good_count
+
+    def find_player_by_number(self, number: int) -> Optional[int]:
+        """根据序号查找玩家QQ号"""
+        return self.seat_index.get(number)
+
+    def is_alive(self, qq_id: int) -> bool:
+        """玩家是否在游戏中且存活"""
+        player = self.players.get(qq_id)
+        return player is not None and player.alive
+
+    def kill_player(self, qq_id: int, cause: str):
+        """标记玩家死亡，同步维护阵营存活计数"""
+        player = self.players[qq_id]
+        if not player.alive:
+            return
+        player.alive = False
+        self.version += 1
+        self.dead_players.append(qq_id)
+        self.death_causes[qq_id] = cause
+        self.action_log.append((ACT_DEATH, DEATH_CODES[cause], self.round_number, 0, qq_id))
+        if player.is_wolf:
+            self.alive_wolf_count -= 1
+        else:
+            self.alive_good_count -= 1
+
+    def check_consistency(self) -> List[str]:
+        """调试用：核对增量索引与原始玩家表，返回不一致项描述"""
+        problems = []
+        seat_index = {p.number: qq for qq, p in self.players.items()}
+        if seat_index != self.seat_index:
+            problems.append("序号索引与玩家表不一致")
+        if self.seat_order != [seat_index[n] for n in sorted(seat_index)]:
+            problems.append("序号顺序与玩家表不一致")
+        alive = {qq for qq, p in self.players.items() if p.alive}
+        wolf = sum(1 for qq in alive if self.players[qq].is_wolf)
+        if wolf != self.alive_wolf_count:
+            problems.append(f"存活狼人数不一致: 记录{self.alive_wolf_count}，实际{wolf}")
+        if len(alive) - wolf != self.alive_good_count:
+            problems.append(f"存活好人数不一致: 记录{self.alive_good_count}，实际{len(alive) - wolf}")
+        dead = {qq for qq, p in self.players.items() if not p.alive}
+        if set(self.dead_players) != dead or len(self.dead_players) != len(dead):
+            problems.append("死亡名单与玩家表不一致")
+        counts = {}
+        for target in self.votes.values():
+            counts[target] = counts.get(target, 0) + 1
+        top = max(counts.values(), default=0)
+        if counts != self.tally.counts or self.tally.max_votes != top \
+                or self.tally.leaders() != {qq for qq, c in counts.items() if c == top and top}:
+            problems.append("计票与投票记录不一致")
+        return problems
+
+    def reseed(self, seed: Optional[int] = None):
+        """设置本局的随机种子，不指定时从系统熵源生成；各房间互不影响"""
+        self.seed = secrets.randbits(63) if seed is None else seed
+
     def set_player_xp(self, qq_id: int, xp: str) -> str:
         """设置玩家XP"""
         if qq_id not in self.players:
             return "你不在游戏中"
         
-        self.players[qq_id]["xp"] = xp
+        player = self.players[qq_id]
+        if player.xp != xp:
+            player.xp = xp
+            self.version += 1  # XP 不在状态摘要中，由这里递增
         return f"已记录你的XP: {xp}"
 
+    def rendered(self, key: tuple, render: Callable[..., str], *args) -> str:
+        """
+        按状态版本缓存的渲染结果。版本在玩家出局、开局、重置和改 XP 时
+        由本类递增，其余变化由房间在命令前后的状态摘要不同时递增，状态
+        不变时重复查询直接返回上次的结果。
+        """
+        entry = self.render_cache.get(key)
+        if entry is not None and entry[0] == self.version:
+            return entry[1]
+        text = render(*args)
+        self.render_cache[key] = (self.version, text)
+        return text
+
+    def change_stamp(self) -> tuple:
+        """状态摘要：命令改变了游戏状态时其中至少一项不同，被拒绝的命令前后相同"""
+        return (self.game_state, self.version, self.day_count, self.current_player_index, len(self.spoken),
+                self.tally.version, tuple(self.night_actions.items()), len(self.transcript.entries),
+                self.transcript.truncated, self.knight_used, self.wolf_king_killed, self.current_victim,
+                self.last_words_qq, self.game_creator, len(self.action_log))
+
     def get_night_info(self) -> str:
         """获取夜间信息"""
-        info = "游戏副本已开启，请各位玩家私聊主持人发送自己的XP\n"
-        info += "狼人阵营请注意，夜晚降临，请私聊主持人协商袭击目标\n"
-        info += f"当前存活玩家: {len([p for p in self.players.values() if p['alive']])}人\n"
-        return info
+        return self.rendered(("night",), NIGHT_INFO.format, self.alive_count)
 
     def wolf_attack(self, wolf_qq: int, target_qq: int) -> str:
         """狼人袭击"""
         if wolf_qq not in self.wolf_players:
             return "你不是狼人"
         
-        if target_qq not in self.players or not self.players[target_qq]["alive"]:
+        if not self.is_alive(target_qq):
             return "目标玩家不存在或已死亡"
         
-        self.night_actions["attack"] = target_qq
-        return f"已记录袭击目标: {self.players[target_qq]['number']}号玩家"
+        # 大型房间各狼队分别记录袭击目标
+        key = f"attack{self.team_of[wolf_qq]}" if self.wolf_teams else "attack"
+        self.night_actions[key] = target_qq
+        return f"已记录袭击目标: {self.players[target_qq].number}号玩家"
 
     def witch_poison(self, witch_qq: int, target_qq: int) -> str:
         """女巫毒杀"""
-        if witch_qq not in self.special_roles.get("女巫", []):
+        if self.special_roles.get("女巫") != witch_qq:
             return "你不是女巫"
         
-        if target_qq not in self.players or not self.players[target_qq]["alive"]:
+        if not self.is_alive(target_qq):
             return "目标玩家不存在或已死亡"
         
         if "poison_used" in self.night_actions:
@@ -136,36 +537,92 @@ class XPLangGame:
         
         self.night_actions["poison"] = target_qq
         self.night_actions["poison_used"] = True
-        return f"已毒杀{self.players[target_qq]['number']}号玩家"
+        return f"已毒杀{self.players[target_qq].number}号玩家"
+
+    def witch_pass(self, witch_qq: int) -> str:
+        """女巫本晚不用毒药"""
+        if self.special_roles.get("女巫") != witch_qq:
+            return "你不是女巫"
+        if not self.is_alive(witch_qq):
+            return "你已死亡"
+        if "poison_used" in self.night_actions:
+            return "毒药已使用"
+        self.night_actions["witch_passed"] = True
+        return "本晚不使用毒药"
+
+    def pending_actors(self) -> Optional[List[int]]:
+        """
+        当前阶段还欠行动的玩家：夜晚为未定目标的狼人（大型房间按狼队）
+        和未决定是否用毒的女巫，第一夜还有未设置 XP 的玩家，投票为未投票
+        的存活玩家，正在发表遗言的玩家也算在内。其余阶段不因行动齐全而
+        结束，返回 None。
+        """
+        state = self.game_state
+        if state == "night":
+            actions = self.night_actions
+            pending = []
+            if self.wolf_teams:
+                for team, members in enumerate(self.wolf_teams):
+                    if f"attack{team}" not in actions:
+                        pending += [qq for qq in members if qq in self.wolf_players and self.is_alive(qq)]
+            elif "attack" not in actions:
+                pending += [qq for qq in self.wolf_players if self.is_alive(qq)]
+            witch = self.special_roles.get("女巫")
+            if (witch is not None and self.is_alive(witch)
+                    and "poison_used" not in actions and "witch_passed" not in actions):
+                pending.append(witch)
+            if self.day_count == 0:
+                # XP 没设置齐就天亮，出局公告的 XP 会是空的
+                pending += [qq for qq in self.seat_order if not self.players[qq].xp]
+        elif state == "voting":
+            pending = [qq for qq in self.seat_order if qq not in self.votes and self.is_alive(qq)]
+        else:
+            return None
+        if self.last_words_qq is not None:
+            pending.append(self.last_words_qq)
+        return pending
+
+    def phase_complete(self) -> bool:
+        """夜晚或投票阶段的行动是否已经齐全"""
+        if self.game_state == "voting" and len(self.votes) < self.alive_count:
+            return False  # 票数不够时不必逐人检查
+        return self.pending_actors() == []
 
     def end_night(self) -> str:
         """结束夜晚，进入白天"""
         victims = []
+        round_number = self.round_number
         
-        # 处理袭击
-        if "attack" in self.night_actions:
-            victim_qq = self.night_actions["attack"]
-            if self.players[victim_qq]["alive"]:
+        # 处理袭击，几支狼队袭击同一人时只算一次
+        for key in sorted(k for k in self.night_actions if k.startswith("attack")):
+            victim_qq = self.night_actions[key]
+            team = int(key[6:]) + 1 if key != "attack" else 0
+            self.action_log.append((ACT_ATTACK, team, round_number, 0, victim_qq))
+            if self.is_alive(victim_qq) and ("袭击", victim_qq) not in victims:
                 victims.append(("袭击", victim_qq))
         
         # 处理毒杀
         if "poison" in self.night_actions:
             victim_qq = self.night_actions["poison"]
-            if self.players[victim_qq]["alive"]:
+            self.action_log.append((ACT_POISON, 0, round_number, self.special_roles["女巫"], victim_qq))
+            if self.is_alive(victim_qq):
                 victims.append(("毒杀", victim_qq))
+        # 本晚的行动已结算，只保留毒药是否用过
+        self.night_actions = {k: v for k, v in self.night_actions.items() if k == "poison_used"}
         
         # 处理死亡
         death_info = ""
         for reason, victim_qq in victims:
-            self.players[victim_qq]["alive"] = False
-            self.dead_players.append(victim_qq)
-            death_info += f"\n{reason}死亡: {self.players[victim_qq]['number']}号玩家，XP: {self.players[victim_qq]['xp']}"
+            self.kill_player(victim_qq, reason)
+            death_info += f"\n{reason}死亡: {self.players[victim_qq].number}号玩家，XP: {self.players[victim_qq].xp}"
             
             # 检查狼王技能
-            if self.players[victim_qq]["role"] == "狼王" and reason != "毒杀":
+            if self.players[victim_qq].role_code is Role.WOLF_KING and reason != "毒杀":
                 self.wolf_king_killed = victim_qq
         
         self.game_state = "day"
+        self.day_count += 1
+        self.transcript.clear(self.day_count)
         info = "天亮了！" + death_info
         
         # 检查胜利条件
@@ -175,13 +632,22 @@ class XPLangGame:
             self.game_state = "ended"
             return info
         
+        # 被袭击的玩家发表遗言；大型房间夜间出局人数多，不安排遗言
+        if not self.mega:
+            for reason, victim_qq in victims:
+                if reason == "袭击":
+                    info += self.start_last_words(victim_qq)
+
         # 准备讨论顺序
-        alive_players = [(qq, p["number"]) for qq, p in self.players.items() if p["alive"]]
-        alive_players.sort(key=lambda x: x[1])  # 按编号排序
-        self.discussion_order = [qq for qq, _ in alive_players]
+        self.discussion_order = [qq for qq in self.seat_order if self.is_alive(qq)]  # 按编号排序
         self.current_player_index = 0
+        self.spoken = set()
         
-        info += f"\n\n开始描述环节，请{self.players[self.discussion_order[0]]['number']}号玩家开始描述自己的XP"
+        if self.mega:
+            info += (f"\n\n开始描述环节，每组{self.speak_group_size}人同时描述，"
+                     f"请{self.numbers_text(self.speaking_group())}号玩家描述自己的XP")
+        else:
+            info += f"\n\n开始描述环节，请{self.players[self.discussion_order[0]].number}号玩家开始描述自己的XP"
         return info
 
     def player_describe(self, qq_id: int, description: str) -> str:
@@ -189,25 +655,73 @@ class XPLangGame:
         if self.game_state != "day":
             return "当前不是描述环节"
         
-        if qq_id != self.discussion_order[self.current_player_index]:
+        group = self.speaking_group()
+        if qq_id not in group:
             return "还没轮到你描述"
+        if qq_id in self.spoken:
+            return "你已经描述过了"
         
-        # 记录描述内容（这里简化处理，实际可能需要存储）
-        info = f"{self.players[qq_id]['number']}号玩家描述完毕"
-        
-        # 切换到下一个玩家
-        self.current_player_index += 1
+        # 记录描述内容，自由讨论时统一转发
+        number = self.players[qq_id].number
+        info = f"{number}号玩家描述完毕"
+        if self.transcript.add(number, description):
+            info += "（描述过长，只记录了前面部分）"
+        if len(group) > 1:
+            # 同组的人都描述完才进入下一组
+            self.spoken.add(qq_id)
+            remaining = sum(1 for qq in group if qq not in self.spoken and self.is_alive(qq))
+            if remaining:
+                return info + f"，本组还剩{remaining}人"
+        return self.next_speaker(info)
+
+    def get_transcript(self, page: int = 1) -> str:
+        """当天描述记录的第 page 段"""
+        count = len(self.transcript)
+        if not count:
+            return "今天还没有玩家描述"
+        if not 1 <= page <= count:
+            return f"描述回顾共{count}段"
+        return self.transcript.chunk(page - 1)
+
+    def skip_speaker(self) -> str:
+        """当前描述玩家（大型房间为一组）超时，轮到下一位"""
+        if self.mega:
+            silent = [qq for qq in self.speaking_group() if qq not in self.spoken and self.is_alive(qq)]
+            return self.next_speaker(f"本组描述时间到，{self.numbers_text(silent)}号玩家未描述" if silent
+                                     else "本组描述时间到")
+        qq_id = self.discussion_order[self.current_player_index]
+        return self.next_speaker(f"{self.players[qq_id].number}号玩家描述超时")
+
+    def next_speaker(self, info: str) -> str:
+        """切换到下一个（组）描述的玩家，全部描述完毕后进入自由讨论"""
+        self.current_player_index += self.speak_group_size
+        self.spoken = set()
         if self.current_player_index < len(self.discussion_order):
-            next_qq = self.discussion_order[self.current_player_index]
-            info += f"\n请{self.players[next_qq]['number']}号玩家描述自己的XP"
+            if self.mega:
+                info += f"\n请{self.numbers_text(self.speaking_group())}号玩家描述自己的XP"
+            else:
+                next_qq = self.discussion_order[self.current_player_index]
+                info += f"\n请{self.players[next_qq].number}号玩家描述自己的XP"
         else:
             info += "\n所有玩家描述完毕，进入自由讨论时间"
             self.game_state = "discussion"
-            # 启动自由讨论计时器
-            # 这里简化处理，实际应该启动异步计时器
+            # 自由讨论倒计时由房间按 free_discussion_time 启动
             
         return info
 
+    def start_last_words(self, qq_id: int) -> str:
+        """开始玩家的遗言时间，返回提示"""
+        self.last_words_qq = qq_id
+        return f"\n请{self.players[qq_id].number}号玩家发表遗言（{self.last_speech_time}秒，发送#过提前结束）"
+
+    def end_last_words(self) -> str:
+        """结束遗言时间"""
+        qq_id = self.last_words_qq
+        if qq_id is None:
+            return "当前没有玩家在发表遗言"
+        self.last_words_qq = None
+        return f"{self.players[qq_id].number}号玩家遗言结束"
+
     def knight_duel(self, knight_qq: int, target_qq: int) -> str:
         """骑士决斗"""
         if "骑士" not in self.special_roles or self.special_roles["骑士"] != knight_qq:
@@ -216,27 +730,27 @@ class XPLangGame:
         if self.knight_used:
             return "骑士技能已使用"
         
-        if target_qq not in self.players or not self.players[target_qq]["alive"]:
+        if not self.is_alive(target_qq):
             return "目标玩家不存在或已死亡"
         
         if target_qq == knight_qq:
             return "不能对自己使用技能"
         
         self.knight_used = True
+        self.action_log.append((ACT_DUEL, int(self.players[target_qq].is_wolf), self.round_number,
+                                knight_qq, target_qq))
         
-        if self.players[target_qq]["role"] in ["狼人", "狼王"]:
+        if self.players[target_qq].is_wolf:
             # 击杀狼人
-            self.players[target_qq]["alive"] = False
-            self.dead_players.append(target_qq)
-            info = f"骑士决斗成功！{self.players[target_qq]['number']}号玩家是狼人，已被击杀！"
-            info += f"\nXP: {self.players[target_qq]['xp']}"
+            self.kill_player(target_qq, "决斗")
+            info = f"骑士决斗成功！{self.players[target_qq].number}号玩家是狼人，已被击杀！"
+            info += f"\nXP: {self.players[target_qq].xp}"
             self.game_state = "night"  # 直接进入夜晚
         else:
             # 骑士死亡
-            self.players[knight_qq]["alive"] = False
-            self.dead_players.append(knight_qq)
-            info = f"骑士决斗失败！{self.players[knight_qq]['number']}号玩家是好人，骑士阵亡！"
-            info += f"\nXP: {self.players[knight_qq]['xp']}"
+            self.kill_player(knight_qq, "决斗")
+            info = f"骑士决斗失败！{self.players[knight_qq].number}号玩家是好人，骑士阵亡！"
+            info += f"\nXP: {self.players[knight_qq].xp}"
         
         return info
 
@@ -245,73 +759,106 @@ class XPLangGame:
         if self.wolf_king_killed != wolf_king_qq:
             return "你不能使用狼王技能"
         
-        if target_qq not in self.players or not self.players[target_qq]["alive"]:
+        if not self.is_alive(target_qq):
             return "目标玩家不存在或已死亡"
         
         if target_qq == wolf_king_qq:
             return "不能对自己使用技能"
         
-        self.players[target_qq]["alive"] = False
-        self.dead_players.append(target_qq)
+        self.action_log.append((ACT_TAKE, 0, self.round_number, wolf_king_qq, target_qq))
+        self.kill_player(target_qq, "带走")
         self.wolf_king_killed = None  # 重置
         
-        info = f"狼王发动技能！{self.players[target_qq]['number']}号玩家被击杀！"
-        info += f"\nXP: {self.players[target_qq]['xp']}"
+        info = f"狼王发动技能！{self.players[target_qq].number}号玩家被击杀！"
+        info += f"\nXP: {self.players[target_qq].xp}"
         return info
 
     def start_voting(self) -> str:
         """开始投票"""
         self.game_state = "voting"
         self.votes = {}
-        alive_count = len([p for p in self.players.values() if p["alive"]])
-        return f"开始投票环节，请存活的{alive_count}名玩家投票"
+        self.tally.clear()
+        return f"开始投票环节，请存活的{self.alive_count}名玩家投票"
 
     def vote(self, voter_qq: int, target_qq: int) -> str:
         """投票"""
         if self.game_state != "voting":
             return "当前不是投票环节"
         
-        if voter_qq not in self.players or not self.players[voter_qq]["alive"]:
+        if not self.is_alive(voter_qq):
             return "你已死亡，无法投票"
         
-        if target_qq not in self.players or not self.players[target_qq]["alive"]:
+        if not self.is_alive(target_qq):
             return "目标玩家不存在或已死亡"
         
-        self.votes[voter_qq] = target_qq
-        return f"你已投票给{self.players[target_qq]['number']}号玩家"
+        previous = self.votes.get(voter_qq)
+        if previous != target_qq:
+            if previous is not None:
+                self.tally.remove(voter_qq, previous)
+            self.votes[voter_qq] = target_qq
+            self.tally.add(voter_qq, target_qq)
+        return f"你已投票给{self.players[target_qq].number}号玩家"
+
+    def render_tally(self) -> str:
+        """
+        按票数从高到低列出各目标及投票人，计票不变时直接返回缓存。大型
+        房间只列出前几名，投票人过多时截断，其余目标汇总为一行。
+        """
+        version, text = self.tally_render
+        if version == self.tally.version:
+            return text
+        tally = self.tally
+        counts = tally.counts
+        players = self.players
+        key = lambda qq: (-counts[qq], players[qq].number)  # noqa: E731
+        if self.mega:
+            targets = heapq.nsmallest(MEGA_VOTE_TOP, counts, key=key)
+        else:
+            targets = sorted(counts, key=key)
+        text = ""
+        for target_qq in targets:
+            voters = sorted(players[voter].number for voter in tally.voters[target_qq])
+            shown = ", ".join(map(str, voters[:MEGA_VOTER_LIST] if self.mega else voters))
+            more = f"等{len(voters)}人" if self.mega and len(voters) > MEGA_VOTER_LIST else ""
+            text += f"\n{players[target_qq].number}号玩家: {counts[target_qq]}票 ({shown}号{more})"
+        rest = len(counts) - len(targets)
+        if rest:
+            rest_votes = len(self.votes) - sum(counts[qq] for qq in targets)
+            text += f"\n其余{rest}名玩家共{rest_votes}票"
+        self.tally_render = (tally.version, text)
+        return text
+
+    def get_vote_tally(self) -> str:
+        """投票中的实时票数"""
+        if not self.votes:
+            return "当前还没有人投票"
+        return f"当前票数（已投{len(self.votes)}/{self.alive_count}人）：" + self.render_tally()
 
     def end_voting(self) -> str:
         """结束投票"""
-        # 统计票数
-        vote_count = {}
-        for target_qq in self.votes.values():
-            vote_count[target_qq] = vote_count.get(target_qq, 0) + 1
-        
-        # 找出最高票数
-        if not vote_count:
+        # 计票在投票时已增量维护，最高票直接读出
+        if not self.votes:
+            self.game_state = "night"
             return "无人投票，进入夜晚"
         
-        max_votes = max(vote_count.values())
-        max_vote_players = [qq for qq, count in vote_count.items() if count == max_votes]
+        round_number = self.round_number
+        self.action_log.extend((ACT_VOTE, 0, round_number, voter, target) for voter, target in self.votes.items())
+        max_vote_players = list(self.tally.leaders())
         
         if len(max_vote_players) > 1:
             info = "平票，无人出局"
         else:
             victim_qq = max_vote_players[0]
-            self.players[victim_qq]["alive"] = False
-            self.dead_players.append(victim_qq)
-            info = f"{self.players[victim_qq]['number']}号玩家被投票出局！"
-            info += f"\nXP: {self.players[victim_qq]['xp']}"
+            self.kill_player(victim_qq, "投票")
+            info = f"{self.players[victim_qq].number}号玩家被投票出局！"
+            info += f"\nXP: {self.players[victim_qq].xp}"
             
             # 检查狼王技能
-            if self.players[victim_qq]["role"] == "狼王":
+            if self.players[victim_qq].role_code is Role.WOLF_KING:
                 self.wolf_king_killed = victim_qq
         
         # 显示投票结果
-        info += "\n投票结果："
-        for target_qq, count in vote_count.items():
-            voters = [self.players[voter]["number"] for voter, t in self.votes.items() if t == target_qq]
-            info += f"\n{self.players[target_qq]['number']}号玩家: {count}票 ({', '.join(map(str, voters))}号)"
+        info += "\n投票结果：" + self.render_tally()
         
         # 检查胜利条件
         win_result = self.check_win_condition()
@@ -320,275 +867,914 @@ class XPLangGame:
             self.game_state = "ended"
             return info
         
+        if len(max_vote_players) == 1:
+            info += self.start_last_words(max_vote_players[0])
         self.game_state = "night"
         return info
 
     def check_win_condition(self) -> Optional[str]:
         """检查胜利条件"""
-        alive_players = [p for p in self.players.values() if p["alive"]]
-        alive_wolf = [p for p in alive_players if p["role"] in ["狼人", "狼王"]]
-        alive_good = [p for p in alive_players if p["role"] not in ["狼人", "狼王"]]
-        
-        if len(alive_wolf) == 0:
-            return "好人阵营获胜！"
-        elif len(alive_good) <= len(alive_wolf):
-            return "狼人阵营获胜！"
-        
-        return None
+        return WIN_MESSAGES.get(win_code(self.alive_wolf_count, self.alive_good_count))
 
     def get_game_status(self) -> str:
         """获取游戏状态"""
-        if self.game_state == "waiting":
-            return "游戏等待开始"
-        elif self.game_state == "night":
-            return "夜晚阶段"
-        elif self.game_state == "day":
-            return "描述阶段"
-        elif self.game_state == "discussion":
-            return "自由讨论阶段"
-        elif self.game_state == "voting":
-            return "投票阶段"
-        elif self.game_state == "ended":
-            return "游戏结束"
-        
-        return "未知状态"
-
-    def get_alive_players(self) -> str:
-        """获取存活玩家列表"""
-        alive_players = [p for p in self.players.values() if p["alive"]]
-        alive_players.sort(key=lambda x: x["number"])
-        info = "存活玩家："
-        for player in alive_players:
-            info += f"\n{player['number']}号 - {player['role']}"
-        return info
+        return STATUS_TEXT.get(self.game_state, "未知状态")
 
-    def end_game(self) -> str:
-        """结束游戏，公布所有身份"""
-        info = "游戏结束，所有玩家身份公布：\n"
-        sorted_players = sorted(self.players.values(), key=lambda x: x["number"])
-        for player in sorted_players:
-            status = "存活" if player["alive"] else "死亡"
-            info += f"{player['number']}号 [{status}] {player['role']} - XP: {player['xp']}\n"
-        
+    def get_identity(self, qq_id: int) -> str:
+        """玩家自己的序号、存活状态和身份"""
+        return self.rendered(("identity", qq_id), self.render_identity, qq_id)
+
+    def render_identity(self, qq_id: int) -> str:
+        player = self.players[qq_id]
+        return IDENTITY_LINE(player.number, "存活" if player.alive else "死亡", player.role)
+
+    def get_alive_players(self, page: int = 1) -> str:
+        """获取存活玩家列表，人数多时分页"""
+        pages = -(-self.alive_count // ROSTER_PAGE_SIZE)
+        if pages <= 1:
+            page = 1  # 只有一页时页码无关，共用一份缓存
+        elif not 1 <= page <= pages:
+            page = 0  # 超出范围的页码都回复同一条页数提示，只缓存一份
+        return self.rendered(("alive", page), self.render_alive_players, page)
+
+    def render_alive_players(self, page: int) -> str:
+        alive = self.alive_count
+        players = self.players
+        if alive <= ROSTER_PAGE_SIZE:
+            lines = ["存活玩家："]
+            lines += [ROSTER_LINE(players[qq].number, players[qq].role)
+                      for qq in self.seat_order if players[qq].alive]
+            return "\n".join(lines)
+        pages = -(-alive // ROSTER_PAGE_SIZE)
+        if not 1 <= page <= pages:
+            return f"存活玩家共{alive}人，{pages}页"
+        start = (page - 1) * ROSTER_PAGE_SIZE
+        alive_qqs = [qq for qq in self.seat_order if players[qq].alive]
+        lines = [f"存活玩家（共{alive}人，第{page}/{pages}页，发送#存活玩家页码翻页）："]
+        lines += [ROSTER_LINE(players[qq].number, players[qq].role)
+                  for qq in alive_qqs[start:start + ROSTER_PAGE_SIZE]]
+        return "\n".join(lines)
+
+    def role_notices(self) -> List[Tuple[int, str]]:
+        """开局时私聊每名玩家的身份说明，狼人阵营附带队友名单"""
+        wolves = [qq for qq in self.seat_order if self.players[qq].is_wolf]
+        teams = self.wolf_teams or [wolves]
+        team_text = ["、".join(f"{self.players[qq].number}号({self.players[qq].role})" for qq in members)
+                     for members in teams]
+        notices = []
+        for qq in self.seat_order:
+            player = self.players[qq]
+            text = f"你是{player.number}号，身份：{player.role}"
+            if player.is_wolf:
+                if self.wolf_teams:
+                    text += (f"\n你在第{self.team_of[qq] + 1}支狼队（共{len(teams)}支，互不知晓）："
+                             f"{team_text[self.team_of[qq]]}")
+                else:
+                    text += f"\n狼人阵营：{team_text[0]}"
+            text += ROLE_HINTS.get(player.role_code, "")
+            notices.append((qq, text))
+        return notices
+
+    def night_notices(self) -> List[Tuple[int, str]]:
+        """入夜时提醒需要行动的玩家"""
+        notices = [(qq, "夜晚降临，请私聊发送 #袭击编号 选择袭击目标") for qq in self.wolf_players
+                   if self.is_alive(qq)]
+        witch = self.special_roles.get("女巫")
+        if witch is not None and self.is_alive(witch) and "poison_used" not in self.night_actions:
+            notices.append((witch, "夜晚降临，如需使用毒药请私聊发送 #毒杀编号，不用请发送 #过"))
+        return notices
+
+    def results(self) -> List[Tuple[int, int, bool, bool, Optional[str]]]:
+        """对局结束时每名玩家的结果：(QQ号, 身份编码, 是否狼人阵营, 是否获胜, 出局原因)"""
+        wolf_won = win_code(self.alive_wolf_count, self.alive_good_count) == WIN_WOLF
+        results = []
+        for qq in self.seat_order:
+            player = self.players[qq]
+            results.append((qq, int(player.role_code), player.is_wolf, player.is_wolf == wolf_won,
+                            self.death_causes.get(qq)))
+        return results
+
+    def to_state(self) -> dict:
+        """导出可 JSON 序列化的完整游戏状态（独立副本）"""
+        return {
+            "game_state": self.game_state,
+            "players": [[qq, p.number, p.xp, p.alive, int(p.role_code)] for qq, p in self.players.items()],
+            "wolf_players": list(self.wolf_players),
+            "special_roles": dict(self.special_roles),
+            "dead_players": list(self.dead_players),
+            "death_causes": [[qq, cause] for qq, cause in self.death_causes.items()],
+            "current_player_index": self.current_player_index,
+            "discussion_order": list(self.discussion_order),
+            "spoken": sorted(self.spoken),
+            "wolf_teams": [list(members) for members in self.wolf_teams],
+            "votes": [[voter, target] for voter, target in self.votes.items()],
+            "night_actions": dict(self.night_actions),
+            "knight_used": self.knight_used,
+            "wolf_king_killed": self.wolf_king_killed,
+            "current_victim": self.current_victim,
+            "game_creator": self.game_creator,
+            "day_count": self.day_count,
+            "last_words_qq": self.last_words_qq,
+            "transcript": self.transcript.to_state(),
+            "seed": self.seed,
+            "action_log": [list(action) for action in self.action_log],
+            "phase_log": [list(phase) for phase in self.phase_log],
+        }
+
+    def load_state(self, state: dict):
+        """从 to_state 的结果恢复游戏状态"""
         self.reset_game()
-        return info
+        self.game_state = state["game_state"]
+        self.players = {
+            qq: Player(number, xp, alive, Role(role_code))
+            for qq, number, xp, alive, role_code in state["players"]
+        }
+        self.wolf_players = list(state["wolf_players"])
+        self.special_roles = dict(state["special_roles"])
+        self.dead_players = list(state["dead_players"])
+        self.death_causes = {qq: cause for qq, cause in state.get("death_causes", ())}
+        self.current_player_index = state["current_player_index"]
+        self.discussion_order = list(state["discussion_order"])
+        self.spoken = set(state.get("spoken", ()))
+        self.wolf_teams = [list(members) for members in state.get("wolf_teams", ())]
+        self.build_teams()
+        self.votes = {voter: target for voter, target in state["votes"]}
+        self.tally.clear()
+        for voter, target in self.votes.items():
+            self.tally.add(voter, target)
+        self.night_actions = dict(state["night_actions"])
+        self.knight_used = state["knight_used"]
+        self.wolf_king_killed = state["wolf_king_killed"]
+        self.current_victim = state["current_victim"]
+        self.game_creator = state["game_creator"]
+        self.day_count = state["day_count"]
+        self.last_words_qq = state["last_words_qq"]
+        self.transcript.load_state(self.day_count, state.get("transcript", ()))
+        self.action_log = [tuple(action) for action in state.get("action_log", ())]
+        self.phase_log = [tuple(phase) for phase in state.get("phase_log", ())]
+        # 随机数只在开局时使用，恢复时按种子重建即可
+        self.reseed(state.get("seed"))
+        self.build_indexes()
+
+    def end_game(self) -> List[str]:
+        """结束游戏，公布所有身份；人数多时分成几条消息，每条一页"""
+        players = self.players
+        lines = [REVEAL_LINE(p.number, "存活" if p.alive else "死亡", p.role, p.xp)
+                 for p in map(players.__getitem__, self.seat_order)]
+        lines.append(f"本局随机种子: {self.seed}\n")
+        pages = [[]]
+        length = 0
+        for line in lines:
+            if pages[-1] and length + len(line) > REVEAL_PAGE_LENGTH:
+                pages.append([])
+                length = 0
+            pages[-1].append(line)
+            length += len(line)
+
+        self.reset_game()
+        if len(pages) == 1:
+            return ["游戏结束，所有玩家身份公布：\n" + "".join(lines)]
+        return [f"游戏结束，所有玩家身份公布（第{page}/{len(pages)}页）：\n" + "".join(part)
+                for page, part in enumerate(pages, 1)]
+
+# 处于任意阶段时均可使用；对局记录中的阶段编码为其下标
+ANY_STATE = ("waiting", "night", "day", "discussion", "voting", "ended")
+
+# 不改变游戏状态的命令，不写入事件日志
+READ_ONLY_COMMANDS = frozenset(("#我的身份", "#查看状态", "#存活玩家", "#票数", "#回顾", "#我的战绩", "#战绩排行",
+                                "#搜索XP", "#查重XP", "#性能统计"))
+
+# 回复与发送者无关的只读命令，同一房间内重复的查询只回复一次
+SHARED_QUERY_COMMANDS = frozenset(("#存活玩家", "#票数", "#回顾", "#战绩排行", "#搜索XP"))
 
 # QQ机器人插件主类
 class XPLangBotPlugin:
-    def __init__(self):
+    # 命令表：(命令前缀, 处理方法名, 允许的游戏阶段, 阶段不符时的提示)
+    COMMANDS = (
+        # 管理员命令
+        ("#创建游戏副本", "cmd_create", ("waiting",), "游戏已在进行中"),
+        ("#加入游戏副本", "cmd_join", ("waiting",), "游戏副本未创建或已开始"),
+        ("#开始游戏副本", "cmd_start", ANY_STATE, None),
+        ("#我的身份", "cmd_identity", ANY_STATE, None),
+        # 玩家设置XP
+        ("#设置XP", "cmd_set_xp", ("night", "day", "discussion", "voting", "ended"), "游戏未开始"),
+        # 狼人、女巫、骑士、狼王命令
+        ("#袭击", "cmd_attack", ("night",), "当前不是夜晚"),
+        ("#毒杀", "cmd_poison", ("night",), "当前不是夜晚"),
+        ("#决斗", "cmd_duel", ("day", "discussion"), "当前不能使用骑士技能"),
+        ("#带走", "cmd_take", ANY_STATE, None),
+        # 描述与投票
+        ("#描述", "cmd_describe", ("day",), "当前不是描述环节"),
+        ("#投票", "cmd_vote", ("voting",), "当前不是投票环节"),
+        ("#票数", "cmd_tally", ("voting",), "当前不是投票环节"),
+        ("#回顾", "cmd_transcript", ("day", "discussion", "voting"), "当前没有描述记录"),
+        ("#过", "cmd_pass", ANY_STATE, None),
+        # 主持人命令
+        ("#结束夜晚", "cmd_end_night", ("night",), "当前不是夜晚"),
+        ("#结束讨论", "cmd_end_discussion", ("discussion",), "当前不是讨论时间"),
+        ("#结束投票", "cmd_end_voting", ("voting",), "当前不是投票时间"),
+        ("#查看状态", "cmd_status", ANY_STATE, None),
+        ("#存活玩家", "cmd_alive", ANY_STATE, None),
+        ("#结束游戏副本", "cmd_end_game", ANY_STATE, None),
+        ("#我的战绩", "cmd_my_stats", ANY_STATE, None),
+        ("#战绩排行", "cmd_leaderboard", ANY_STATE, None),
+        ("#搜索XP", "cmd_search_xp", ANY_STATE, None),
+        ("#查重XP", "cmd_check_xp", ("night", "day", "discussion", "voting", "ended"), "游戏未开始"),
+        ("#性能统计", "cmd_metrics", ANY_STATE, None),
+    )
+
+    restoring = False  # 从事件日志恢复期间断开了日志，事件仍照常积累；只在恢复时设在实例上
+
+    def __init__(self, room_id: Optional[int] = None, wheel: Optional[TimingWheel] = None,
+                 journal: Optional[Journal] = None, outbox: Optional[Outbox] = None,
+                 actors: Optional[ActorSystem] = None, stats: Optional[StatsStore] = None,
+                 archive: Optional[XPArchive] = None, records: Optional[RecordWriter] = None):
         self.game = XPLangGame()
         self.player_queue = []  # 玩家接龙队列
-    
-    def handle_message(self, user_id: int, message: str, is_private: bool = False) -> str:
-        """处理消息"""
+        self.room_id = room_id  # 所在群号
+        self.wheel = wheel  # 不提供时间轮则不自动计时，由主持人手动推进
+        self.deadline_key = None  # 当前阶段倒计时对应的 (阶段, 第几天, 发言序号)
+        self.advance_key = None  # 自动推进倒计时对应的 (阶段, 第几天)
+        self.journal = journal  # 不提供则不持久化
+        self.outbox = outbox  # 不提供则不主动发消息（计时通知、私聊身份等）
+        self.actors = actors  # 提供时计时器事件投递到房间信箱，与消息按到达顺序处理
+        self.stats = stats  # 不提供则不记录战绩
+        self.archive = archive  # 不提供则不收录公开的 XP
+        self.records = records  # 不提供则不写二进制对局记录
+        self.history = []  # 本局事件记录，首条为 ["s", 随机种子]，可用 replay.py 重放
+
+    @property
+    def version(self) -> int:
+        """房间状态版本，准入控制据此判断重复查询的回复是否会变"""
+        return self.game.version
+
+    @classmethod
+    def build_dispatch_table(cls) -> Dict[str, dict]:
+        """
+        预编译分发表：{游戏阶段: 前缀树}
+
+        前缀树以'#'后的字符逐级索引，分支只剩一条命令时直接存放叶子
+        (命令, 处理函数或None, 提示)。阶段不允许的命令在叶子上就是拒绝
+        提示，查表一次即可得出结果，不需要逐条 startswith 比较。
+        """
+        def build(entries, depth):
+            groups = {}
+            for entry in entries:
+                groups.setdefault(entry[0][depth], []).append(entry)
+            return {
+                ch: group[0] if len(group) == 1 else build(group, depth + 1)
+                for ch, group in groups.items()
+            }
+
+        tables = {}
+        for state in ANY_STATE:
+            entries = [
+                (name, getattr(cls, method) if state in states else None, reject)
+                for name, method, states, reject in cls.COMMANDS
+            ]
+            tables[state] = build(entries, 1)
+        return tables
+
+    def member_ids(self) -> List[int]:
+        """房间内所有相关玩家（主持人、接龙玩家、游戏中玩家）"""
+        ids = {qq for qq, _ in self.player_queue}
+        ids.update(self.game.players)
+        if self.game.game_creator:
+            ids.add(self.game.game_creator)
+        return list(ids)
+
+    def is_member(self, user_id: int) -> bool:
+        """玩家是否属于本房间"""
+        return (user_id == self.game.game_creator or user_id in self.game.players
+                or any(qq == user_id for qq, _ in self.player_queue))
+
+    def handle_message(self, user_id: int, message: str, is_private: bool = False) -> Optional[str]:
+        """处理消息，非命令消息返回None"""
+        # 快速路径：普通聊天不以#开头，直接放行
+        if not message.startswith("#") or len(message) < 2:
+            return None
+
+        node = DISPATCH_TABLE[self.game.game_state]
+        depth = 1
+        length = len(message)
+        while type(node) is dict and depth < length:
+            node = node.get(message[depth])
+            depth += 1
+
+        if type(node) is tuple and message.startswith(node[0]):
+            name, handler, reject = node
+            if handler is None:
+                if metrics is not None:
+                    metrics.reject(name)
+                return reject
+            if metrics is not None:
+                started = perf_counter_ns()
+            state_before = self.game.game_state
+            king_before = self.game.wolf_king_killed
+            stamp_before = self.change_stamp() if name not in READ_ONLY_COMMANDS else None
+            try:
+                reply = handler(self, user_id, message[len(name):])
+            except Exception as e:
+                reply = f"处理命令时出错: {str(e)}"
+                if metrics is not None:
+                    metrics.error(name)
+            if name not in READ_ONLY_COMMANDS:
+                self.record(["c", user_id, message, is_private], state_before, stamp_before)
+                if self.outbox is not None:
+                    self.send_notices(state_before, king_before)
+                    self.stream_transcript(state_before)
+                if state_before != "ended" and self.game.game_state == "ended":
+                    self.game_over()
+            if self.wheel is not None:
+                self.sync_deadlines()
+            if DEBUG_INDEX_CHECK:
+                problems = self.game.check_consistency()
+                assert not problems, f"{name}后索引不一致: {problems}"
+            if metrics is not None:
+                metrics.observe(name, perf_counter_ns() - started)
+            return reply
+        if metrics is not None:
+            metrics.unknown += 1
+        return "未知命令，请查看游戏副本规则"
+
+    def sync_deadlines(self):
+        """根据当前阶段启动或取消描述、自由讨论和遗言倒计时"""
+        game = self.game
+        if game.game_state == "day":
+            key = ("day", game.day_count, game.current_player_index)
+            delay = game.player_description_time
+        elif game.game_state == "discussion":
+            key = ("discussion", game.day_count, 0)
+            delay = game.free_discussion_time
+        else:
+            key = None
+
+        if key != self.deadline_key or (key and game.discussion_timer is None):
+            if game.discussion_timer:
+                game.discussion_timer.cancel()
+                game.discussion_timer = None
+            self.deadline_key = key
+            if key:
+                game.discussion_timer = self.wheel.call_later(delay, self.deliver, self.on_phase_deadline, key)
+
+        # 夜晚或投票的行动齐全后，宽限时间一到自动推进
+        if game.auto_advance_grace is not None and game.phase_complete():
+            key = (game.game_state, game.day_count)
+        else:
+            key = None
+        if key != self.advance_key:
+            if game.advance_timer:
+                game.advance_timer.cancel()
+                game.advance_timer = None
+            self.advance_key = key
+            if key:
+                game.advance_timer = self.wheel.call_later(
+                    game.auto_advance_grace, self.deliver, self.on_auto_advance, key
+                )
+
+        if game.last_words_qq is None:
+            if game.last_words_timer:
+                game.last_words_timer.cancel()
+                game.last_words_timer = None
+        elif game.last_words_timer is None or game.last_words_timer.args[-1] != game.last_words_qq:
+            if game.last_words_timer:
+                game.last_words_timer.cancel()
+            game.last_words_timer = self.wheel.call_later(
+                game.last_speech_time, self.deliver, self.on_last_words_deadline, game.last_words_qq
+            )
+
+    def deliver(self, callback: Callable, *args):
+        """计时器到点：有房间信箱时排进信箱，否则直接执行"""
+        if self.actors is not None and self.room_id is not None:
+            self.actors.post(self.room_id, callback, *args, wait=False, force=True)
+        else:
+            callback(*args)
+
+    def on_phase_deadline(self, key: tuple):
+        """描述或自由讨论时间到，自动推进到下一步"""
+        if key != self.deadline_key:
+            return
+        self.game.discussion_timer = None
+        state_before = self.game.game_state
+        text = self.apply_phase_deadline(key[0])
+        self.record(["d", key[0]], state_before)
+        self.sync_deadlines()
+        self.announce(text)
+        self.stream_transcript(state_before)
+
+    def apply_phase_deadline(self, phase: str) -> Optional[str]:
+        if phase == "day" and self.game.game_state == "day":
+            return self.game.skip_speaker()
+        if phase == "discussion" and self.game.game_state == "discussion":
+            return self.game.start_voting()
+        return None
+
+    def on_auto_advance(self, key: tuple):
+        """夜晚或投票的行动齐全且宽限时间已过，自动结束该阶段"""
+        if key != self.advance_key:
+            return
+        game = self.game
+        game.advance_timer = None
+        self.advance_key = None
+        state_before = game.game_state
+        king_before = game.wolf_king_killed
+        text = self.apply_auto_advance(key[0])
+        if text is None:
+            return
+        self.record(["a", key[0]], state_before)
+        if self.outbox is not None:
+            self.send_notices(state_before, king_before)
+        if game.game_state == "ended":
+            self.game_over()
+        self.sync_deadlines()
+        self.announce(text)
+
+    def apply_auto_advance(self, phase: str) -> Optional[str]:
+        game = self.game
+        if phase != game.game_state or not game.phase_complete():
+            return None
+        if phase == "night":
+            return "夜间行动已全部完成\n" + game.end_night()
+        result = "所有存活玩家已投票\n" + game.end_voting()
+        if game.game_state == "night":
+            result += "\n\n" + game.get_night_info()
+        return result
+
+    def on_last_words_deadline(self, qq_id: int):
+        """遗言时间到"""
+        if self.game.last_words_qq != qq_id:
+            return
+        self.game.last_words_timer = None
+        text = self.game.end_last_words()
+        self.record(["w", qq_id], self.game.game_state)
+        self.announce(text)
+
+    def send_notices(self, state_before: str, king_before: Optional[int]):
+        """按阶段变化私聊相关玩家：开局身份、入夜提醒、狼王技能"""
+        game = self.game
+        notices = []
+        if game.game_state == "night" and state_before != "night":
+            notices = game.role_notices() if state_before == "waiting" else game.night_notices()
+        king = game.wolf_king_killed
+        if king is not None and king != king_before:
+            notices.append((king, "你已出局，可以发送 #带走编号 发动狼王技能"))
+        for qq, text in notices:
+            self.outbox.private(qq, text)
+
+    def stream_transcript(self, state_before: str):
+        """描述环节结束时，把当天的描述分段转发到群里，每个刻度发一段"""
+        game = self.game
+        if state_before != "day" or game.game_state != "discussion":
+            return
+        if self.wheel is None or self.outbox is None:
+            return
+        key = (game.seed, game.day_count)
+        for index in range(len(game.transcript)):
+            self.wheel.call_later(self.wheel.tick * (index + 1), self.deliver, self.on_transcript_chunk, key, index)
+
+    def on_transcript_chunk(self, key: tuple, index: int):
+        game = self.game
+        if key != (game.seed, game.day_count) or index >= len(game.transcript):
+            return
+        self.announce(game.transcript.chunk(index))
+
+    def game_over(self):
+        """分出胜负：结果交给战绩库，本局打包进对局记录，都在后台写入"""
+        if self.stats is not None:
+            self.record_results()
+        if self.records is not None and self.game.players:
+            self.pack_record()
+
+    def pack_record(self):
+        """打包本局的二进制记录；分出胜负前中止的对局不分胜负"""
+        game = self.game
+        winner = win_code(game.alive_wolf_count, game.alive_good_count) if game.game_state == "ended" else WIN_NONE
+        self.records.add(self.room_id, game, winner)
+
+    def record_results(self):
+        """分出胜负时把每名玩家的结果交给战绩库，由后台线程写入"""
+        game = self.game
+        self.stats.record_game(self.room_id, game.seed, game.day_count,
+                               win_code(game.alive_wolf_count, game.alive_good_count), game.results())
+
+    def change_stamp(self) -> tuple:
+        """房间的状态摘要：接龙人数加上游戏的状态摘要"""
+        return len(self.player_queue), self.game.change_stamp()
+
+    def record(self, entry: list, state_before: str, stamp_before: Optional[tuple] = None):
+        """
+        记录一条改变状态的事件，写入本局记录和事件日志。stamp_before 为
+        命令处理前的状态摘要，前后相同（被拒绝或没有效果的命令）时不递增
+        版本，渲染缓存和查询去重照常命中；计时器事件总会改变状态。
+        """
+        if stamp_before is None or self.change_stamp() != stamp_before:
+            self.game.version += 1
+        finished = None
+        # 没有事件日志也没有记录出口时不积累事件，免得每个房间多占一份整局的命令
+        if self.journal is not None or record_sink is not None or self.restoring:
+            if not self.history:
+                self.history.append(["s", self.game.seed])
+                if self.journal is not None:
+                    self.journal.append(self.room_id, self.history[0])
+            self.history.append(entry)
+            if self.game.seed != self.history[0][1]:
+                # 游戏已被重置，本局记录到此为止
+                finished, self.history = self.history, []
+        game = self.game
+        if self.records is not None and game.game_state != state_before and game.players:
+            # 阶段切换的时间，打包对局记录时一起写出
+            game.phase_log.append((ANY_STATE.index(game.game_state), game.round_number, self.records.clock()))
+
+        if self.journal is not None:
+            due = self.journal.append(self.room_id, entry)
+            # 开局或结束游戏（进出等待阶段）时写快照
+            if due or (state_before == "waiting") != (self.game.game_state == "waiting"):
+                self.journal.snapshot(self.room_id, self.to_state())
+
+        if finished and state_before != "waiting" and record_sink is not None:
+            record_sink(self.room_id, finished)
+
+    def apply(self, entry: list) -> Optional[str]:
+        """重放一条事件，命令事件返回其回复"""
+        kind = entry[0]
+        if kind == "c":
+            return self.handle_message(entry[1], entry[2], entry[3])
+        if kind == "s":
+            self.game.reseed(entry[1])
+        elif kind == "d":
+            return self.apply_phase_deadline(entry[1])
+        elif kind == "a":
+            return self.apply_auto_advance(entry[1])
+        elif kind == "w" and self.game.last_words_qq == entry[1]:
+            return self.game.end_last_words()
+        return None
+
+    def to_state(self) -> dict:
+        return {
+            "version": STATE_VERSION,
+            "game": self.game.to_state(),
+            "player_queue": [list(entry) for entry in self.player_queue],
+            "history": list(self.history),  # 事件记下后不再修改，可以共用
+        }
+
+    def load_state(self, state: dict):
+        state = migrate_state(state)
+        self.game.load_state(state["game"])
+        self.player_queue = [list(entry) for entry in state["player_queue"]]
+        self.history = [list(entry) for entry in state.get("history", [])]
+
+    def restore(self, snapshot: Optional[dict], entries: List[list]):
+        """从快照和其后的日志恢复房间，重放期间不写日志、不计时、不发消息"""
+        hooks = self.journal, self.wheel, self.outbox, self.actors, self.stats, self.archive, self.records
+        self.journal = self.wheel = self.outbox = self.actors = self.stats = self.archive = self.records = None
+        self.restoring = True
         try:
-            # 管理员命令
-            if message.startswith("#创建游戏副本"):
-                if self.game.game_state != "waiting":
-                    return "游戏已在进行中"
-                self.game.game_creator = user_id
-                self.player_queue = []
-                return "游戏副本已创建，请玩家们发送【#加入游戏副本】进行接龙"
-            
-            elif message.startswith("#加入游戏副本"):
-                if self.game.game_state != "waiting" or not self.game.game_creator:
-                    return "游戏副本未创建或已开始"
-                
-                if user_id in [p[0] for p in self.player_queue]:
-                    return "你已加入队列"
-                
-                self.player_queue.append([user_id, 0])  # [qq_id, number]
-                return f"你已加入游戏副本，当前人数: {len(self.player_queue)}"
-            
-            elif message.startswith("#开始游戏副本"):
-                if user_id != self.game.game_creator:
-                    return "只有创建者可以开始游戏"
-                
-                if len(self.player_queue) < 8:
-                    return f"游戏副本至少需要8人，当前{len(self.player_queue)}人"
-                
-                # 分配序号
-                for i, (qq_id, _) in enumerate(self.player_queue):
-                    self.player_queue[i][1] = i + 1
-                
-                # 开始游戏
-                result = self.game.start_game(self.player_queue)
-                return result
-            
-            elif message.startswith("#我的身份"):
-                if user_id not in self.game.players:
-                    return "你不在游戏中"
-                
-                player = self.game.players[user_id]
-                status = "存活" if player["alive"] else "死亡"
-                return f"你的身份：{player['number']}号 [{status}] {player['role']}"
-            
-            # 玩家设置XP
-            elif message.startswith("#设置XP"):
-                if self.game.game_state == "waiting":
-                    return "游戏未开始"
-                
-                xp = message[6:].strip()  # 去掉"#设置XP"
-                if not xp:
-                    return "请提供你的XP"
-                
-                return self.game.set_player_xp(user_id, xp)
-            
-            # 狼人命令
-            elif message.startswith("#袭击"):
-                if self.game.game_state != "night":
-                    return "当前不是夜晚"
-                
-                try:
-                    target_number = int(message[3:])
-                    target_qq = None
-                    for qq, player in self.game.players.items():
-                        if player["number"] == target_number:
-                            target_qq = qq
-                            break
-                    
-                    if not target_qq:
-                        return "找不到目标玩家"
-                    
-                    return self.game.wolf_attack(user_id, target_qq)
-                except ValueError:
-                    return "请提供正确的玩家编号"
-            
-            # 女巫命令
-            elif message.startswith("#毒杀"):
-                if self.game.game_state != "night":
-                    return "当前不是夜晚"
-                
-                try:
-                    target_number = int(message[3:])
-                    target_qq = None
-                    for qq, player in self.game.players.items():
-                        if player["number"] == target_number:
-                            target_qq = qq
-                            break
-                    
-                    if not target_qq:
-                        return "找不到目标玩家"
-                    
-                    return self.game.witch_poison(user_id, target_qq)
-                except ValueError:
-                    return "请提供正确的玩家编号"
-            
-            # 骑士命令
-            elif message.startswith("#决斗"):
-                if self.game.game_state not in ["day", "discussion"]:
-                    return "当前不能使用骑士技能"
-                
-                try:
-                    target_number = int(message[3:])
-                    target_qq = None
-                    for qq, player in self.game.players.items():
-                        if player["number"] == target_number:
-                            target_qq = qq
-                            break
-                    
-                    if not target_qq:
-                        return "找不到目标玩家"
-                    
-                    result = self.game.knight_duel(user_id, target_qq)
-                    
-                    # 如果骑士技能导致进入夜晚，需要处理
-                    if self.game.game_state == "night":
-                        return result + "\n\n" + self.game.get_night_info()
-                    
-                    return result
-                except ValueError:
-                    return "请提供正确的玩家编号"
-            
-            # 狼王技能
-            elif message.startswith("#带走"):
-                try:
-                    target_number = int(message[3:])
-                    target_qq = None
-                    for qq, player in self.game.players.items():
-                        if player["number"] == target_number:
-                            target_qq = qq
-                            break
-                    
-                    if not target_qq:
-                        return "找不到目标玩家"
-                    
-                    return self.game.wolf_king_skill(user_id, target_qq)
-                except ValueError:
-                    return "请提供正确的玩家编号"
-            
-            # 描述XP
-            elif message.startswith("#描述"):
-                description = message[3:].strip()
-                return self.game.player_describe(user_id, description)
-            
-            # 投票
-            elif message.startswith("#投票"):
-                try:
-                    target_number = int(message[3:])
-                    target_qq = None
-                    for qq, player in self.game.players.items():
-                        if player["number"] == target_number:
-                            target_qq = qq
-                            break
-                    
-                    if not target_qq:
-                        return "找不到目标玩家"
-                    
-                    return self.game.vote(user_id, target_qq)
-                except ValueError:
-                    return "请提供正确的玩家编号"
-            
-            # 主持人命令
-            elif message.startswith("#结束夜晚"):
-                if user_id != self.game.game_creator:
-                    return "只有主持人可以执行此操作"
-                
-                if self.game.game_state != "night":
-                    return "当前不是夜晚"
-                
-                return self.game.end_night()
-            
-            elif message.startswith("#结束讨论"):
-                if user_id != self.game.game_creator:
-                    return "只有主持人可以执行此操作"
-                
-                if self.game.game_state != "discussion":
-                    return "当前不是讨论时间"
-                
-                return self.game.start_voting()
-            
-            elif message.startswith("#结束投票"):
-                if user_id != self.game.game_creator:
-                    return "只有主持人可以执行此操作"
-                
-                if self.game.game_state != "voting":
-                    return "当前不是投票时间"
-                
-                result = self.game.end_voting()
-                if self.game.game_state == "night":
-                    result += "\n\n" + self.game.get_night_info()
-                return result
-            
-            elif message.startswith("#查看状态"):
-                if user_id != self.game.game_creator:
-                    return "只有主持人可以执行此操作"
-                
-                return self.game.get_game_status()
-            
-            elif message.startswith("#存活玩家"):
-                return self.game.get_alive_players()
-            
-            elif message.startswith("#结束游戏副本"):
-                if user_id != self.game.game_creator:
-                    return "只有主持人可以执行此操作"
-                
-                return self.game.end_game()
-            
+            if snapshot is not None:
+                self.load_state(snapshot)
+            for entry in entries:
+                self.apply(entry)
+        finally:
+            del self.restoring
+            self.journal, self.wheel, self.outbox, self.actors, self.stats, self.archive, self.records = hooks
+        if self.wheel is not None:
+            self.sync_deadlines()
+
+    def release(self):
+        """房间交给其他进程：写快照，断开日志、计时和消息出口后重置"""
+        if self.journal is not None:
+            self.journal.snapshot(self.room_id, self.to_state())
+        # 信箱中可能还有本房间的计时器事件，断开后执行也不会写日志
+        self.journal = self.wheel = self.outbox = self.actors = self.stats = self.archive = self.records = None
+        self.deadline_key = self.advance_key = None
+        self.game.reset_game()
+        self.history = []
+
+    def close(self):
+        """房间被回收：重置游戏并删除持久化数据"""
+        if self.records is not None and self.game.players and self.game.game_state != "ended":
+            self.pack_record()  # 进行中的对局被清理，按中止记录
+        self.game.reset_game()
+        self.history = []
+        if self.journal is not None:
+            self.journal.drop(self.room_id)
+
+    def announce(self, text: str):
+        """向房间所在群发送计时器产生的消息"""
+        if self.outbox is not None and self.room_id is not None:
+            self.outbox.group(self.room_id, text)
+
+    def resolve_target(self, arg: str):
+        """将命令参数中的玩家编号解析为QQ号，失败时返回(None, 提示)"""
+        try:
+            target_number = int(arg)
+        except ValueError:
+            return None, "请提供正确的玩家编号"
+
+        target_qq = self.game.find_player_by_number(target_number)
+        if target_qq is None:
+            return None, "找不到目标玩家"
+        return target_qq, None
+
+    def cmd_create(self, user_id: int, arg: str) -> str:
+        self.game.game_creator = user_id
+        self.player_queue = []
+        return "游戏副本已创建，请玩家们发送【#加入游戏副本】进行接龙"
+
+    def cmd_join(self, user_id: int, arg: str) -> str:
+        if not self.game.game_creator:
+            return "游戏副本未创建或已开始"
+
+        if user_id in [p[0] for p in self.player_queue]:
+            return "你已加入队列"
+
+        if len(self.player_queue) >= MEGA_MAX_PLAYERS:
+            return f"人数已满（{MEGA_MAX_PLAYERS}人）"
+
+        self.player_queue.append([user_id, 0])  # [qq_id, number]
+        return f"你已加入游戏副本，当前人数: {len(self.player_queue)}"
+
+    def cmd_start(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有创建者可以开始游戏"
+
+        if len(self.player_queue) < MIN_PLAYERS:
+            return f"游戏副本至少需要{MIN_PLAYERS}人，当前{len(self.player_queue)}人"
+
+        # 大型房间可指定狼人阵营人数，如：#开始游戏副本 狼人30 狼王5
+        overrides = {}
+        for token in arg.split():
+            role, count = token[:2], token[2:]
+            if role not in WOLF_ROLES or not count.isdigit():
+                return "格式：#开始游戏副本 [狼人N] [狼王N]"
+            overrides[role] = int(count)
+        if overrides and len(self.player_queue) <= CLASSIC_MAX_PLAYERS:
+            return f"只有超过{CLASSIC_MAX_PLAYERS}人的大型房间可以指定狼人阵营人数"
+
+        # 分配序号
+        self.player_queue = [(qq_id, i + 1) for i, (qq_id, _) in enumerate(self.player_queue)]
+
+        # 开始游戏
+        return self.game.start_game(self.player_queue, overrides)
+
+    def cmd_identity(self, user_id: int, arg: str) -> str:
+        if user_id not in self.game.players:
+            return "你不在游戏中"
+
+        return self.game.get_identity(user_id)
+
+    def cmd_set_xp(self, user_id: int, arg: str) -> str:
+        xp = arg.strip()
+        if not xp:
+            return "请提供你的XP"
+
+        return self.game.set_player_xp(user_id, xp)
+
+    def cmd_attack(self, user_id: int, arg: str) -> str:
+        target_qq, error = self.resolve_target(arg)
+        if error:
+            return error
+        return self.game.wolf_attack(user_id, target_qq)
+
+    def cmd_poison(self, user_id: int, arg: str) -> str:
+        target_qq, error = self.resolve_target(arg)
+        if error:
+            return error
+        return self.game.witch_poison(user_id, target_qq)
+
+    def cmd_duel(self, user_id: int, arg: str) -> str:
+        target_qq, error = self.resolve_target(arg)
+        if error:
+            return error
+
+        result = self.game.knight_duel(user_id, target_qq)
+
+        # 如果骑士技能导致进入夜晚，需要处理
+        if self.game.game_state == "night":
+            return result + "\n\n" + self.game.get_night_info()
+
+        return result
+
+    def cmd_take(self, user_id: int, arg: str) -> str:
+        target_qq, error = self.resolve_target(arg)
+        if error:
+            return error
+        return self.game.wolf_king_skill(user_id, target_qq)
+
+    def cmd_describe(self, user_id: int, arg: str) -> str:
+        return self.game.player_describe(user_id, arg.strip())
+
+    def cmd_pass(self, user_id: int, arg: str) -> str:
+        if user_id == self.game.last_words_qq:
+            return self.game.end_last_words()
+        if self.game.game_state == "day":
+            return self.game.player_describe(user_id, "")
+        if self.game.game_state == "night" and user_id == self.game.special_roles.get("女巫"):
+            return self.game.witch_pass(user_id)
+        return "当前没有需要结束的发言"
+
+    def cmd_vote(self, user_id: int, arg: str) -> str:
+        target_qq, error = self.resolve_target(arg)
+        if error:
+            return error
+        return self.game.vote(user_id, target_qq)
+
+    def cmd_tally(self, user_id: int, arg: str) -> str:
+        return self.game.get_vote_tally()
+
+    def cmd_transcript(self, user_id: int, arg: str) -> str:
+        arg = arg.strip()
+        if arg and not arg.isdigit():
+            return "格式：#回顾页码"
+        return self.game.get_transcript(int(arg) if arg else 1)
+
+    def cmd_end_night(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        return self.game.end_night()
+
+    def cmd_end_discussion(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        return self.game.start_voting()
+
+    def cmd_end_voting(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+
+        result = self.game.end_voting()
+        if self.game.game_state == "night":
+            result += "\n\n" + self.game.get_night_info()
+        return result
+
+    def cmd_status(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        return self.game.get_game_status()
+
+    def cmd_alive(self, user_id: int, arg: str) -> str:
+        arg = arg.strip()
+        return self.game.get_alive_players(int(arg) if arg.isdigit() else 1)
+
+    def cmd_my_stats(self, user_id: int, arg: str) -> str:
+        if self.stats is None:
+            return "未启用战绩统计"
+        s = self.stats.player_summary(user_id)
+        if not s.games:
+            return "你还没有完成过对局"
+        good_games, good_wins = s.games - s.wolf_games, s.wins - s.wolf_wins
+        return (f"你的战绩：共{s.games}局，胜{s.wins}局（胜率{s.wins / s.games:.0%}）"
+                f"\n好人阵营：{good_games}局，胜{good_wins}局"
+                f"\n狼人阵营：{s.wolf_games}局，胜{s.wolf_wins}局"
+                f"\n被投票出局{s.voted_out}次，被袭击{s.attacked}次，存活到最后{s.survived}次")
+
+    def cmd_leaderboard(self, user_id: int, arg: str) -> str:
+        if self.stats is None:
+            return "未启用战绩统计"
+        rows = self.stats.leaderboard(self.room_id)
+        if not rows:
+            return "本群还没有玩家完成3局以上的对局"
+        lines = ["本群胜场排行："]
+        for rank, (qq, games, wins) in enumerate(rows, 1):
+            lines.append(f"{rank}. {qq}：{wins}胜/{games}局（胜率{wins / games:.0%}）")
+        return "\n".join(lines)
+
+    def cmd_search_xp(self, user_id: int, arg: str) -> str:
+        if self.archive is None:
+            return "未启用XP档案"
+        query = arg.strip()
+        if not query:
+            return "格式：#搜索XP 关键词"
+        entries = self.archive.search(query, group_id=self.room_id)
+        if not entries:
+            return f"本群以往的对局中没有公开过包含「{query}」的XP"
+        lines = [f"本群公开过包含「{query}」的XP（最近{len(entries)}条）："]
+        for when, _, qq, xp in entries:
+            lines.append(f"{time.strftime('%Y-%m-%d', time.localtime(when))} {qq}：{xp}")
+        return "\n".join(lines)
+
+    def cmd_check_xp(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        if self.archive is None:
+            return "未启用XP档案"
+        lines = []
+        for qq in self.game.seat_order:
+            player = self.game.players[qq]
+            if not player.xp:
+                continue
+            for score, (when, _, other, xp) in self.archive.similar(player.xp, group_id=self.room_id, limit=1):
+                lines.append(f"{player.number}号「{player.xp}」与 {other} "
+                             f"{time.strftime('%Y-%m-%d', time.localtime(when))} 的「{xp}」相似（{score:.0%}）")
+        if not lines:
+            return "本局XP与本群以往公开过的XP没有明显重复"
+        return "与以往对局相似的XP：\n" + "\n".join(lines)
+
+    def cmd_metrics(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        if metrics is None:
+            return "未启用性能统计"
+        if arg.strip().lower() == "prometheus":
+            return render_metrics()
+        rooms = {name: value for name, _, labels, value in room_gauges(game_instance) if not labels}
+        text = metrics.summary() + f"\n房间：{rooms['xpwolf_rooms']}个，玩家：{rooms['xpwolf_players']}人"
+        admission = game_instance.admission
+        if admission is not None:
+            dropped = admission.dropped
+            text += (f"\n准入丢弃：玩家限流{dropped['user']}次，房间限流{dropped['room']}次，"
+                     f"重复查询{dropped['dedupe']}次")
+        if actors is not None:
+            text += f"\n信箱已满丢弃：{actors.dropped}条"
+        return text
+
+    def cmd_end_game(self, user_id: int, arg: str) -> str:
+        if user_id != self.game.game_creator:
+            return "只有主持人可以执行此操作"
+        if self.archive is not None:
+            # 结束时公开全部 XP，收录进档案
+            for qq in self.game.seat_order:
+                xp = self.game.players[qq].xp
+                if xp:
+                    self.archive.add(self.room_id, qq, xp)
+        if self.records is not None and self.game.players and self.game.game_state != "ended":
+            # 分出胜负时已经打包过，这里只打包中途结束的对局
+            self.pack_record()
+        self.player_queue = []
+        pages = self.game.end_game()
+        # 第一页作为回复，其余各页随后逐个刻度发到群里，排在回复之后
+        for index, text in enumerate(pages[1:], 1):
+            if self.wheel is not None:
+                self.wheel.call_later(self.wheel.tick * index, self.deliver, self.announce, text)
             else:
-                return "未知命令，请查看游戏副本规则"
-                
-        except Exception as e:
-            return f"处理命令时出错: {str(e)}"
+                self.announce(text)
+        return pages[0]
+
+DISPATCH_TABLE = XPLangBotPlugin.build_dispatch_table()
+
+# 所有房间共用的倒计时时间轮，由 main.py 在事件循环上启动
+timing_wheel = TimingWheel()
+
+# 出站消息队列，由 main.py 在初始化时创建
+outbox: Optional[Outbox] = None
+
+# 房间信箱，由 main.py 在初始化时创建；为 None 时消息和计时器事件直接处理
+actors: Optional[ActorSystem] = None
+
+# 房间事件日志，由 main.py 在初始化时创建并从中恢复房间
+journal: Optional[Journal] = None
+
+# 玩家战绩库，由 main.py 在初始化时创建
+stats: Optional[StatsStore] = None
+
+# 公开过的 XP 档案，由 main.py 在初始化时创建
+xp_archive: Optional[XPArchive] = None
+
+# 二进制对局记录，由 main.py 在初始化时创建
+game_records: Optional[RecordWriter] = None
+
+# 每局结束时的完整事件记录出口 record_sink(group_id, events)，由 main.py 设置
+record_sink: Optional[Callable[[int, List[list]], None]] = None
+
+def create_room(room_id: int) -> XPLangBotPlugin:
+    return XPLangBotPlugin(room_id, wheel=timing_wheel, journal=journal, outbox=outbox, actors=actors,
+                           stats=stats, archive=xp_archive, records=game_records)
+
+# 每个群一个房间，私聊按发送者所在房间路由
+game_instance = RoomRegistry(create_room, admission=Admission(READ_ONLY_COMMANDS, SHARED_QUERY_COMMANDS),
+                             queries=READ_ONLY_COMMANDS)
+
+# 所有房间共用的运行指标，设为 None 即关闭统计
+metrics: Optional[Metrics] = Metrics()
+
+def room_gauges(registry: RoomRegistry):
+    """现场统计房间、玩家、各阶段房间数和出站队列，供导出使用"""
+    phases = dict.fromkeys(ANY_STATE, 0)
+    players = 0
+    for _, room in registry.rooms():
+        phases[room.game.game_state] += 1
+        players += len(room.game.players)
+    yield "xpwolf_rooms", "活跃房间数", {}, len(registry)
+    yield "xpwolf_players", "游戏中的玩家数", {}, players
+    for phase, count in phases.items():
+        yield "xpwolf_rooms_by_phase", "各阶段的房间数", {"phase": phase}, count
+    if outbox is not None:
+        stats = outbox.metrics()
+        yield "xpwolf_outbox_depth", "出站队列中的消息数", {}, stats["depth"]
+        yield "xpwolf_outbox_sent", "累计发送次数", {}, stats["sent"]
+        yield "xpwolf_outbox_coalesced", "累计被合并的消息数", {}, stats["coalesced"]
+        yield "xpwolf_outbox_failed", "累计发送失败次数", {}, stats["failed"]
+        for name, q in (("p50", "0.5"), ("p99", "0.99")):
+            yield "xpwolf_outbox_latency_seconds", "入队到发出的耗时", {"quantile": q}, stats["latency_" + name]
+    if actors is not None:
+        yield "xpwolf_mailbox_depth", "各房间信箱中待处理的消息总数", {}, actors.depth()
+        yield "xpwolf_mailbox_dropped", "信箱已满被丢弃的消息数", {}, actors.dropped
+    admission = registry.admission
+    if admission is not None:
+        yield "xpwolf_admitted", "通过准入控制的命令数", {}, admission.admitted
+        for reason, count in admission.dropped.items():
+            yield "xpwolf_admission_dropped", "被限流或去重丢弃的命令数", {"reason": reason}, count
+        yield ("xpwolf_admission_tracked_users", "正在限流跟踪的玩家数", {},
+               len(admission.users.keys() | admission.actions.keys()))
 
-game_instance = XPLangBotPlugin()
\ No newline at end of file
+def render_metrics() -> str:
+    return metrics.render_prometheus(room_gauges(game_instance))
\ No newline at end of file
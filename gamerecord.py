@@ -0,0 +1,162 @@
+"""
+对局记录：每局结束时把身份、座位、各阶段行动、投票和出局打包成紧凑的二进制记录
+
+对局中 XPLangGame 把结算后的行动记入 action_log，房间在阶段切换时把
+时间记入 phase_log；分出胜负时打包成一条记录（中途结束或被清理的对局
+按不分胜负打包），由后台任务追加写入按日期分的记录文件。
+export_records.py 把一个目录下的记录转成按列存放的 .npy 数组，
+report_records.py 在其上做汇总统计。
+
+记录格式（小端），一个文件中逐条相接：
+  头部  4 字节魔数 b"XPGR" | uint16 格式版本 | int64 群号 | uint64 随机种子 |
+        float64 开局时间 | float64 结束时间 | uint16 人数 | uint16 回合数 |
+        uint8 胜负 | uint8 狼队数 | uint32 行动数 | uint16 阶段数
+  玩家  按序号排列，每人 int64 QQ号 | uint16 序号 | uint8 身份编码 | uint8 狼队
+  行动  每条 uint8 种类 | uint8 细节 | uint16 回合 | uint16 行动者序号 | uint16 目标序号
+  阶段  每个 uint8 阶段编码 | uint16 回合 | float32 距开局的秒数
+
+回合从 1 起，第 n 夜与其后的第 n 个白天同属第 n 回合；序号 0 表示没有。
+狼队从 1 起，经典局和好人为 0。阶段编码为 game.ANY_STATE 中的下标，
+身份编码为 game.Role。XP 内容不写入记录，公开过的 XP 见 archive.py。
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+MAGIC = b"XPGR"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHqQddHHBBIH")
+PLAYER = struct.Struct("<qHBB")
+ACTION = struct.Struct("<BBHHH")
+PHASE = struct.Struct("<BHf")
+RECORD_SUFFIX = ".xpr"
+
+logger = logging.getLogger(__name__)
+
+# 行动种类；细节一栏的含义见各行注释
+ACT_ATTACK = 1  # 狼队袭击，细节为狼队，行动者为 0（不记录具体狼人）
+ACT_POISON = 2  # 女巫毒杀
+ACT_VOTE = 3  # 投票，每名投票人一条
+ACT_DUEL = 4  # 骑士决斗，细节为 1 表示目标是狼人
+ACT_TAKE = 5  # 狼王带走
+ACT_DEATH = 6  # 出局，细节为出局原因编码（与战绩库的 stats.DEATH_CODES 相同），行动者为 0
+ACTION_NAMES = {ACT_ATTACK: "袭击", ACT_POISON: "毒杀", ACT_VOTE: "投票", ACT_DUEL: "决斗", ACT_TAKE: "带走",
+                ACT_DEATH: "出局"}
+
+# 对局中的行动：(种类, 细节, 回合, 行动者QQ, 目标QQ)，QQ 为 0 表示没有
+Action = Tuple[int, int, int, int, int]
+
+# 解出的一局：(头部字段, [(QQ号, 序号, 身份, 狼队)], [(种类, 细节, 回合, 行动者序号, 目标序号)],
+#             [(阶段编码, 回合, 距开局秒数)])；头部字段不含魔数和格式版本
+Record = Tuple[tuple, List[tuple], List[tuple], List[tuple]]
+
+
+def pack_game(room_id: int, game, winner: int, ended: float) -> bytes:
+    """把 XPLangGame 当前的对局打包成一条记录，须在重置之前调用"""
+    players = game.players
+    seat = {qq: p.number for qq, p in players.items()}
+    seat[0] = 0
+    phases = game.phase_log
+    started = phases[0][2] if phases else ended
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, room_id or 0, game.seed, started, ended, len(players),
+                         game.day_count, winner, len(game.wolf_teams), len(game.action_log), len(phases))]
+    team_of = game.team_of
+    parts += [PLAYER.pack(qq, players[qq].number, players[qq].role_code, team_of.get(qq, -1) + 1)
+              for qq in game.seat_order]
+    parts += [ACTION.pack(kind, detail, round_number, seat[actor], seat[target])
+              for kind, detail, round_number, actor, target in game.action_log]
+    parts += [PHASE.pack(phase, round_number, when - started) for phase, round_number, when in phases]
+    return b"".join(parts)
+
+
+def unpack_records(data: bytes) -> Iterator[Record]:
+    """逐条解出 data 中的记录；末尾写了一半的记录忽略"""
+    view = memoryview(data)
+    offset = 0
+    while offset + HEADER.size <= len(view):
+        header = HEADER.unpack_from(view, offset)
+        if header[0] != MAGIC or header[1] != FORMAT_VERSION:
+            raise ValueError(f"偏移 {offset} 处不是对局记录")
+        _, _, _, _, _, _, player_count, _, _, _, action_count, phase_count = header
+        start = offset + HEADER.size
+        end = start + player_count * PLAYER.size + action_count * ACTION.size + phase_count * PHASE.size
+        if end > len(view):
+            break  # 崩溃时写了一半的最后一条
+        tables = []
+        for row, count in ((PLAYER, player_count), (ACTION, action_count), (PHASE, phase_count)):
+            tables.append(list(row.iter_unpack(view[start:start + count * row.size])))
+            start += count * row.size
+        yield (header[2:], *tables)
+        offset = end
+
+
+def record_files(directory: str) -> List[str]:
+    """目录下（含子目录，分片时各工作进程一个）的全部记录文件，按路径排序"""
+    found = []
+    for root, _, names in os.walk(directory):
+        found += [os.path.join(root, name) for name in names if name.endswith(RECORD_SUFFIX)]
+    return sorted(found)
+
+
+def read_records(directory: str) -> Iterator[Record]:
+    for path in record_files(directory):
+        with open(path, "rb") as f:
+            yield from unpack_records(f.read())
+
+
+class RecordWriter:
+    """攒下打包好的记录，定期在线程池中追加到按日期分的文件"""
+
+    def __init__(self, directory: str, flush_interval: float = 1.0, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.clock = clock  # 记录中的时间，基准中可换成模拟时钟
+        self.pending: List[bytes] = []
+        self.written = 0
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, room_id: int, game, winner: int):
+        """打包一局，只放进缓冲区，不等待写盘"""
+        self.pending.append(pack_game(room_id, game, winner, self.clock()))
+
+    def path(self) -> str:
+        day = time.strftime("%Y%m%d", time.localtime(self.clock()))
+        return os.path.join(self.directory, f"games-{day}{RECORD_SUFFIX}")
+
+    def take_pending(self) -> List[bytes]:
+        pending, self.pending = self.pending, []
+        return pending
+
+    def write_records(self, path: str, records: List[bytes]):
+        if records:
+            with open(path, "ab") as f:
+                f.write(b"".join(records))
+            self.written += len(records)
+
+    def flush(self):
+        self.write_records(self.path(), self.take_pending())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            records = self.take_pending()
+            if records:
+                try:
+                    await loop.run_in_executor(None, self.write_records, self.path(), records)
+                except Exception:
+                    logger.exception("写入对局记录失败，丢弃 %d 局", len(records))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
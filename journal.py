@@ -0,0 +1,202 @@
+"""
+房间事件日志：每个房间一个只追加的日志文件，定期压缩为快照
+
+日志和快照都在后台线程中批量写入并 fsync（组提交），游戏逻辑只负责
+把事件放进内存缓冲区。启动时读取快照并重放其后的日志即可恢复房间。
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+SNAPSHOT_SUFFIX = ".snap.json"
+LOG_SUFFIX = ".log"
+
+logger = logging.getLogger(__name__)
+
+
+class PendingWrites:
+    """一个房间在两次提交之间积累的写入"""
+    __slots__ = ("snapshot", "lines", "delete")
+
+    def __init__(self):
+        self.snapshot: Optional[dict] = None  # 新快照（含 seq），写入后清空日志
+        self.lines: List[list] = []  # 带序号的事件，落盘时才编码为 JSON
+        self.delete = False
+
+
+class Journal:
+    def __init__(self, directory: str, flush_interval: float = 0.05, snapshot_every: int = 200):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.pending: Dict[int, PendingWrites] = {}
+        self.seq: Dict[int, int] = {}  # {room_id: 最后一条事件序号}
+        self.since_snapshot: Dict[int, int] = {}
+        self.written_entries = 0
+        self.commits = 0
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None  # 后台正在写的一批
+        # 只用一个写线程，各批按提交顺序落盘，停止时的最后一次提交也排在后台那批之后
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, room_id: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{room_id}{suffix}")
+
+    def _pending(self, room_id: int) -> PendingWrites:
+        writes = self.pending.get(room_id)
+        if writes is None:
+            writes = self.pending[room_id] = PendingWrites()
+        return writes
+
+    def append(self, room_id: int, entry: list) -> bool:
+        """追加一条事件，返回是否该做快照了"""
+        seq = self.seq.get(room_id, 0) + 1
+        self.seq[room_id] = seq
+        writes = self._pending(room_id)
+        writes.lines.append([seq] + entry)
+        count = self.since_snapshot.get(room_id, 0) + 1
+        self.since_snapshot[room_id] = count
+        return count >= self.snapshot_every
+
+    def snapshot(self, room_id: int, state: dict):
+        """记录房间完整状态，之前的日志随之作废；state 须为独立副本"""
+        writes = self._pending(room_id)
+        writes.snapshot = {"seq": self.seq.get(room_id, 0), "state": state}
+        writes.lines = []
+        self.since_snapshot[room_id] = 0
+
+    def drop(self, room_id: int):
+        """删除房间的日志与快照"""
+        writes = self._pending(room_id)
+        writes.snapshot = None
+        writes.lines = []
+        writes.delete = True
+        self.seq.pop(room_id, None)
+        self.since_snapshot.pop(room_id, None)
+
+    def forget(self, room_id: int):
+        """房间交给其他进程后丢弃它的序号，日志与快照保留；须先 sync"""
+        self.seq.pop(room_id, None)
+        self.since_snapshot.pop(room_id, None)
+
+    def take_pending(self) -> Dict[int, PendingWrites]:
+        """取出待写入的内容，之后的追加进入新的缓冲区"""
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def write_batch(self, batch: Dict[int, PendingWrites]):
+        """把一批写入落盘，每个文件只 fsync 一次"""
+        for room_id, writes in batch.items():
+            log_path = self._path(room_id, LOG_SUFFIX)
+            if writes.delete:
+                # 先删除旧文件，同一批中房间重建后的写入接在后面
+                for path in (log_path, self._path(room_id, SNAPSHOT_SUFFIX)):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            if writes.snapshot is not None:
+                snap_path = self._path(room_id, SNAPSHOT_SUFFIX)
+                tmp_path = snap_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(writes.snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, snap_path)
+                # 快照已包含此前所有事件；即使清空日志前崩溃，重放时也会按 seq 跳过
+                mode = "w"
+            else:
+                mode = "a"
+
+            if writes.lines or mode == "w":
+                with open(log_path, mode, encoding="utf-8") as f:
+                    if writes.lines:
+                        f.write("\n".join(json.dumps(line, ensure_ascii=False) for line in writes.lines))
+                        f.write("\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.written_entries += len(writes.lines)
+        self.commits += 1
+
+    def flush(self):
+        """同步提交所有待写入内容"""
+        batch = self.take_pending()
+        if batch:
+            self.write_batch(batch)
+
+    async def run(self):
+        """按间隔在线程池中组提交"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            batch = self.take_pending()
+            if batch:
+                self._writing = loop.run_in_executor(self._writer, self.write_batch, batch)
+                try:
+                    # 任务被取消时这一批照常写完，不随之取消
+                    await asyncio.shield(self._writing)
+                except Exception:
+                    # 磁盘满等错误只丢这一批，之后的事件照常提交
+                    logger.exception("写入事件日志失败，丢弃 %d 个房间的一批写入", len(batch))
+
+    async def sync(self):
+        """等后台正在写的一批落盘，再同步提交其余内容，保证先后顺序"""
+        while self._writing is not None and not self._writing.done():
+            await asyncio.wait([self._writing])
+        self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # 后台可能还在写上一批，最后的提交交给同一个写线程，等它写完
+        self._writer.submit(self.flush).result()
+
+    def load(self, owns: Optional[Callable[[int], bool]] = None
+             ) -> Iterator[Tuple[int, Optional[dict], List[list]]]:
+        """
+        读取所有房间，返回 (room_id, 快照状态或None, 快照之后的事件列表)；
+        提供 owns 时只读取 owns(room_id) 为真的房间。
+        """
+        room_ids = set()
+        for name in os.listdir(self.directory):
+            for suffix in (SNAPSHOT_SUFFIX, LOG_SUFFIX):
+                if name.endswith(suffix):
+                    key = name[:-len(suffix)]
+                    room_id = int(key) if key.lstrip("-").isdigit() else key
+                    if owns is None or owns(room_id):
+                        room_ids.add(room_id)
+
+        for room_id in sorted(room_ids, key=str):
+            snapshot = None
+            last_seq = 0
+            snap_path = self._path(room_id, SNAPSHOT_SUFFIX)
+            if os.path.exists(snap_path):
+                with open(snap_path, encoding="utf-8") as f:
+                    data = json.load(f)
+                snapshot = data["state"]
+                last_seq = data["seq"]
+
+            entries = []
+            log_path = self._path(room_id, LOG_SUFFIX)
+            if os.path.exists(log_path):
+                with open(log_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # 崩溃时写了一半的最后一行
+                        if record[0] > last_seq:
+                            entries.append(record[1:])
+                            last_seq = record[0]
+
+            self.seq[room_id] = last_seq
+            self.since_snapshot[room_id] = len(entries)
+            yield room_id, snapshot, entries
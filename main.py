@@ -4,43 +4,157 @@ XP狼人杀插件 for LangBot 4.x
 """
 from pkg.plugin.context import register, handler, BasePlugin, EventContext
 from pkg.plugin.events import *
+from pkg.platform.types import MessageChain, Plain
 import asyncio
+import json
 import os
 import sys
 
 # 让插件目录可 import
 sys.path.insert(0, os.path.dirname(__file__))
-from game import game_instance   # 引入游戏核心
+import game
+from game import game_instance, timing_wheel   # 引入游戏核心
+from actors import ActorSystem
+from archive import XPArchive
+from gamerecord import RecordWriter
+from journal import Journal
+from outbox import Outbox
+from reload import Reloader, hot_reload
+from shards import ShardPool
+from stats import StatsStore
 
 class XPWolfPlugin(BasePlugin):
     def __init__(self, host):
         super().__init__(host)
+        # 多进程分片，环境变量 XPWOLF_SHARDS 为工作进程数；为 None 时房间都在本进程
+        self.shards = None
+        self.reloader = None
+
+    def router(self):
+        return self.shards if self.shards is not None else game.actors
+
+    def start_reloader(self):
+        # 设置 XPWOLF_HOT_RELOAD=1 时监视 game.py，覆盖文件即热更新，进行中的房间不受影响
+        if os.environ.get("XPWOLF_HOT_RELOAD") != "1":
+            return
+        if self.shards is not None:
+            reload = self.shards.reload
+        else:
+            reload = lambda: hot_reload(game)
+        self.reloader = Reloader(game.__file__, reload)
+        self.reloader.start()
 
     # ---------- 群普通消息 ----------
     @handler(GroupNormalMessageReceived)
     async def group_msg(self, ctx: EventContext):
         msg = ctx.event.text_message.strip()
-        reply = game_instance.handle_message(
-            ctx.event.sender_id, msg, is_private=False
+        # 排进房间信箱按顺序处理，刷屏的房间不影响其他房间；分片时转给房间所在的工作进程
+        reply = await self.router().handle_message(
+            ctx.event.sender_id, msg, is_private=False,
+            group_id=ctx.event.launcher_id
         )
         if reply:
-            ctx.add_return("reply", [reply])
+            # 经出站队列发送，与同房间的其他通知合并、限速
+            game.outbox.group(ctx.event.launcher_id, reply)
             ctx.prevent_default()
 
     # ---------- 私聊普通消息 ----------
     @handler(PersonNormalMessageReceived)
     async def private_msg(self, ctx: EventContext):
         msg = ctx.event.text_message.strip()
-        reply = game_instance.handle_message(
+        reply = await self.router().handle_message(
             ctx.event.sender_id, msg, is_private=True
         )
         if reply:
-            ctx.add_return("reply", [reply])
+            game.outbox.private(ctx.event.sender_id, reply)
             ctx.prevent_default()
 
+    # ---------- 主动发送消息 ----------
+    async def send_text(self, target_type: str, target_id, text: str):
+        adapters = self.host.get_platform_adapters()
+        if not adapters:
+            return
+        await self.host.send_active_message(
+            adapter=adapters[0], target_type=target_type, target_id=str(target_id),
+            message=MessageChain([Plain(text)])
+        )
+
+    # ---------- 对局记录 ----------
+    @staticmethod
+    def append_record(group_id, events):
+        line = json.dumps({"room": group_id, "events": events}, ensure_ascii=False)
+        path = os.path.join(os.path.dirname(__file__), "data", "records", "games.jsonl")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def save_record(self, group_id, events):
+        # 每局结束后追加到记录文件，可用 replay.py 重放；编码和写文件都在线程池中完成
+        loop = asyncio.get_running_loop()
+        if game.actors is not None:
+            loop.run_in_executor(game.actors.pool, self.append_record, group_id, events)
+        else:
+            loop.run_in_executor(None, self.append_record, group_id, events)
+
     # ---------- 插件初始化 ----------
     async def initialize(self):
-        pass
+        shard_count = int(os.environ.get("XPWOLF_SHARDS", "0") or 0)
+        if shard_count > 0:
+            # 房间按群号分到各工作进程，重启时各自恢复归自己的房间；本进程只收发消息
+            game.outbox = Outbox(self.send_text)
+            game.outbox.start()
+            self.shards = ShardPool(shard_count, os.path.join(os.path.dirname(__file__), "data"),
+                                    on_output=game.outbox.put, on_record=self.save_record)
+            await self.shards.start()
+            self.start_reloader()
+            return
+        # 每个房间一个信箱，须在恢复房间之前创建，恢复出的计时器事件也经由信箱处理
+        game.actors = ActorSystem(game_instance)
+        # 回复、倒计时通知和私聊身份都经由出站队列限速发送
+        game.outbox = Outbox(self.send_text)
+        game.outbox.start()
+        game.record_sink = self.save_record
+        # 战绩由后台线程批量写入 SQLite，须在恢复房间之前创建
+        data_dir = os.path.join(os.path.dirname(__file__), "data")
+        os.makedirs(data_dir, exist_ok=True)
+        game.stats = StatsStore(os.path.join(data_dir, "stats.db"))
+        game.stats.start()
+        game.xp_archive = XPArchive(os.path.join(data_dir, "xp_archive"))
+        game.xp_archive.start()
+        # 每局结束时写一条二进制记录，可用 export_records.py 导出成列存数组做统计
+        game.game_records = RecordWriter(os.path.join(data_dir, "records"))
+        game.game_records.start()
+        timing_wheel.start()
+        # 从事件日志恢复重启前的房间
+        game.journal = Journal(os.path.join(os.path.dirname(__file__), "data", "journal"))
+        game_instance.restore(game.journal)
+        game.journal.start()
+        # 定期导出 Prometheus 文本格式的指标，可由 node_exporter 的 textfile 收集器读取
+        if game.metrics is not None:
+            game.metrics.start(os.path.join(os.path.dirname(__file__), "data", "metrics.prom"), game.render_metrics)
+        self.start_reloader()
+
+    def __del__(self):
+        if self.reloader is not None:
+            self.reloader.stop()
+        if self.shards is not None:
+            # 工作进程读到连接断开后自行写快照退出
+            self.shards.close()
+        timing_wheel.stop()
+        if game.outbox is not None:
+            game.outbox.stop()
+        if game.metrics is not None:
+            game.metrics.stop()
+        if game.journal is not None:
+            game.journal.stop()
+        if game.actors is not None:
+            game.actors.shutdown()
+        if game.stats is not None:
+            game.stats.close()
+        if game.xp_archive is not None:
+            game.xp_archive.close()
+        if game.game_records is not None:
+            game.game_records.stop()
 
 # 注册插件
 register(XPWolfPlugin)
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+运行指标：按命令统计的处理耗时直方图、错误与拒绝计数，以及房间状态
+
+直方图采用 HDR 式的对数线性分桶：每个 2 的幂区间再等分为 16 个子桶，
+相对误差不超过 1/16。记录一次只是一次位运算和一次列表自增，不保存
+原始样本，内存固定。导出为 Prometheus 文本格式。
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS  # 每个 2 的幂区间的子桶数
+BUCKET_COUNT = (64 - SUB_BITS) * SUB_COUNT
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_index(value: int) -> int:
+    """值所在的桶：小于 2*SUB_COUNT 的值各占一桶，更大的值按对数线性分桶"""
+    shift = value.bit_length() - SUB_BITS - 1
+    if shift <= 0:
+        return value
+    return (shift << SUB_BITS) + (value >> shift)
+
+
+def bucket_upper(index: int) -> int:
+    """桶内最大值"""
+    shift = (index >> SUB_BITS) - 1
+    if shift <= 0:
+        return index
+    return (((index - (shift << SUB_BITS)) + 1) << shift) - 1
+
+
+class Histogram:
+    """整数值（纳秒）的对数线性直方图"""
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.max = 0
+
+    @property
+    def count(self) -> int:
+        # 只在导出时用到，不在记录时另外计数
+        return sum(self.counts)
+
+    def record(self, value: int):
+        # 在热路径上，bucket_index 手工内联
+        shift = value.bit_length() - SUB_BITS - 1
+        self.counts[(shift << SUB_BITS) + (value >> shift) if shift > 0 else value] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantiles(self, fractions: Iterable[float]) -> List[int]:
+        """各分位数的近似值（所在桶的上界），fractions 须从小到大"""
+        result = []
+        fractions = list(fractions)
+        count = self.count
+        if not count:
+            return [0] * len(fractions)
+        seen = 0
+        targets = iter(fractions)
+        target = next(targets)
+        for index, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while seen >= target * count:
+                result.append(min(bucket_upper(index), self.max))
+                target = next(targets, None)
+                if target is None:
+                    return result
+        while len(result) < len(fractions):
+            result.append(self.max)
+        return result
+
+    def merge(self, other: "Histogram"):
+        for index, c in enumerate(other.counts):
+            if c:
+                self.counts[index] += c
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Metrics:
+    """全部房间共用的指标"""
+
+    def __init__(self):
+        self.latency: Dict[str, Histogram] = {}  # {命令: 处理耗时}
+        self.errors: Dict[str, int] = {}  # {命令: 处理时抛出异常的次数}
+        self.rejected: Dict[str, int] = {}  # {命令: 因阶段不符被拒绝的次数}
+        self.unknown = 0  # 未知命令次数
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(self, command: str, elapsed_ns: int):
+        try:
+            histogram = self.latency[command]
+        except KeyError:
+            histogram = self.latency[command] = Histogram()
+        histogram.record(elapsed_ns)
+
+    def error(self, command: str):
+        self.errors[command] = self.errors.get(command, 0) + 1
+
+    def reject(self, command: str):
+        self.rejected[command] = self.rejected.get(command, 0) + 1
+
+    def render_prometheus(self, gauges: Iterable[Tuple[str, str, Dict[str, str], float]] = ()) -> str:
+        """
+        导出 Prometheus 文本格式。gauges 为 (指标名, 说明, 标签, 值)，
+        由调用方从房间表等处现场统计。
+        """
+        lines = [
+            "# HELP xpwolf_command_seconds 命令处理耗时",
+            "# TYPE xpwolf_command_seconds summary",
+        ]
+        for command, histogram in sorted(self.latency.items()):
+            label = f'command="{escape(command)}"'
+            for q, value in zip(QUANTILES, histogram.quantiles(QUANTILES)):
+                lines.append(f'xpwolf_command_seconds{{{label},quantile="{q}"}} {value / 1e9:.9f}')
+            lines.append(f"xpwolf_command_seconds_sum{{{label}}} {histogram.total / 1e9:.9f}")
+            lines.append(f"xpwolf_command_seconds_count{{{label}}} {histogram.count}")
+
+        for name, help_text, counts in (
+            ("xpwolf_command_errors_total", "命令处理异常次数", self.errors),
+            ("xpwolf_command_rejected_total", "因阶段不符被拒绝的命令次数", self.rejected),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for command, count in sorted(counts.items()):
+                lines.append(f'{name}{{command="{escape(command)}"}} {count}')
+        lines.append("# HELP xpwolf_unknown_commands_total 未知命令次数")
+        lines.append("# TYPE xpwolf_unknown_commands_total counter")
+        lines.append(f"xpwolf_unknown_commands_total {self.unknown}")
+
+        described = set()
+        for name, help_text, labels, value in gauges:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+            label = ",".join(f'{k}="{escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label}}} {value}" if label else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top: int = 8) -> str:
+        """聊天里查看用的简要统计"""
+        lines = ["命令处理耗时（次数 / p50 / p99，微秒）："]
+        ranked = sorted(self.latency.items(), key=lambda item: -item[1].count)[:top]
+        for command, histogram in ranked:
+            p50, p99 = histogram.quantiles((0.5, 0.99))
+            lines.append(f"{command}: {histogram.count} / {p50 / 1000:.1f} / {p99 / 1000:.1f}")
+        if self.errors:
+            lines.append("异常：" + "，".join(f"{c} {n}次" for c, n in sorted(self.errors.items())))
+        if self.rejected:
+            lines.append("拒绝：" + "，".join(f"{c} {n}次" for c, n in sorted(self.rejected.items())))
+        lines.append(f"未知命令：{self.unknown}次")
+        return "\n".join(lines)
+
+    def write(self, path: str, text: str):
+        """原子地写入导出文件，供 node_exporter 的 textfile 收集器读取"""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    async def run(self, path: str, render: Callable[[], str], interval: float):
+        loop = asyncio.get_running_loop()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.write, path, render())
+            except Exception:
+                logger.exception("导出运行指标失败")
+
+    def start(self, path: str, render: Callable[[], str], interval: float = 15.0):
+        """定期把 render() 的结果写入 path"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(path, render, interval))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,170 @@
+"""
+出站消息队列：所有群消息和私聊都经由这里按令牌桶节奏发出
+
+同一个目标（群或玩家）排队中的多条消息在发送时合并为一条，所以同一
+房间接连产生的回复和通知只占一次发送；不同目标之间并发发送，并发数
+有上限。开局时给每名玩家私聊身份就是一次这样的扇出。
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+GROUP = "group"
+PERSON = "person"
+
+# 发送函数 sender(target_type, target_id, text)
+Sender = Callable[[str, int, str], Awaitable[None]]
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个令牌，最多积攒 burst 个"""
+    __slots__ = ("rate", "burst", "tokens", "updated", "clock")
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回需要等待的秒数；令牌可以透支，等待时间随之累加"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class Outbox:
+    def __init__(self, sender: Sender, rate: float = 5.0, burst: int = 10, concurrency: int = 4,
+                 max_length: int = 1500, clock: Callable[[], float] = time.monotonic):
+        self.sender = sender
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.concurrency = concurrency
+        self.max_length = max_length  # 合并后单条消息的长度上限
+        self.clock = clock
+        # {(目标类型, 目标): [(文本, 入队时间), ...]}，按最早入队排序
+        self.pending: "OrderedDict[Tuple[str, int], List[Tuple[str, float]]]" = OrderedDict()
+        self.in_flight: Set[Tuple[str, int]] = set()  # 正在发送的目标，保证同一目标内有序
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.latency = Histogram()  # 入队到发出的耗时（纳秒）
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Set[asyncio.Task] = set()  # 正在发送的任务，持有引用以免被回收
+
+    def group(self, group_id: int, text: str):
+        self.put(GROUP, group_id, text)
+
+    def private(self, user_id: int, text: str):
+        self.put(PERSON, user_id, text)
+
+    def put(self, target_type: str, target_id: int, text: str):
+        if not text:
+            return
+        queue = self.pending.get((target_type, target_id))
+        if queue is None:
+            queue = self.pending[(target_type, target_id)] = []
+        queue.append((text, self.clock()))
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def take(self) -> Optional[Tuple[Tuple[str, int], str, List[float]]]:
+        """取出最早排队且不在发送中的目标，把它排队的消息合并为一条"""
+        for target, queue in self.pending.items():
+            if target not in self.in_flight:
+                break
+        else:
+            return None
+        parts = [queue[0][0]]
+        size = len(parts[0])
+        count = 1
+        while count < len(queue) and size + 2 + len(queue[count][0]) <= self.max_length:
+            size += 2 + len(queue[count][0])
+            parts.append(queue[count][0])
+            count += 1
+        enqueued = [t for _, t in queue[:count]]
+        if count == len(queue):
+            del self.pending[target]
+        else:
+            del queue[:count]
+        self.depth -= count
+        self.coalesced += count - 1
+        return target, "\n\n".join(parts), enqueued
+
+    async def run(self):
+        """按令牌桶节奏取出消息，交给后台任务并发发送"""
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._slots.acquire()
+            # 先等令牌再取消息，等待期间新到的同目标消息可以一并合并
+            await asyncio.sleep(self.bucket.reserve())
+            item = self.take()
+            if item is None:
+                # 排队的目标都在发送中，退还令牌，等任一发送完成
+                self.bucket.tokens += 1
+                self._slots.release()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self.in_flight.add(item[0])
+            task = loop.create_task(self.deliver(*item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def deliver(self, target: Tuple[str, int], text: str, enqueued: List[float]):
+        try:
+            await self.sender(target[0], target[1], text)
+            self.sent += 1
+            now = self.clock()
+            for t in enqueued:
+                self.latency.record(int((now - t) * 1e9))
+        except Exception:
+            self.failed += 1
+            logger.exception("发送消息失败: %s", target)
+        finally:
+            self.in_flight.discard(target)
+            self._slots.release()
+            self._wakeup.set()
+
+    def metrics(self) -> Dict[str, float]:
+        """队列深度与发送延迟统计，延迟单位为秒"""
+        p50, p99 = self.latency.quantiles((0.5, 0.99))
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "latency_p50": p50 / 1e9,
+            "latency_p99": p99 / 1e9,
+            "latency_max": self.latency.max / 1e9,
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,298 @@
+"""
+热更新：换上修改后的 game.py，进行中的房间不丢失
+
+  1. 在线程池中读取并编译新源码
+  2. 试运行：新代码在独立的命名空间中执行，逐批把各房间当前的状态载入
+     新的类，任何一步出错都放弃更新，旧代码和房间不受影响
+  3. 暂停（在事件循环上一次完成，期间没有消息或计时器事件插进来）：
+     用旧代码把所有房间导出为带版本号的状态，清空原模块后在其中执行
+     新代码（新代码删掉的名字不会残留），沿用时间轮、日志、出站队列、
+     房间表等运行时对象，再把各房间换成 Frozen 占位，倒计时和信箱中的
+     事件改为指向占位
+  4. 解冻：后台逐批用新的类创建房间，按版本迁移后载入状态；在此之前
+     房间一被用到（消息、计时器、查询）就立即载入
+
+暂停只做导出和换代码，与每个房间的载入耗时无关，数百个房间也只需几毫秒。
+
+部署时先写到同目录的临时文件，再用 os.replace（mv）换上 game.py，不要
+直接覆盖：写到一半的文件可能恰好能编译，会被当成新代码换上。
+"""
+import asyncio
+import gc
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 重新执行模块时会被覆盖、需要沿用的运行时对象
+HOOKS = ("timing_wheel", "outbox", "actors", "journal", "stats", "xp_archive", "game_records", "record_sink",
+         "metrics", "game_instance")
+
+# 游戏上的倒计时与房间上对应的阶段标记，沿用原来的到期时间
+TIMERS = ("discussion_timer", "last_words_timer", "advance_timer")
+TIMER_KEYS = ("deadline_key", "advance_key")
+
+# 换代码和载入房间时要用到的名字，新代码缺少任何一个都不更新
+REQUIRED = ("XPLangBotPlugin", "create_room", "READ_ONLY_COMMANDS", "SHARED_QUERY_COMMANDS", "DISPATCH_TABLE") + HOOKS
+
+
+def compile_source(module):
+    """读取并编译模块的当前源码，可在线程池中执行"""
+    with open(module.__file__, "rb") as f:
+        source = f.read()
+    return compile(source, module.__file__, "exec", dont_inherit=True)
+
+
+async def rehearse(module, code, budget: float = 0.002) -> Dict[int, tuple]:
+    """
+    在独立的命名空间中执行新代码，并把各房间当前的状态逐批载入新的类
+    （每批最多占用 budget 秒），
+    出错时抛出异常。返回预先导出的状态 {群号: (房间, 状态版本, 状态)}，
+    暂停时状态版本没变的房间直接沿用，不必再导出。
+    """
+    namespace = {"__name__": module.__name__, "__file__": module.__file__}
+    exec(code, namespace)
+    missing = [name for name in REQUIRED if name not in namespace]
+    if missing:
+        raise RuntimeError(f"新代码缺少 {', '.join(missing)}")
+    plugin = namespace["XPLangBotPlugin"]
+    exported = {}
+    deadline = time.perf_counter() + budget
+    for group_id, room in list(module.game_instance.rooms()):
+        version = room.version
+        state = room.to_state()
+        # 载入时状态按新代码迁移，暂停时沿用也不会再迁移一次
+        plugin().load_state(state)
+        exported[group_id] = (room, version, state)
+        if time.perf_counter() > deadline:
+            await asyncio.sleep(0)
+            deadline = time.perf_counter() + budget
+    return exported
+
+
+class Method:
+    """冻结房间上的方法：被调用时先载入房间，再调用新房间的同名方法"""
+    __slots__ = ("frozen", "name")
+
+    def __init__(self, frozen: "Frozen", name: str):
+        self.frozen = frozen
+        self.name = name
+
+    def __call__(self, *args):
+        return getattr(self.frozen.thaw(), self.name)(*args)
+
+
+class Frozen:
+    """已用旧代码导出状态、尚未用新代码载入的房间，属性一被访问就载入"""
+    __slots__ = ("registry", "group_id", "state", "old", "room")
+
+    def __init__(self, registry, group_id: int, state: dict, old):
+        self.registry = registry
+        self.group_id = group_id
+        self.state = state
+        self.old = old  # 原来的房间，只用来交接倒计时和版本
+        self.room = None
+
+    def freeze(self, fn):
+        """旧房间的绑定方法换成冻结房间的同名方法，其他函数不变"""
+        if getattr(fn, "__self__", None) is self.old:
+            return Method(self, fn.__name__)
+        return fn
+
+    def rebind(self, fn):
+        """冻结房间的方法换成新房间的同名方法，新代码没有该方法时为 None"""
+        if isinstance(fn, Method) and fn.frozen is self:
+            return getattr(self.room, fn.name, None)
+        return fn
+
+    def thaw(self):
+        """用新代码创建房间并载入状态，换进房间表；只载入一次"""
+        room = self.room
+        if room is not None:
+            return room
+        old = self.old
+        room = self.room = self.registry.factory(self.group_id)
+        try:
+            room.load_state(self.state)
+        except Exception:
+            # 试运行时已载入过同样格式的状态，到这里只可能是状态在那之后变得异常
+            logger.exception("房间 %s 载入失败，已重置", self.group_id)
+            room.game.reset_game()
+        room.game.version = old.game.version + 1  # 准入控制按版本去重，新房间的版本不能回退
+        dropped = move_timers(old, room, self.rebind)
+        self.registry.replace(self.group_id, room)
+        if room.actors is not None:
+            room.actors.retarget(self.group_id, self.rebind)
+        if dropped and room.wheel is not None:
+            room.sync_deadlines()
+        self.state = self.old = None
+        return room
+
+    def __getattr__(self, name):
+        return getattr(self.thaw(), name)
+
+
+def move_timers(old, new, rebind: Callable[[Callable], Optional[Callable]]) -> bool:
+    """
+    把旧房间的倒计时原样交给新房间，到期时间不变。回调在新代码中已不存在
+    的倒计时取消，返回 True，由调用方让新房间重新计时。
+    """
+    for name in TIMER_KEYS:
+        setattr(new, name, getattr(old, name))
+    dropped = False
+    for name in TIMERS:
+        handle = getattr(old.game, name)
+        setattr(old.game, name, None)
+        if handle is not None and not handle.cancelled:
+            callback = rebind(handle.callback)
+            args = tuple(rebind(arg) if callable(arg) else arg for arg in handle.args)
+            if callback is None or None in args:
+                handle.cancel()
+                dropped = True
+                continue
+            handle.callback, handle.args = callback, args
+        # 已到期、事件还在信箱中的倒计时也照搬，与不更新时的状态一致
+        setattr(new.game, name, handle)
+    return dropped
+
+
+def swap(module, code, exported: Optional[Dict[int, tuple]] = None) -> Tuple[List[Frozen], dict]:
+    """
+    暂停：导出所有房间，在原模块中执行新代码，把房间换成 Frozen 占位。
+    exported 为 rehearse 预先导出的状态，其后没有变化的房间不再导出。
+    返回 (占位列表, 各步骤耗时毫秒)；执行新代码出错时恢复原模块并抛出异常。
+    """
+    timings = {}
+    start = time.perf_counter()
+    # 暂停期间分配大量小对象，关掉循环垃圾回收，免得中途触发一次全量回收
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        registry = module.game_instance
+        rooms = list(registry.rooms())
+        # 带版本号的状态：{"version": STATE_VERSION, "game": {...}, "player_queue": [...], "history": [...]}
+        states = []
+        reused = 0
+        for group_id, room in rooms:
+            cached = exported.get(group_id) if exported else None
+            if cached is not None and cached[0] is room and cached[1] == room.version:
+                states.append(cached[2])
+                reused += 1
+            else:
+                states.append(room.to_state())
+        timings["capture"] = (time.perf_counter() - start) * 1000
+        timings["reused"] = reused
+
+        mark = time.perf_counter()
+        saved = dict(module.__dict__)
+        try:
+            # 只留下模块自身的 __name__、__file__ 等，旧代码定义的名字一个不留
+            module.__dict__.clear()
+            module.__dict__.update({name: value for name, value in saved.items()
+                                    if name.startswith("__") and name.endswith("__")})
+            exec(code, module.__dict__)
+        except BaseException:
+            module.__dict__.clear()
+            module.__dict__.update(saved)
+            raise
+        module.__dict__.update({name: saved[name] for name in HOOKS})
+        registry.factory = module.create_room
+        registry.queries = tuple(module.READ_ONLY_COMMANDS)
+        if registry.admission is not None:
+            # 准入控制沿用原对象（限流状态不丢），只读命令表换成新代码的
+            registry.admission.read_only = tuple(module.READ_ONLY_COMMANDS)
+            registry.admission.shared = tuple(module.SHARED_QUERY_COMMANDS)
+        timings["exec"] = (time.perf_counter() - mark) * 1000
+
+        mark = time.perf_counter()
+        actors = module.actors
+        frozen = []
+        for (group_id, old), state in zip(rooms, states):
+            room = Frozen(registry, group_id, state, old)
+            for name in TIMERS:
+                handle = getattr(old.game, name)
+                if handle is not None and not handle.cancelled:
+                    handle.callback = room.freeze(handle.callback)
+                    handle.args = tuple(room.freeze(arg) if callable(arg) else arg for arg in handle.args)
+            if actors is not None:
+                actors.retarget(group_id, room.freeze)
+            # 旧房间断开日志、计时和消息出口，残留的引用不会再产生副作用
+            old.journal = old.wheel = old.outbox = old.actors = old.stats = old.archive = old.records = None
+            registry.replace(group_id, room)
+            frozen.append(room)
+        timings["freeze"] = (time.perf_counter() - mark) * 1000
+    finally:
+        if collecting:
+            gc.enable()
+    timings["pause"] = (time.perf_counter() - start) * 1000
+    return frozen, timings
+
+
+def thaw(frozen: List[Frozen], start: int, budget: float = 0.002) -> int:
+    """从 frozen[start] 起载入房间，至少一个、最多占用 budget 秒，返回下一批的起点"""
+    deadline = time.perf_counter() + budget
+    while start < len(frozen):
+        frozen[start].thaw()
+        start += 1
+        if time.perf_counter() > deadline:
+            break
+    return start
+
+
+async def hot_reload(module, budget: float = 0.002) -> Tuple[int, dict]:
+    """
+    热更新 module（game 模块），返回 (房间数, 各步骤耗时毫秒)。试运行失败时
+    抛出异常，不做任何改动。试运行和载入都分批进行，每批最多占用 budget 秒。
+    """
+    code = await asyncio.get_running_loop().run_in_executor(None, compile_source, module)
+    exported = await rehearse(module, code, budget)
+    frozen, timings = swap(module, code, exported)
+    longest = 0.0
+    start = 0
+    while start < len(frozen):
+        await asyncio.sleep(0)
+        mark = time.perf_counter()
+        start = thaw(frozen, start, budget)
+        longest = max(longest, (time.perf_counter() - mark) * 1000)
+    timings["thaw_batch"] = longest
+    return len(frozen), timings
+
+
+class Reloader:
+    """监视 game.py 的修改时间，变化后调用 reload()；部署时用 os.replace 原子地换上新文件"""
+
+    def __init__(self, path: str, reload: Callable, interval: float = 2.0):
+        self.path = path
+        self.reload = reload  # 异步函数，返回 (房间数, 各步骤耗时毫秒)
+        self.interval = interval
+        self.mtime = os.stat(path).st_mtime_ns
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue  # 部署过程中文件可能暂时不存在
+            if mtime == self.mtime:
+                continue
+            self.mtime = mtime
+            try:
+                count, timings = await self.reload()
+            except Exception:
+                # 文件可能还没写完或新代码有错，保持旧代码，下次修改时再试
+                logger.exception("热更新失败，继续使用原来的代码")
+                continue
+            logger.info("热更新完成：%s 个房间，暂停 %.2f ms", count, timings["pause"])
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
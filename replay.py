@@ -0,0 +1,92 @@
+"""
+对局重放：把记录的事件流无界面地重新送入 XPLangBotPlugin
+
+记录为每局一个事件列表，首条是 ["s", 随机种子]，之后是
+["c", qq, 消息, 是否私聊]、["d", 阶段]、["a", 阶段]、["w", qq] 等事件，格式与事件日志
+相同。同一份记录在同一版本的代码上重放结果必定相同，可用于复核有争议
+的对局，或在两个版本之间二分定位回归。
+
+用法:
+  python replay.py games.jsonl              逐局输出结果摘要
+  python replay.py games.jsonl --show 3     打印第3局的完整回放
+  python replay.py games.jsonl --bench      测量重放速度
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import XPLangBotPlugin  # noqa: E402
+
+
+def replay(events: List[list]) -> List[Tuple[list, Optional[str]]]:
+    """重放一局，返回 [(事件, 回复), ...]"""
+    plugin = XPLangBotPlugin()
+    return [(entry, plugin.apply(entry)) for entry in events]
+
+
+def digest(transcript: List[Tuple[list, Optional[str]]]) -> str:
+    """回放结果的摘要，两个版本摘要不同说明行为有差异"""
+    h = hashlib.sha1()
+    for _, reply in transcript:
+        h.update((reply or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def outcome(transcript: List[Tuple[list, Optional[str]]]) -> str:
+    """找出胜负结果"""
+    for _, reply in reversed(transcript):
+        if reply and "游戏结束！" in reply:
+            return reply[reply.rindex("游戏结束！") + len("游戏结束！"):].split("\n")[0]
+    return "未分胜负"
+
+
+def load_records(path: str) -> Iterator[List[list]]:
+    """读取记录文件，每行一局：事件列表，或带 events 字段的对象"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield record["events"] if isinstance(record, dict) else record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--show", type=int, help="打印第N局（从1开始）的完整回放")
+    parser.add_argument("--bench", action="store_true", help="测量重放速度")
+    args = parser.parse_args()
+
+    records = list(load_records(args.path))
+
+    if args.bench:
+        events = sum(len(r) for r in records)
+        start = time.perf_counter()
+        for record in records:
+            replay(record)
+        elapsed = time.perf_counter() - start
+        print(f"重放 {len(records)} 局 / {events} 个事件: {elapsed:.2f} 秒，"
+              f"{len(records) / elapsed:,.0f} 局/秒，{events / elapsed:,.0f} 事件/秒")
+        return
+
+    if args.show:
+        for entry, reply in replay(records[args.show - 1]):
+            print(json.dumps(entry, ensure_ascii=False))
+            if reply:
+                print("  -> " + reply.replace("\n", "\n     "))
+        return
+
+    for index, record in enumerate(records, 1):
+        transcript = replay(record)
+        print(f"{index}\t种子 {record[0][1]}\t{len(record)} 个事件\t{digest(transcript)}\t{outcome(transcript)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+对局记录统计示例：读取 export_records.py 导出的列存数组，输出常用的汇总
+
+  - 各身份的胜率
+  - 各阶段耗时（平均、中位数、90 分位）
+  - 第一夜被袭击玩家的身份分布
+  - 每天投票的分散程度：得票目标数、最高票占比、投给狼人阵营的比例
+  - 骑士决斗命中率
+  - 狼王出局后带走一人的比例
+
+所有统计都是整列的向量运算，数万局也只需零点几秒。需要 numpy。
+
+用法: python report_records.py out/
+"""
+import argparse
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # 只有统计脚本需要 numpy，机器人本身不依赖
+    np = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import ANY_STATE, ROLE_LABELS, WIN_GOOD, WIN_WOLF, WOLF_CODES, Role  # noqa: E402
+from gamerecord import ACT_ATTACK, ACT_DEATH, ACT_DUEL, ACT_TAKE, ACT_VOTE  # noqa: E402
+from stats import DEATH_CODES  # noqa: E402
+
+
+class Table:
+    """一张导出的表，列按需从 .npy 映射读入"""
+
+    def __init__(self, directory: str, name: str):
+        self.path = os.path.join(directory, name)
+
+    def __getattr__(self, column: str):
+        values = np.load(os.path.join(self.path, column + ".npy"), mmap_mode="r")
+        setattr(self, column, values)
+        return values
+
+
+def rate(hits, total) -> str:
+    return f"{hits / total:6.1%}" if total else "     -"
+
+
+def report(directory: str):
+    games, players, actions, phases = (Table(directory, name) for name in ("games", "players", "actions", "phases"))
+    count = len(games.winner)
+    decided = np.isin(games.winner, (WIN_GOOD, WIN_WOLF))
+    print(f"共 {count} 局，分出胜负 {int(decided.sum())} 局")
+    if decided.any():
+        print(f"好人胜 {rate((games.winner == WIN_GOOD).sum(), decided.sum()).strip()}，"
+              f"狼人胜 {rate((games.winner == WIN_WOLF).sum(), decided.sum()).strip()}，"
+              f"平均 {games.rounds[decided].mean():.2f} 天")
+
+    # 各身份胜率：只统计分出胜负的对局
+    finished = decided[players.game]
+    roles = players.role[finished]
+    total = np.bincount(roles, minlength=len(ROLE_LABELS))
+    wins = np.bincount(roles, weights=players.won[finished], minlength=len(ROLE_LABELS))
+    survived = np.bincount(roles, weights=players.death_round[finished] == 0, minlength=len(ROLE_LABELS))
+    print("\n身份    人次      胜率    存活率")
+    for code, label in enumerate(ROLE_LABELS):
+        print(f"{label:<4}{total[code]:>8}  {rate(wins[code], total[code])}  {rate(survived[code], total[code])}")
+
+    # 各阶段耗时
+    print("\n阶段        次数   平均(秒)  中位数(秒)  90分位(秒)")
+    for code, state in enumerate(ANY_STATE):
+        durations = phases.duration[phases.phase == code]
+        if state in ("waiting", "ended") or not len(durations):
+            continue
+        print(f"{state:<10}{len(durations):>6}  {durations.mean():>9.1f}  {np.median(durations):>10.1f}  "
+              f"{np.percentile(durations, 90):>10.1f}")
+
+    kind, round_number = actions.kind, actions.round
+
+    # 第一夜袭击
+    first = (kind == ACT_ATTACK) & (round_number == 1)
+    targets = np.bincount(actions.target_role[first], minlength=len(ROLE_LABELS))
+    print(f"\n第一夜袭击 {int(first.sum())} 次，目标身份：" +
+          "，".join(f"{label} {rate(targets[code], first.sum()).strip()}" for code, label in enumerate(ROLE_LABELS)))
+
+    # 投票分散程度：按 (对局, 回合) 分组
+    votes = kind == ACT_VOTE
+    if votes.any():
+        day = actions.game[votes].astype(np.int64) * 65536 + round_number[votes]
+        pair = day * 65536 + actions.target[votes]
+        days, day_index = np.unique(day, return_inverse=True)
+        ballots = np.bincount(day_index)
+        pairs, pair_index = np.unique(pair, return_inverse=True)
+        per_pair = np.bincount(pair_index)
+        pair_day = np.searchsorted(days, pairs // 65536)
+        spread = np.bincount(pair_day, minlength=len(days))
+        top = np.zeros(len(days), dtype=np.int64)
+        np.maximum.at(top, pair_day, per_pair)
+        leaders = np.bincount(pair_day, weights=per_pair == top[pair_day], minlength=len(days))
+        wolf_votes = np.isin(actions.target_role[votes], list(WOLF_CODES))
+        print(f"\n投票 {len(days)} 天：每天平均 {ballots.mean():.1f} 票投给 {spread.mean():.1f} 名玩家，"
+              f"最高票平均占 {(top / ballots).mean():.1%}，"
+              f"最高票唯一（有人出局）{rate((leaders == 1).sum(), len(days)).strip()}，"
+              f"投给狼人阵营的票 {wolf_votes.mean():.1%}")
+
+    # 骑士决斗
+    duels = kind == ACT_DUEL
+    print(f"\n骑士决斗 {int(duels.sum())} 次，命中狼人 {rate(actions.detail[duels].sum(), duels.sum()).strip()}")
+
+    # 狼王：被袭击或投票出局时可带走一人
+    deaths = kind == ACT_DEATH
+    king_out = deaths & (actions.target_role == Role.WOLF_KING) & np.isin(
+        actions.detail, (DEATH_CODES["袭击"], DEATH_CODES["投票"]))
+    takes = (kind == ACT_TAKE).sum()
+    print(f"狼王可发动技能 {int(king_out.sum())} 次，带走 {int(takes)} 人（{rate(takes, king_out.sum()).strip()}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="export_records.py 的输出目录")
+    args = parser.parse_args()
+    if np is None:
+        sys.exit("统计脚本需要 numpy：pip install numpy")
+    start = time.perf_counter()
+    report(args.directory)
+    print(f"\n统计用时 {time.perf_counter() - start:.3f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+游戏房间注册表：按群号分房，私聊按发送者所在房间路由
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 会让发送者成为房间成员的命令
+JOIN_COMMANDS = ("#创建游戏副本", "#加入游戏副本")
+# 可能让玩家离开房间的命令，处理后解除已不在房间中的玩家的私聊路由
+LEAVE_COMMANDS = ("#创建游戏副本", "#结束游戏副本")
+
+NO_ROOM_REPLY = "本群还没有游戏副本，请先发送【#创建游戏副本】"
+
+
+class RoomRegistry:
+    """
+    按群号索引的房间表。
+
+    房间分散在若干个 OrderedDict 分片中，查找为 O(1)；每个分片按最近
+    访问顺序排列，分片超出容量时淘汰该分片中最久未活动的房间（近似LRU）。
+    空闲超时的清理按分片轮转进行，每次只扫描一个分片的队首，避免一次性
+    遍历所有房间。
+    """
+
+    def __init__(self, factory: Callable[[int], object], max_rooms: int = 5000,
+                 idle_timeout: float = 2 * 3600, shard_count: int = 16,
+                 sweep_interval: float = 30.0, admission=None, queries: Tuple[str, ...] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.admission = admission  # 提供时在分发前限流、合并重复查询
+        self.queries = tuple(queries)  # 群里还没有房间时也能回答的只读命令（如战绩排行）
+        self.max_rooms = max_rooms
+        self.idle_timeout = idle_timeout
+        self.shard_count = shard_count
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.shards: List["OrderedDict[int, list]"] = [OrderedDict() for _ in range(shard_count)]
+        self.shard_capacity = max(1, -(-max_rooms // shard_count))  # 向上取整
+        self.members: Dict[int, int] = {}  # {qq_id: group_id} 私聊路由
+        self.evicted_count = 0
+        self._next_sweep = clock() + sweep_interval
+        self._sweep_shard = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def _shard(self, group_id: int) -> "OrderedDict[int, list]":
+        return self.shards[hash(group_id) % self.shard_count]
+
+    def get(self, group_id: int):
+        """查找房间，不存在时返回None，不刷新活动时间"""
+        entry = self._shard(group_id).get(group_id)
+        return entry[0] if entry else None
+
+    def get_or_create(self, group_id: int):
+        """查找或创建房间，并刷新其活动时间"""
+        now = self.clock()
+        shard = self._shard(group_id)
+        entry = shard.get(group_id)
+        if entry is not None:
+            entry[1] = now
+            shard.move_to_end(group_id)
+            return entry[0]
+
+        if len(shard) >= self.shard_capacity:
+            oldest_id = next(iter(shard))
+            self.evict(oldest_id)
+        room = self.factory(group_id)
+        shard[group_id] = [room, now]  # [room, last_active]
+        return room
+
+    def replace(self, group_id: int, room) -> bool:
+        """换上新的房间对象（热更新），活动时间和淘汰顺序不变"""
+        entry = self._shard(group_id).get(group_id)
+        if entry is None:
+            return False
+        entry[0] = room
+        return True
+
+    def rooms(self) -> Iterator[Tuple[int, object]]:
+        """遍历所有房间"""
+        for shard in self.shards:
+            for group_id, entry in shard.items():
+                yield group_id, entry[0]
+
+    def bind_member(self, qq_id: int, group_id: int):
+        """记录玩家所在房间，用于私聊路由"""
+        self.members[qq_id] = group_id
+
+    def room_of(self, qq_id: int) -> Optional[int]:
+        """私聊时查找发送者所在房间的群号"""
+        group_id = self.members.get(qq_id)
+        if group_id is not None and self.get(group_id) is None:
+            del self.members[qq_id]
+            return None
+        return group_id
+
+    def evict(self, group_id: int) -> bool:
+        """移除房间，并重置其中的游戏"""
+        entry = self._shard(group_id).pop(group_id, None)
+        if entry is None:
+            return False
+        room = entry[0]
+        for qq_id in room.member_ids():
+            if self.members.get(qq_id) == group_id:
+                del self.members[qq_id]
+        room.close()
+        self.evicted_count += 1
+        return True
+
+    def release(self, group_id: int) -> bool:
+        """把房间交给其他进程：写快照后移出本进程，持久化数据保留"""
+        entry = self._shard(group_id).pop(group_id, None)
+        if entry is None:
+            return False
+        room = entry[0]
+        for qq_id in room.member_ids():
+            if self.members.get(qq_id) == group_id:
+                del self.members[qq_id]
+        room.release()
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理一个分片中空闲超时的房间，返回清理数量"""
+        if now is None:
+            now = self.clock()
+        shard = self.shards[self._sweep_shard]
+        self._sweep_shard = (self._sweep_shard + 1) % self.shard_count
+        deadline = now - self.idle_timeout
+        expired = []
+        for group_id, entry in shard.items():
+            if entry[1] > deadline:
+                break  # 分片按活动时间有序，后面的都未超时
+            expired.append(group_id)
+        for group_id in expired:
+            self.evict(group_id)
+        return len(expired)
+
+    def restore(self, journal, owns: Optional[Callable[[int], bool]] = None) -> int:
+        """
+        启动时从事件日志恢复所有房间，返回恢复的房间数；多进程分片时
+        只恢复 owns(group_id) 为真的房间。
+        """
+        count = 0
+        for group_id, snapshot, entries in journal.load(owns):
+            room = self.get_or_create(group_id)
+            room.restore(snapshot, entries)
+            for qq_id in room.member_ids():
+                self.bind_member(qq_id, group_id)
+            count += 1
+        return count
+
+    def maybe_sweep(self):
+        """按间隔触发增量清理"""
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval / self.shard_count
+            self.sweep(now)
+
+    def handle_message(self, user_id: int, message: str, is_private: bool = False,
+                       group_id: Optional[int] = None) -> Optional[str]:
+        """将消息路由到对应房间处理，非命令消息返回None"""
+        if not message.startswith("#"):
+            return None
+        self.maybe_sweep()
+        if is_private:
+            group_id = self.room_of(user_id)
+            if group_id is None:
+                return "你不在任何游戏副本中"
+        elif group_id is None:
+            return None
+
+        if self.admission is not None:
+            # 先过准入再建房间，被丢弃的消息不会新建房间、挤掉正在进行的房间
+            room = self.get(group_id)
+            if not self.admission.admit(user_id, group_id, message, is_private,
+                                        room.version if room is not None else 0):
+                return None  # 超限或重复的消息直接丢弃，不回复
+        room = self.get(group_id)
+        if room is None:
+            # 只有创建命令会建房间，其余命令不占房间表，免得挤掉正在进行的房间
+            if message.startswith(JOIN_COMMANDS[0]):
+                room = self.get_or_create(group_id)
+            elif message.startswith(self.queries):
+                return self.factory(group_id).handle_message(user_id, message, is_private)
+            else:
+                return NO_ROOM_REPLY
+        else:
+            room = self.get_or_create(group_id)  # 刷新活动时间
+        leaving = room.member_ids() if message.startswith(LEAVE_COMMANDS) else ()
+        reply = room.handle_message(user_id, message, is_private)
+        for qq_id in leaving:
+            if self.members.get(qq_id) == group_id and not room.is_member(qq_id):
+                del self.members[qq_id]
+        if not is_private and message.startswith(JOIN_COMMANDS) and room.is_member(user_id):
+            self.bind_member(user_id, group_id)
+        return reply
@@ -0,0 +1,568 @@
+"""
+多进程分片：按群号一致性哈希，把房间分给若干个工作进程
+
+主进程只负责收发：群消息按群号在哈希环上找到所属分片，私聊按玩家所在
+房间的群号路由。每个工作进程各自持有 RoomRegistry、房间信箱、时间轮和
+事件日志，游戏逻辑分散在多个解释器里执行，不再受一个进程的 GIL 限制。
+计时通知、私聊身份等出站消息和对局记录经主进程发出和保存。
+
+进程间用本机套接字传长度前缀的 pickle 帧，Unix 上为 Unix 套接字，
+Windows 上为回环 TCP。事件日志每个房间一组文件，各分片共用一个目录、
+只读写自己的房间，所以分片数变化时只需按新的哈希环交接房间：原分片
+写快照后放手，新分片从日志读入。重启时每个分片只恢复哈希环上归自己
+的房间，分片数与上次不同时房间随之重新分配。
+
+战绩库为 SQLite，各分片共用；XP 档案不支持多进程同时写入，每个分片
+各用一个目录，房间换到别的分片后只能搜到换过去之后收录的 XP。
+
+工作进程由 ShardPool 启动：
+  python shards.py --index I --count N --address unix:/path [--data DIR]
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from rooms import LEAVE_COMMANDS
+
+logger = logging.getLogger(__name__)
+
+RESTARTING_REPLY = "游戏服务正在重启，请稍后再试"
+NOT_IN_ROOM_REPLY = "你不在任何游戏副本中"
+
+FRAME = struct.Struct("!I")
+
+# 出站消息出口 on_output(目标类型, 目标, 文本) 与对局记录出口 on_record(群号, 事件列表)
+Output = Callable[[str, int, str], None]
+RecordSink = Callable[[int, List[list]], None]
+
+
+def ring_hash(key: str) -> int:
+    """与进程无关的稳定哈希，内置 hash() 每个进程的随机盐不同"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """一致性哈希环：每个分片放 replicas 个虚拟节点，增减一个分片只移动约 1/N 的房间"""
+
+    def __init__(self, count: int, replicas: int = 64):
+        self.count = count
+        self.replicas = replicas
+        points = sorted((ring_hash(f"shard-{index}-{replica}"), index)
+                        for index in range(count) for replica in range(replicas))
+        self.keys = [point for point, _ in points]
+        self.nodes = [index for _, index in points]
+
+    def node_for(self, group_id: int) -> int:
+        i = bisect.bisect(self.keys, ring_hash(str(group_id)))
+        return self.nodes[i % len(self.nodes)]
+
+
+async def read_frames(reader: asyncio.StreamReader):
+    """逐帧读取；一次读入一大块，块中的多帧依次解出，不必每帧等两次"""
+    buffer = bytearray()
+    while True:
+        chunk = await reader.read(1 << 16)
+        if not chunk:
+            raise asyncio.IncompleteReadError(bytes(buffer), None)
+        buffer += chunk
+        offset = 0
+        while len(buffer) - offset >= FRAME.size:
+            size, = FRAME.unpack_from(buffer, offset)
+            end = offset + FRAME.size + size
+            if end > len(buffer):
+                break
+            yield pickle.loads(buffer[offset + FRAME.size:end])
+            offset = end
+        del buffer[:offset]
+
+
+class FrameWriter:
+    """写帧；同一轮事件循环中写出的帧合并为一次发送，不必每帧一次系统调用"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.parts: List[bytes] = []
+
+    def write(self, message: tuple):
+        data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        if not self.parts:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.parts += (FRAME.pack(len(data)), data)
+
+    def flush(self):
+        if self.parts and not self.writer.is_closing():
+            self.writer.write(b"".join(self.parts))
+        self.parts = []
+
+    def is_closing(self) -> bool:
+        return self.writer.is_closing()
+
+    async def drain(self):
+        self.flush()
+        await self.writer.drain()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+# ---------- 主进程 ----------
+
+class Shard:
+    """主进程中一个工作进程的句柄"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[FrameWriter] = None
+        self.pending: Dict[int, asyncio.Future] = {}  # {请求号: 等待回复的 future}
+        self.hello: Optional[asyncio.Future] = None
+        self.ready = asyncio.Event()  # 已连上且没有在排空
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.in_flight = 0
+        self.handled = 0
+        self.draining = False  # 主动排空时断开不算崩溃，不重启
+
+
+class ShardPool:
+    def __init__(self, count: int, data_dir: Optional[str] = None, on_output: Optional[Output] = None,
+                 on_record: Optional[RecordSink] = None, replicas: int = 64, admission: bool = True,
+                 start_timeout: float = 30.0):
+        self.ring = HashRing(count, replicas)
+        self.data_dir = data_dir  # 不提供则工作进程不持久化（基准测试用）
+        self.admission = admission  # 为 False 时工作进程不做准入控制（基准测试用）
+        self.on_output = on_output
+        self.on_record = on_record
+        self.start_timeout = start_timeout
+        self.shards: Dict[int, Shard] = {}
+        self.members: Dict[int, int] = {}  # {qq_id: group_id} 私聊路由，由工作进程的回复维护
+        self.open = asyncio.Event()  # 重新分配期间关闭，所有消息等待
+        self.open.set()
+        self.next_request = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.address = ""
+        self._socket_dir: Optional[str] = None
+        self._respawns: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """监听本机套接字并启动全部工作进程，各自恢复归自己的房间"""
+        if hasattr(asyncio, "start_unix_server"):
+            self._socket_dir = tempfile.mkdtemp(prefix="xpwolf_")
+            path = os.path.join(self._socket_dir, "shards.sock")
+            self.server = await asyncio.start_unix_server(self.accept, path)
+            self.address = f"unix:{path}"
+        else:
+            self.server = await asyncio.start_server(self.accept, "127.0.0.1", 0)
+            self.address = "tcp:127.0.0.1:%d" % self.server.sockets[0].getsockname()[1]
+        await asyncio.gather(*(self.spawn(index) for index in range(self.ring.count)))
+
+    async def spawn(self, index: int):
+        shard = self.shards.get(index)
+        if shard is None:
+            shard = self.shards[index] = Shard(index)
+        shard.draining = False
+        shard.hello = asyncio.get_running_loop().create_future()
+        args = [sys.executable, os.path.abspath(__file__), "--index", str(index), "--count", str(self.ring.count),
+                "--replicas", str(self.ring.replicas), "--address", self.address]
+        if self.data_dir is not None:
+            args += ["--data", self.data_dir]
+        if not self.admission:
+            args.append("--no-admission")
+        shard.process = await asyncio.create_subprocess_exec(*args)
+        await asyncio.wait_for(shard.hello, self.start_timeout)
+        shard.ready.set()
+
+    async def accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """一个工作进程的连接：先收 hello，之后分发回复、出站消息和对局记录"""
+        frames = read_frames(reader)
+        kind, _, (index, members) = await frames.__anext__()
+        shard = self.shards[index]
+        shard.writer = frame_writer = FrameWriter(writer)
+        self.members.update(members)
+        shard.hello.set_result(None)
+        try:
+            async for kind, request, payload in frames:
+                if kind == "reply":
+                    future = shard.pending.pop(request, None)
+                    if future is not None and not future.done():
+                        future.set_result(payload)
+                elif kind == "out":
+                    if self.on_output is not None:
+                        self.on_output(*payload)
+                elif kind == "record":
+                    if self.on_record is not None:
+                        self.on_record(*payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # 工作进程退出：还在等回复的消息按重启处理
+            if shard.writer is frame_writer:
+                shard.writer = None
+                shard.ready.clear()
+            for future in shard.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"分片 {index} 已断开"))
+            shard.pending = {}
+            writer.close()
+            if not shard.draining and self.server is not None and self.shards.get(index) is shard:
+                task = asyncio.get_running_loop().create_task(self.respawn(shard))
+                self._respawns.add(task)
+                task.add_done_callback(self._respawns.discard)
+
+    async def respawn(self, shard: Shard):
+        """工作进程意外退出：等它结束后重新启动，新进程从事件日志恢复房间"""
+        logger.error("分片 %d 的工作进程意外退出，正在重启", shard.index)
+        if shard.process is not None:
+            await shard.process.wait()
+        try:
+            await self.spawn(shard.index)
+        except Exception:
+            logger.exception("分片 %d 重启失败", shard.index)
+
+    async def request(self, shard: Shard, kind: str, payload=None):
+        """发一帧请求并等待回复"""
+        if shard.writer is None:
+            raise ConnectionError(f"分片 {shard.index} 未连接")
+        self.next_request += 1
+        request = self.next_request
+        future = asyncio.get_running_loop().create_future()
+        shard.pending[request] = future
+        shard.writer.write((kind, request, payload))
+        shard.in_flight += 1
+        shard.idle.clear()
+        try:
+            return await future
+        finally:
+            shard.in_flight -= 1
+            if not shard.in_flight:
+                shard.idle.set()
+
+    async def handle_message(self, user_id: int, message: str, is_private: bool = False,
+                             group_id: Optional[int] = None) -> Optional[str]:
+        """把消息转给房间所属的工作进程并等待回复，接口与 ActorSystem 相同"""
+        if not message.startswith("#"):
+            return None
+        if is_private:
+            group_id = self.members.get(user_id)
+            if group_id is None:
+                return NOT_IN_ROOM_REPLY
+        elif group_id is None:
+            return None
+
+        while True:
+            await self.open.wait()
+            shard = self.shards.get(self.ring.node_for(group_id))
+            if shard is None:
+                return RESTARTING_REPLY
+            if shard.ready.is_set():
+                break
+            # 分片正在重启，等它恢复后按最新的哈希环重新路由
+            try:
+                await asyncio.wait_for(shard.ready.wait(), self.start_timeout)
+            except asyncio.TimeoutError:
+                return RESTARTING_REPLY
+        try:
+            reply, bound, left = await self.request(shard, "msg", (user_id, message, is_private, group_id))
+        except ConnectionError:
+            return RESTARTING_REPLY
+        shard.handled += 1
+        # 工作进程回报发送者现在所在的房间；不在本分片的房间时只清理指向这里的旧记录
+        if bound is not None:
+            self.members[user_id] = bound
+        elif self.members.get(user_id) == group_id:
+            del self.members[user_id]
+        for qq_id in left:
+            if self.members.get(qq_id) == group_id:
+                del self.members[qq_id]
+        return reply
+
+    async def drain(self, index: int):
+        """排空一个分片：停止转发、等在途消息处理完，工作进程写快照后退出"""
+        shard = self.shards[index]
+        shard.draining = True
+        shard.ready.clear()
+        await shard.idle.wait()
+        if shard.writer is not None:
+            try:
+                await self.request(shard, "drain")
+            except ConnectionError:
+                pass
+        if shard.process is not None:
+            await shard.process.wait()
+
+    async def restart(self, index: int):
+        """重启一个分片（如更新代码后），期间发往它的消息排队等待"""
+        await self.drain(index)
+        await self.spawn(index)
+
+    async def rebalance(self, count: int):
+        """
+        改为 count 个分片。按新的哈希环，留下的分片先交出不再归自己的
+        房间，多出的分片排空退出；然后启动新增的分片，留下的分片再读入
+        划归自己的房间。期间所有消息等待。
+        """
+        self.open.clear()
+        try:
+            for shard in self.shards.values():
+                await shard.idle.wait()
+            old = self.ring.count
+            for index in range(count, old):
+                await self.drain(index)
+                del self.shards[index]
+            for index in range(min(count, old)):
+                await self.request(self.shards[index], "release", count)
+            self.ring = HashRing(count, self.ring.replicas)
+            await asyncio.gather(*(self.spawn(index) for index in range(old, count)))
+            for index in range(min(count, old)):
+                await self.request(self.shards[index], "adopt", count)
+            self.members = {}
+            for shard in self.shards.values():
+                self.members.update(await self.request(shard, "members"))
+        finally:
+            self.open.set()
+
+    async def reload(self) -> Tuple[int, dict]:
+        """
+        各工作进程热更新游戏模块，消息照常转发；返回 (重建的房间数, 暂停最久的
+        分片各步骤耗时毫秒)。有分片失败时抛出 RuntimeError，失败的分片仍用原来的代码。
+        """
+        results = await asyncio.gather(*(self.request(shard, "reload") for shard in self.shards.values()))
+        failed = [result for result in results if isinstance(result, str)]
+        if failed:
+            raise RuntimeError("；".join(failed))
+        return sum(count for count, _ in results), max((timings for _, timings in results),
+                                                        key=lambda timings: timings["pause"])
+
+    async def room_states(self, group_ids: List[int]) -> Dict[int, dict]:
+        """各房间的完整状态（核对用）"""
+        states = {}
+        for index, shard in self.shards.items():
+            mine = [gid for gid in group_ids if self.ring.node_for(gid) == index]
+            if mine:
+                states.update(await self.request(shard, "states", mine))
+        return states
+
+    async def stop(self):
+        """排空所有分片并关闭监听"""
+        for index in list(self.shards):
+            await self.drain(index)
+        self.close()
+
+    def close(self):
+        """不等待地关闭：工作进程读到连接断开后自行写快照退出"""
+        for shard in self.shards.values():
+            if shard.writer is not None:
+                shard.writer.close()
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def stats(self) -> Dict[str, int]:
+        stats = {"shards": len(self.shards), "members": len(self.members)}
+        for index, shard in self.shards.items():
+            stats[f"handled_{index}"] = shard.handled
+        return stats
+
+
+# ---------- 工作进程 ----------
+
+class Worker:
+    def __init__(self, index: int, count: int, replicas: int, data_dir: Optional[str]):
+        # 工作进程才需要游戏模块
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import game
+        self.game = game
+        self.index = index
+        self.ring = HashRing(count, replicas)
+        self.data_dir = data_dir
+        self.writer: Optional[FrameWriter] = None
+        self._tasks: Set[asyncio.Task] = set()  # 处理消息和重载的任务，持有引用以免被回收
+
+    def owns(self, group_id: int) -> bool:
+        return self.ring.node_for(group_id) == self.index
+
+    def send(self, kind: str, request: int, payload):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write((kind, request, payload))
+
+    async def forward(self, target_type: str, target_id: int, text: str):
+        """出站消息交给主进程发送，限速在主进程的出站队列中统一进行"""
+        self.send("out", 0, (target_type, target_id, text))
+
+    def setup(self):
+        from actors import ActorSystem
+        from outbox import Outbox
+        game = self.game
+        game.actors = ActorSystem(game.game_instance)
+        # 只在本进程合并同一目标的消息，不限速
+        game.outbox = Outbox(self.forward, rate=1000.0, burst=1000, concurrency=64)
+        game.outbox.start()
+        game.record_sink = lambda group_id, events: self.send("record", 0, (group_id, events))
+        if self.data_dir is not None:
+            os.makedirs(self.data_dir, exist_ok=True)
+            from archive import XPArchive
+            from journal import Journal
+            from stats import StatsStore
+            game.stats = StatsStore(os.path.join(self.data_dir, "stats.db"))
+            game.stats.start()
+            game.xp_archive = XPArchive(os.path.join(self.data_dir, "xp_archive", f"shard-{self.index}"))
+            game.xp_archive.start()
+            from gamerecord import RecordWriter
+            game.game_records = RecordWriter(os.path.join(self.data_dir, "records", f"shard-{self.index}"))
+            game.game_records.start()
+        game.timing_wheel.start()
+        if self.data_dir is not None:
+            game.journal = Journal(os.path.join(self.data_dir, "journal"))
+            game.game_instance.restore(game.journal, self.owns)
+            game.journal.start()
+
+    async def handle(self, request: int, args: tuple):
+        game = self.game
+        registry = game.game_instance
+        user_id, message, is_private, group_id = args
+        room = registry.get(group_id) if not is_private and message.startswith(LEAVE_COMMANDS) else None
+        members = room.member_ids() if room is not None else ()
+        try:
+            reply = await game.actors.handle_message(*args)
+        except Exception as e:
+            logger.exception("分片 %s 处理消息出错", self.index)
+            reply = f"处理命令时出错: {str(e)}"
+        # 连同因这条消息离开房间的玩家一起回报，主进程据此清理私聊路由
+        left = [qq_id for qq_id in members if registry.members.get(qq_id) != group_id]
+        self.send("reply", request, (reply, registry.room_of(user_id), left))
+
+    async def release(self, count: int) -> int:
+        """按 count 个分片的哈希环交出不再归自己的房间，写快照后从内存移除"""
+        registry = self.game.game_instance
+        self.ring = HashRing(count, self.ring.replicas)
+        moved = [group_id for group_id, _ in registry.rooms() if not self.owns(group_id)]
+        for group_id in moved:
+            registry.release(group_id)
+        journal = self.game.journal
+        if journal is not None:
+            await journal.sync()
+            for group_id in moved:
+                journal.forget(group_id)
+        return len(moved)
+
+    async def reload(self, request: int):
+        """热更新本进程的游戏模块，回复 (重建的房间数, 各步骤耗时毫秒)，失败时回复出错信息"""
+        from reload import hot_reload
+        try:
+            result = await hot_reload(self.game)
+        except Exception as e:
+            logger.exception("分片 %s 热更新失败，继续使用原来的代码", self.index)
+            result = f"分片 {self.index}: {type(e).__name__}: {e}"
+        self.send("reply", request, result)
+
+    def adopt(self, count: int) -> int:
+        """按 count 个分片的哈希环从日志读入新划归自己的房间"""
+        registry = self.game.game_instance
+        self.ring = HashRing(count, self.ring.replicas)
+        if self.game.journal is None:
+            return 0
+        return registry.restore(self.game.journal,
+                                lambda group_id: self.owns(group_id) and registry.get(group_id) is None)
+
+    async def shutdown(self):
+        """所有房间写快照、日志落盘，出站消息发完后退出"""
+        game = self.game
+        game.timing_wheel.stop()
+        journal = game.journal
+        if journal is not None:
+            for group_id, room in game.game_instance.rooms():
+                journal.snapshot(group_id, room.to_state())
+            await journal.sync()
+            journal.stop()
+        for _ in range(100):
+            if not game.outbox.depth and not game.outbox.in_flight:
+                break
+            await asyncio.sleep(0.01)
+        game.outbox.stop()
+        if game.stats is not None:
+            game.stats.close()
+        if game.xp_archive is not None:
+            game.xp_archive.close()
+        if game.game_records is not None:
+            game.game_records.stop()
+        game.actors.shutdown()
+
+    def spawn(self, loop: asyncio.AbstractEventLoop, coro):
+        task = loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def serve(self, address: str):
+        kind, _, target = address.partition(":")
+        if kind == "unix":
+            reader, writer = await asyncio.open_unix_connection(target)
+        else:
+            host, _, port = target.rpartition(":")
+            reader, writer = await asyncio.open_connection(host, int(port))
+        self.writer = FrameWriter(writer)
+        self.setup()
+        registry = self.game.game_instance
+        self.send("hello", 0, (self.index, dict(registry.members)))
+        loop = asyncio.get_running_loop()
+        try:
+            async for kind, request, payload in read_frames(reader):
+                if kind == "msg":
+                    # 按到达顺序建任务，同一房间的消息按顺序进入信箱
+                    self.spawn(loop, self.handle(request, payload))
+                elif kind == "release":
+                    self.send("reply", request, await self.release(payload))
+                elif kind == "adopt":
+                    self.send("reply", request, self.adopt(payload))
+                elif kind == "reload":
+                    # 编译新代码时照常读取和处理消息
+                    self.spawn(loop, self.reload(request))
+                elif kind == "members":
+                    self.send("reply", request, dict(registry.members))
+                elif kind == "states":
+                    self.send("reply", request, {group_id: registry.get(group_id).to_state()
+                                                 for group_id in payload if registry.get(group_id) is not None})
+                elif kind == "drain":
+                    # 先等在途的消息处理和重载发出回复
+                    if self._tasks:
+                        await asyncio.gather(*self._tasks, return_exceptions=True)
+                    await self.shutdown()
+                    self.send("reply", request, None)
+                    await self.writer.drain()
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # 主进程已退出
+            await self.shutdown()
+        finally:
+            self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", type=int, required=True)
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--replicas", type=int, default=64)
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--data", help="数据目录，不提供则不持久化")
+    parser.add_argument("--no-admission", action="store_true", help="不做准入控制")
+    args = parser.parse_args()
+    worker = Worker(args.index, args.count, args.replicas, args.data)
+    if args.no_admission:
+        worker.game.game_instance.admission = None
+    asyncio.run(worker.serve(args.address))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+角色配置平衡模拟：用 NumPy 成批模拟整局游戏，统计各人数下的阵营胜率
+
+一批对局人数相同，状态存成 (局数, 座位数) 的数组，每个阶段对整批同时
+推进，已分出胜负的对局用掩码跳过。角色配置取自 game.role_config，胜负
+判定调用 game.win_code，结算顺序与 XPLangGame 一致：
+
+  夜晚  狼人袭击、女巫毒杀（整局一瓶），先结算袭击；被袭击的狼王可带走一人。
+        袭击由狼人（不含狼王）提交，游戏不检查其是否存活，所以只要配置
+        里有狼人，每晚都会袭击
+  白天  骑士可决斗一次，决斗成功直接入夜，失败骑士出局
+  投票  最高票唯一时出局，平票无人出局；被投出的狼王可带走一人
+  胜负  只在夜晚结束和投票结束时判定，与游戏相同
+
+袭击、毒杀、决斗、投票、狼王带走各自的策略可以替换，见 STRATEGIES。
+
+用法:
+  python simulate.py [--games N] [--players 8-20] [--vote wolf_bloc]
+  python simulate.py --players 16 --roles 狼王=1,狼人=2,骑士=1,女巫=1
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 只有模拟器需要 numpy，机器人本身不依赖
+    np = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import ROLE_BY_LABEL, WIN_GOOD, WIN_NONE, WIN_WOLF, Role, role_config, win_code  # noqa: E402
+
+
+class Batch:
+    """一批同人数的对局，每行一局、每列一个座位"""
+
+    def __init__(self, rng, games: int, player_count: int, config: Dict[str, int],
+                 poison_rate: float = 0.3, duel_rate: float = 0.2):
+        self.rng = rng
+        self.games = games
+        self.player_count = player_count
+        self.poison_rate = poison_rate
+        self.duel_rate = duel_rate
+        self.rows = np.arange(games)
+
+        deck = [ROLE_BY_LABEL[label] for label, count in config.items() for _ in range(count)]
+        deck += [Role.VILLAGER] * (player_count - len(deck))
+        self.role = rng.permuted(np.tile(np.array(deck, dtype=np.int8), (games, 1)), axis=1)
+        self.wolf = (self.role == Role.WOLF) | (self.role == Role.WOLF_KING)
+        self.can_attack = np.full(games, config.get("狼人", 0) > 0)
+        self.alive = np.ones((games, player_count), dtype=bool)
+        self.knight = self.seat_of(Role.KNIGHT)
+        self.witch = self.seat_of(Role.WITCH)
+        self.knight_used = np.zeros(games, dtype=bool)
+        self.poison_used = np.zeros(games, dtype=bool)
+        self.winner = np.full(games, WIN_NONE, dtype=np.int8)
+        self.days = np.zeros(games, dtype=np.int16)
+        self.finished = []
+
+    # 随对局一起筛选的逐局数组
+    PER_GAME = ("role", "wolf", "can_attack", "alive", "knight", "witch",
+                "knight_used", "poison_used", "winner", "days")
+
+    def compact(self):
+        """把已分出胜负的对局移出批次，后面的阶段只处理进行中的对局"""
+        done = self.winner != WIN_NONE
+        if not done.any():
+            return
+        self.finished.append((self.winner[done], self.days[done]))
+        keep = ~done
+        for name in self.PER_GAME:
+            setattr(self, name, getattr(self, name)[keep])
+        self.games = len(self.winner)
+        self.rows = np.arange(self.games)
+
+    def results(self):
+        """所有对局的 (胜负, 天数)，包括未分胜负的"""
+        winners = [w for w, _ in self.finished] + [self.winner]
+        days = [d for _, d in self.finished] + [self.days]
+        return np.concatenate(winners), np.concatenate(days)
+
+    def seat_of(self, code: Role):
+        """每局中该角色的座位，没有该角色时为 -1（骑士、女巫每局至多一人）"""
+        has = self.role == code
+        return np.where(has.any(1), has.argmax(1), -1)
+
+    def has_alive(self, seats):
+        """座位是否有效且存活"""
+        return (seats >= 0) & self.alive[self.rows, np.maximum(seats, 0)]
+
+    def kill(self, seats):
+        """击杀各局指定的座位，-1 表示该局无人出局"""
+        hit = seats >= 0
+        self.alive[self.rows[hit], seats[hit]] = False
+
+    def check_win(self, mask):
+        wolves = (self.alive & self.wolf).sum(1)
+        good = self.alive.sum(1) - wolves
+        result = win_code(wolves, good)
+        self.winner = np.where(mask & (self.winner == WIN_NONE), result, self.winner).astype(np.int8)
+
+    def others(self, seats):
+        """除各局指定座位外的存活玩家"""
+        return self.alive & (np.arange(self.player_count) != seats[:, None])
+
+
+def pick(rng, candidates):
+    """每局在候选座位中均匀随机选一个，没有候选的局返回 -1"""
+    scores = np.where(candidates, rng.random(candidates.shape, dtype=np.float32), -1.0)
+    return np.where(candidates.any(1), scores.argmax(1), -1)
+
+
+def random_votes(batch: Batch, mask):
+    """每名存活玩家随机投给另一名存活玩家，返回 (局数, 座位数) 的投票目标，-1 为未投票"""
+    alive = batch.alive
+    alive_count = alive.sum(1)[:, None]
+    # 每局存活座位排在最前，rank 为玩家在其中的位置，抽到自己的位置时顺延一位
+    order = np.argsort(~alive, axis=1, kind="stable")
+    rank = np.cumsum(alive, 1) - 1
+    k = (batch.rng.random(alive.shape) * (alive_count - 1)).astype(np.intp)
+    k += k >= rank
+    votes = np.take_along_axis(order, np.minimum(k, batch.player_count - 1), 1)
+    return np.where(alive & mask[:, None] & (alive_count > 1), votes, -1)
+
+
+def tally(votes, player_count: int):
+    """统计票数，返回每局出局的座位，平票或无人投票为 -1"""
+    games = len(votes)
+    valid = votes >= 0
+    flat = (np.arange(games)[:, None] * player_count + votes)[valid]
+    counts = np.bincount(flat, minlength=games * player_count).reshape(games, player_count)
+    top = counts.max(1)
+    unique = (counts == top[:, None]).sum(1) == 1
+    return np.where(unique & (top > 0), counts.argmax(1), -1)
+
+
+# 策略：strategy(batch, mask) -> 每局的目标座位（投票为每名玩家的目标），-1 表示不行动
+
+def attack_random(batch: Batch, mask):
+    """狼人随机袭击一名存活好人"""
+    return np.where(mask, pick(batch.rng, batch.alive & ~batch.wolf), -1)
+
+
+def poison_never(batch: Batch, mask):
+    return np.full(batch.games, -1)
+
+
+def poison_random(batch: Batch, mask):
+    """女巫每晚按 poison_rate 的概率随机毒杀另一名存活玩家"""
+    act = mask & (batch.rng.random(batch.games) < batch.poison_rate)
+    return np.where(act, pick(batch.rng, batch.others(batch.witch)), -1)
+
+
+def duel_never(batch: Batch, mask):
+    return np.full(batch.games, -1)
+
+
+def duel_random(batch: Batch, mask):
+    """骑士每个白天按 duel_rate 的概率随机决斗另一名存活玩家"""
+    act = mask & (batch.rng.random(batch.games) < batch.duel_rate)
+    return np.where(act, pick(batch.rng, batch.others(batch.knight)), -1)
+
+
+def vote_random(batch: Batch, mask):
+    return random_votes(batch, mask)
+
+
+def vote_wolf_bloc(batch: Batch, mask):
+    """好人随机投票，狼人集中投同一名存活好人"""
+    votes = random_votes(batch, mask)
+    target = pick(batch.rng, batch.alive & ~batch.wolf)
+    bloc = batch.alive & batch.wolf & mask[:, None] & (target >= 0)[:, None]
+    return np.where(bloc, target[:, None], votes)
+
+
+def take_random(batch: Batch, mask):
+    """狼王随机带走一名存活好人"""
+    return np.where(mask, pick(batch.rng, batch.alive & ~batch.wolf), -1)
+
+
+def take_never(batch: Batch, mask):
+    return np.full(batch.games, -1)
+
+
+STRATEGIES: Dict[str, Dict[str, Callable]] = {
+    "attack": {"random": attack_random},
+    "poison": {"random": poison_random, "never": poison_never},
+    "duel": {"random": duel_random, "never": duel_never},
+    "vote": {"random": vote_random, "wolf_bloc": vote_wolf_bloc},
+    "take": {"random": take_random, "never": take_never},
+}
+DEFAULT_STRATEGIES = {kind: "random" for kind in STRATEGIES}
+
+
+def wolf_king_take(batch: Batch, victims, mask, take: Callable):
+    """出局的狼王在未分胜负时带走一人"""
+    king = mask & (victims >= 0) & (batch.role[batch.rows, np.maximum(victims, 0)] == Role.WOLF_KING)
+    king &= batch.winner == WIN_NONE
+    if king.any():
+        batch.kill(take(batch, king))
+
+
+def play(batch: Batch, strategies: Dict[str, Callable], max_days: int = 30):
+    """把一批对局打到分出胜负或达到天数上限"""
+    for _ in range(max_days):
+        batch.compact()
+        if not batch.games:
+            break
+        rows = batch.rows
+        live = np.ones(batch.games, dtype=bool)
+
+        # 夜晚：袭击先结算，毒杀目标已死亡则无效
+        attack = strategies["attack"](batch, live & batch.can_attack)
+        can_poison = live & batch.has_alive(batch.witch) & ~batch.poison_used
+        poison = strategies["poison"](batch, can_poison)
+        batch.poison_used |= poison >= 0
+        batch.kill(attack)
+        batch.kill(poison)
+        batch.days[live] += 1
+        batch.check_win(live)
+        wolf_king_take(batch, attack, live, strategies["take"])
+
+        # 白天：骑士决斗成功直接入夜，跳过投票
+        live = batch.winner == WIN_NONE
+        can_duel = live & batch.has_alive(batch.knight) & ~batch.knight_used
+        target = strategies["duel"](batch, can_duel)
+        dueled = target >= 0
+        batch.knight_used |= dueled
+        hit = dueled & batch.wolf[rows, np.maximum(target, 0)]
+        batch.kill(np.where(hit, target, -1))
+        batch.kill(np.where(dueled & ~hit, batch.knight, -1))
+
+        voting = live & ~hit
+        victims = np.where(voting, tally(strategies["vote"](batch, voting), batch.player_count), -1)
+        batch.kill(victims)
+        batch.check_win(voting)
+        wolf_king_take(batch, victims, voting, strategies["take"])
+
+
+def simulate(player_count: int, games: int, seed: Optional[int] = None,
+             config: Optional[Dict[str, int]] = None, strategies: Optional[Dict[str, str]] = None,
+             batch_size: int = 100_000, max_days: int = 30, **rates) -> dict:
+    """模拟 games 局 player_count 人的对局，返回各结果的局数和平均天数"""
+    if np is None:
+        raise RuntimeError("模拟器需要 numpy：pip install numpy")
+    config = config or role_config(player_count)
+    names = dict(DEFAULT_STRATEGIES, **(strategies or {}))
+    chosen = {kind: STRATEGIES[kind][name] for kind, name in names.items()}
+    rng = np.random.default_rng(seed)
+    totals = {WIN_GOOD: 0, WIN_WOLF: 0, WIN_NONE: 0}
+    days = 0
+    remaining = games
+    while remaining:
+        size = min(batch_size, remaining)
+        batch = Batch(rng, size, player_count, config, **rates)
+        play(batch, chosen, max_days)
+        winners, batch_days = batch.results()
+        counts = np.bincount(winners, minlength=3)
+        for code in totals:
+            totals[code] += int(counts[code])
+        days += int(batch_days.sum())
+        remaining -= size
+    return {"games": games, "good": totals[WIN_GOOD], "wolf": totals[WIN_WOLF],
+            "undecided": totals[WIN_NONE], "days": days / games}
+
+
+def parse_players(text: str):
+    if "-" in text:
+        low, high = text.split("-")
+        return range(int(low), int(high) + 1)
+    return [int(text)]
+
+
+def parse_roles(text: str) -> Dict[str, int]:
+    """解析 狼王=1,狼人=2 形式的角色配置"""
+    config = {}
+    for item in text.split(","):
+        label, count = item.split("=")
+        if label not in ROLE_BY_LABEL:
+            raise argparse.ArgumentTypeError(f"未知角色: {label}")
+        config[label] = int(count)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1_000_000, help="每个人数模拟的局数")
+    parser.add_argument("--players", default="8-20", help="人数或人数范围，如 12 或 8-20")
+    parser.add_argument("--roles", type=parse_roles, help="覆盖角色配置，如 狼王=1,狼人=2,骑士=1")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--batch", type=int, default=100_000, help="每批同时模拟的局数")
+    parser.add_argument("--max-days", type=int, default=30)
+    parser.add_argument("--poison-rate", type=float, default=0.3)
+    parser.add_argument("--duel-rate", type=float, default=0.2)
+    for kind, options in STRATEGIES.items():
+        parser.add_argument(f"--{kind}", choices=sorted(options), default="random", help=f"{kind} 策略")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("模拟器需要 numpy：pip install numpy")
+
+    strategies = {kind: getattr(args, kind) for kind in STRATEGIES}
+    print(f"{'人数':>4} {'好人胜率':>8} {'狼人胜率':>8} {'未分胜负':>8} {'平均天数':>8}  角色配置")
+    total_games = 0
+    start = time.perf_counter()
+    for player_count in parse_players(args.players):
+        config = args.roles or role_config(player_count)
+        result = simulate(player_count, args.games, args.seed, config, strategies,
+                          args.batch, args.max_days, poison_rate=args.poison_rate, duel_rate=args.duel_rate)
+        total_games += result["games"]
+        print(f"{player_count:>6} {result['good'] / result['games']:>11.2%} {result['wolf'] / result['games']:>11.2%}"
+              f" {result['undecided'] / result['games']:>11.2%} {result['days']:>11.2f}  "
+              + ",".join(f"{label}{count}" for label, count in config.items()))
+    elapsed = time.perf_counter() - start
+    print(f"共 {total_games:,} 局，{elapsed:.1f} 秒，{total_games / elapsed:,.0f} 局/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+玩家战绩：每局结束时写入本地 SQLite，跨对局统计胜负、阵营和出局原因
+
+写入在后台线程中进行：游戏逻辑只把结果放进队列，写线程把积累的多局
+合并到一个事务中提交。除逐局明细外还维护按 (群, 玩家) 汇总的计数表，
+查询战绩和排行榜只需按索引读几行，与历史对局数无关。数据库使用 WAL
+模式，查询不会被写入阻塞。
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 出局原因，数据库中存编号（从 1 开始，0 为存活）
+DEATH_CAUSES = ("袭击", "毒杀", "投票", "决斗", "带走")
+DEATH_CODES = {cause: code for code, cause in enumerate(DEATH_CAUSES, 1)}
+
+# 每名玩家的结果：(QQ号, 身份编码, 是否狼人阵营, 是否获胜, 出局原因或None)
+Result = Tuple[int, int, bool, bool, Optional[str]]
+
+# (群号, 结束时间, 随机种子, 天数, 获胜方, 玩家结果)
+GameRecord = Tuple[int, float, int, int, int, List[Result]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL,
+    ended_at REAL NOT NULL,
+    seed INTEGER,
+    days INTEGER,
+    winner INTEGER,
+    players INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    game_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    role INTEGER NOT NULL,
+    wolf INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    death INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_user ON results (user_id, game_id);
+CREATE TABLE IF NOT EXISTS player_stats (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    wolf_games INTEGER NOT NULL,
+    wolf_wins INTEGER NOT NULL,
+    voted_out INTEGER NOT NULL,
+    attacked INTEGER NOT NULL,
+    survived INTEGER NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_stats_user ON player_stats (user_id);
+CREATE INDEX IF NOT EXISTS player_stats_rank ON player_stats (group_id, wins, games);
+"""
+
+UPSERT_STATS = """
+INSERT INTO player_stats VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (group_id, user_id) DO UPDATE SET
+    games = games + 1,
+    wins = wins + excluded.wins,
+    wolf_games = wolf_games + excluded.wolf_games,
+    wolf_wins = wolf_wins + excluded.wolf_wins,
+    voted_out = voted_out + excluded.voted_out,
+    attacked = attacked + excluded.attacked,
+    survived = survived + excluded.survived
+"""
+
+
+class PlayerSummary:
+    """一名玩家在所有群的汇总战绩"""
+    __slots__ = ("games", "wins", "wolf_games", "wolf_wins", "voted_out", "attacked", "survived")
+
+    def __init__(self, games=0, wins=0, wolf_games=0, wolf_wins=0, voted_out=0, attacked=0, survived=0):
+        self.games = games
+        self.wins = wins
+        self.wolf_games = wolf_games
+        self.wolf_wins = wolf_wins
+        self.voted_out = voted_out
+        self.attacked = attacked
+        self.survived = survived
+
+
+class StatsStore:
+    def __init__(self, path: str, batch_size: int = 500, linger: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size  # 每个事务最多写入的局数
+        self.linger = linger  # 收到第一局后再等多久凑一批
+        self.queue: "queue.Queue[Optional[GameRecord]]" = queue.Queue()
+        self.written = 0
+        self.commits = 0
+        self.failed = 0
+        # 写连接只在写线程中使用；在这里建表，保证查询前表已存在
+        self.writer = self.connect()
+        self.writer.executescript(SCHEMA)
+        self.reader: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------- 写入 ----------
+
+    def record_game(self, group_id: int, seed: int, days: int, winner: int, results: List[Result]):
+        """记录一局结果，只入队，不等待写盘"""
+        self.queue.put((group_id, time.time(), seed, days, winner, results))
+
+    def take_batch(self) -> List[GameRecord]:
+        """阻塞取出一批；收到 None 表示停止，放在批末尾"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.linger
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def write_batch(self, records: Iterable[GameRecord]):
+        """在一个事务中写入多局"""
+        conn = self.writer
+        conn.execute("BEGIN")
+        try:
+            count = 0
+            for group_id, ended_at, seed, days, winner, results in records:
+                cursor = conn.execute(
+                    "INSERT INTO games (group_id, ended_at, seed, days, winner, players) VALUES (?, ?, ?, ?, ?, ?)",
+                    (group_id, ended_at, seed, days, winner, len(results)))
+                game_id = cursor.lastrowid
+                rows = [(game_id, qq, role, int(wolf), int(won), DEATH_CODES.get(cause, 0))
+                        for qq, role, wolf, won, cause in results]
+                conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany(UPSERT_STATS, [
+                    (group_id, qq, won, wolf, wolf & won, int(death == DEATH_CODES["投票"]),
+                     int(death == DEATH_CODES["袭击"]), int(death == 0))
+                    for _, qq, _, wolf, won, death in rows
+                ])
+                count += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.written += count
+        self.commits += 1
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            stop = batch[-1] is None
+            records = batch[:-1] if stop else batch
+            try:
+                if records:
+                    self.write_batch(records)
+            except Exception:
+                self.failed += len(records)
+                logger.exception("写入战绩失败，丢弃 %d 局", len(records))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, name="xpwolf-stats", daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """等待已入队的结果全部写入（需要写线程在运行）"""
+        self.queue.join()
+
+    def stop(self):
+        """写完剩余结果后停止写线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    # ---------- 查询 ----------
+
+    def _reader(self) -> sqlite3.Connection:
+        if self.reader is None:
+            self.reader = self.connect()
+            self.reader.execute("PRAGMA query_only=ON")
+        return self.reader
+
+    def player_summary(self, user_id: int) -> PlayerSummary:
+        row = self._reader().execute(
+            "SELECT SUM(games), SUM(wins), SUM(wolf_games), SUM(wolf_wins), SUM(voted_out), SUM(attacked), "
+            "SUM(survived) FROM player_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return PlayerSummary(*(value or 0 for value in row))
+
+    def leaderboard(self, group_id: int, limit: int = 10, min_games: int = 3) -> List[Tuple[int, int, int]]:
+        """群内胜场排行：[(QQ号, 局数, 胜场), ...]，局数过少的不上榜"""
+        return self._reader().execute(
+            "SELECT user_id, games, wins FROM player_stats WHERE group_id = ? AND games >= ? "
+            "ORDER BY wins DESC, games LIMIT ?", (group_id, min_games, limit)).fetchall()
+
+    def close(self):
+        self.stop()
+        for conn in (self.reader, self.writer):
+            if conn is not None:
+                conn.close()
+        self.reader = None
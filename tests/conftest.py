@@ -0,0 +1,34 @@
+"""测试共用：把仓库根目录加入 sys.path，提供开好局的房间"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import game  # noqa: E402
+
+HOST = 1  # 主持人，不参加游戏
+FIRST_QQ = 101  # 玩家QQ号从这里起连续编号，序号与加入顺序相同
+
+
+def start_room(players: int, seed: int = 1, room_id: int = 1, arg: str = "", **hooks) -> game.XPLangBotPlugin:
+    """创建房间、接龙并开局，身份按 seed 分配"""
+    room = game.XPLangBotPlugin(room_id, **hooks)
+    room.handle_message(HOST, "#创建游戏副本")
+    for qq in range(FIRST_QQ, FIRST_QQ + players):
+        room.handle_message(qq, "#加入游戏副本")
+    room.game.reseed(seed)
+    reply = room.handle_message(HOST, f"#开始游戏副本 {arg}".strip())
+    assert room.game.game_state == "night", reply
+    return room
+
+
+def with_role(g: game.XPLangGame, role: game.Role) -> list:
+    """某一身份的全部玩家，按序号排列"""
+    return [qq for qq in g.seat_order if g.players[qq].role_code is role]
+
+
+@pytest.fixture(autouse=True)
+def no_metrics(monkeypatch):
+    # 指标是全局的，测试之间互不影响
+    monkeypatch.setattr(game, "metrics", None)
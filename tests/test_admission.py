@@ -0,0 +1,81 @@
+from conftest import HOST
+
+import game
+from admission import DEDUPED, THROTTLED_ROOM, THROTTLED_USER, Admission
+from rooms import RoomRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def admission(clock, **limits):
+    return Admission(game.READ_ONLY_COMMANDS, game.SHARED_QUERY_COMMANDS, clock=clock, **limits)
+
+
+def test_user_bucket_drops_queries_but_not_actions():
+    clock = Clock()
+    a = admission(clock, user_burst=2, action_burst=2)
+    assert a.admit(5, 1, "#我的身份", True, 0)
+    assert a.admit(5, 1, "#查看状态", False, 0)
+    assert not a.admit(5, 1, "#我的战绩", True, 0)
+    assert a.dropped[THROTTLED_USER] == 1
+    # 推进游戏的命令有自己的桶
+    assert a.admit(5, 1, "#投票1", False, 0)
+    assert a.admit(5, 1, "#投票2", False, 0)
+    assert not a.admit(5, 1, "#投票3", False, 0)
+    assert a.dropped[THROTTLED_USER] == 2
+    clock.now += 1.0  # 回满一个令牌
+    assert a.admit(5, 1, "#投票3", False, 0)
+
+
+def test_repeated_query_is_deduped_until_state_changes():
+    clock = Clock()
+    a = admission(clock)
+    assert a.admit(5, 1, "#存活玩家", False, 3)
+    # 回复与发送者无关的查询，同群其他人重复发送也合并
+    assert not a.admit(6, 1, "#存活玩家", False, 3)
+    assert a.dropped[DEDUPED] == 1
+    assert a.admit(6, 1, "#存活玩家", False, 4)  # 状态变了
+    assert a.admit(6, 2, "#存活玩家", False, 4)  # 别的群
+    # 与发送者有关的查询只合并同一人
+    assert a.admit(5, 1, "#我的身份", True, 4)
+    assert a.admit(6, 1, "#我的身份", True, 4)
+    assert not a.admit(6, 1, "#我的身份", True, 4)
+    clock.now += a.dedupe_window
+    assert a.admit(6, 1, "#我的身份", True, 4)
+
+
+def test_room_bucket_limits_queries_from_many_users():
+    clock = Clock()
+    a = admission(clock, room_burst=2)
+    assert a.admit(5, 1, "#我的身份", True, 0)
+    assert a.admit(6, 1, "#我的身份", True, 0)
+    assert not a.admit(7, 1, "#我的身份", True, 0)
+    assert a.dropped[THROTTLED_ROOM] == 1
+    # 推进游戏的命令不受房间限流
+    assert a.admit(7, 1, "#投票1", False, 0)
+
+
+def test_prune_forgets_full_buckets_and_old_queries():
+    clock = Clock()
+    a = admission(clock, prune_interval=10)
+    a.admit(5, 1, "#我的身份", True, 0)
+    a.admit(6, 1, "#投票1", False, 0)
+    assert a.stats()["tracked_users"] == 2
+    clock.now = 100
+    a.admit(7, 2, "#投票1", False, 0)  # 顺带触发清理
+    assert a.stats()["tracked_users"] == 1
+    assert not a.recent
+
+
+def test_dropped_message_gets_no_reply_and_creates_no_room():
+    clock = Clock()
+    registry = RoomRegistry(game.XPLangBotPlugin, admission=admission(clock, action_burst=1), clock=clock)
+    assert registry.handle_message(HOST, "#加入游戏副本", group_id=1) is not None
+    assert registry.handle_message(HOST, "#创建游戏副本", group_id=1) is None
+    assert registry.get(1) is None
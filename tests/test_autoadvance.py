@@ -0,0 +1,68 @@
+from conftest import start_room, with_role
+
+import game
+
+
+def test_first_night_waits_for_wolves_witch_and_xp():
+    room = start_room(16)
+    g = room.game
+    wolves = g.wolf_players  # 狼王不参与袭击，不在等待之列
+    witch = g.special_roles["女巫"]
+    pending = g.pending_actors()
+    assert set(pending) == set(g.seat_order)  # 第一夜所有人都还没设置 XP
+    for qq in g.seat_order:
+        room.handle_message(qq, "#设置XP 猫娘", True)
+    assert sorted(g.pending_actors()) == sorted(wolves + [witch])
+    target = next(qq for qq in g.seat_order if not g.players[qq].is_wolf and qq != witch)
+    room.handle_message(wolves[0], f"#袭击{g.players[target].number}", True)
+    assert g.pending_actors() == [witch]
+    assert not g.phase_complete()
+    room.handle_message(witch, "#过", True)
+    assert g.pending_actors() == []
+    assert g.phase_complete()
+
+
+def test_witch_and_xp_not_awaited_once_dead_or_set():
+    g = start_room(16).game
+    for qq in g.seat_order:
+        g.set_player_xp(qq, "x")
+    witch = g.special_roles["女巫"]
+    g.kill_player(witch, "投票")
+    assert sorted(g.pending_actors()) == sorted(g.wolf_players)
+
+
+def test_voting_waits_for_every_alive_player_and_last_words():
+    room = start_room(8)
+    g = room.game
+    g.start_voting()
+    dead = g.seat_order[-1]
+    g.kill_player(dead, "投票")
+    alive = [qq for qq in g.seat_order if g.players[qq].alive]
+    assert g.pending_actors() == alive
+    for qq in alive:
+        g.vote(qq, alive[0])
+    assert g.phase_complete()
+    g.last_words_qq = alive[0]
+    assert g.pending_actors() == [alive[0]]
+    assert not g.phase_complete()
+
+
+def test_other_phases_never_auto_advance():
+    g = start_room(8).game
+    g.game_state = "discussion"
+    assert g.pending_actors() is None
+    assert not g.phase_complete()
+
+
+def test_mega_night_pending_by_team():
+    g = start_room(40, arg="狼人12").game
+    for qq in g.seat_order:
+        g.set_player_xp(qq, "x")
+    g.witch_pass(g.special_roles["女巫"])
+    target = with_role(g, game.Role.VILLAGER)[0]
+    for team in g.wolf_teams[:-1]:
+        g.wolf_attack(team[0], target)
+    attackers = [qq for qq in g.wolf_teams[-1] if qq in g.wolf_players]
+    assert sorted(g.pending_actors()) == sorted(attackers)
+    g.kill_player(attackers[0], "投票")
+    assert sorted(g.pending_actors()) == sorted(attackers[1:])
@@ -0,0 +1,51 @@
+from conftest import HOST, start_room
+
+import game
+
+
+def test_chatter_and_bare_hash_are_ignored():
+    room = game.XPLangBotPlugin()
+    assert room.handle_message(HOST, "大家好") is None
+    assert room.handle_message(HOST, "#") is None
+
+
+def test_unknown_command():
+    room = game.XPLangBotPlugin()
+    assert room.handle_message(HOST, "#不存在的命令") == "未知命令，请查看游戏副本规则"
+    assert room.handle_message(HOST, "#结束") == "未知命令，请查看游戏副本规则"
+
+
+def test_every_phase_restricted_command_is_rejected_outside_its_phases():
+    for name, _, states, reject in game.XPLangBotPlugin.COMMANDS:
+        for state in game.ANY_STATE:
+            if state in states:
+                continue
+            room = game.XPLangBotPlugin()
+            room.game.game_state = state
+            assert room.handle_message(HOST, name + "1") == reject, (name, state)
+
+
+def test_phase_reject_comes_before_host_check():
+    room = start_room(8)
+    player = room.game.seat_order[0]
+    # 夜晚里非主持人结束投票：先按阶段拒绝，不提示权限
+    assert room.handle_message(player, "#结束投票") == "当前不是投票时间"
+    assert room.handle_message(HOST, "#结束投票") == "当前不是投票时间"
+    # 阶段符合时才检查主持人
+    assert room.handle_message(player, "#结束夜晚") == "只有主持人可以执行此操作"
+    assert room.game.game_state == "night"
+
+
+def test_longest_prefix_with_argument():
+    room = start_room(8)
+    assert room.handle_message(HOST, "#存活玩家2").startswith("存活玩家")
+    assert room.handle_message(HOST, "#结束游戏副本") is not None
+    assert room.game.game_state == "waiting"
+
+
+def test_join_and_create_follow_phase_table():
+    room = game.XPLangBotPlugin()
+    assert room.handle_message(2, "#加入游戏副本") == "游戏副本未创建或已开始"
+    room.handle_message(HOST, "#创建游戏副本")
+    assert room.handle_message(2, "#加入游戏副本") == "你已加入游戏副本，当前人数: 1"
+    assert room.handle_message(2, "#加入游戏副本") == "你已加入队列"
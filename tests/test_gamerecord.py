@@ -0,0 +1,71 @@
+import pytest
+from conftest import HOST, start_room
+
+from gamerecord import ACT_DEATH, ACT_VOTE, MAGIC, RecordWriter, pack_game, read_records, unpack_records
+from game import WIN_NONE, WIN_WOLF
+
+
+def finished_room(tmp_path):
+    writer = RecordWriter(str(tmp_path), clock=lambda: 1.7e9)
+    room = start_room(8, seed=42, room_id=9, records=writer)
+    g = room.game
+    for qq in g.seat_order:
+        room.handle_message(qq, f"#设置XP {qq}", True)
+    room.handle_message(HOST, "#结束夜晚")
+    return room, writer
+
+
+def test_pack_unpack_round_trip(tmp_path):
+    room, _ = finished_room(tmp_path)
+    g = room.game
+    g.start_voting()
+    g.vote(g.seat_order[0], g.seat_order[1])
+    g.end_voting()
+    (header, seats, actions, phases), = unpack_records(pack_game(9, g, WIN_NONE, 1.7e9))
+    room_id, seed, started, ended, players, days, winner, teams, _, _ = header
+    assert (room_id, seed, players, days, winner, teams) == (9, 42, 8, 1, WIN_NONE, 0)
+    assert seats == [(qq, g.players[qq].number, int(g.players[qq].role_code), 0) for qq in g.seat_order]
+    number = {qq: p.number for qq, p in g.players.items()}
+    number[0] = 0
+    assert actions == [(kind, detail, r, number[actor], number[target])
+                       for kind, detail, r, actor, target in g.action_log]
+    assert (ACT_VOTE, 0, 1, 1, 2) in actions
+    assert (ACT_DEATH, actions[-1][1], 1, 0, 2) == actions[-1]
+    assert len(phases) == len(g.phase_log)
+
+
+def test_truncated_tail_is_ignored_and_bad_magic_raises(tmp_path):
+    room, _ = finished_room(tmp_path)
+    data = pack_game(9, room.game, WIN_NONE, 1.7e9)
+    assert len(list(unpack_records(data * 2 + data[:-1]))) == 2
+    with pytest.raises(ValueError):
+        list(unpack_records(b"XXXX" + data[len(MAGIC):]))
+
+
+def test_record_written_when_game_is_decided(tmp_path):
+    room, writer = finished_room(tmp_path)
+    g = room.game
+    # 只剩狼人和一名好人：下一次投票出局即分出胜负
+    goods = [qq for qq in g.seat_order if not g.players[qq].is_wolf and g.players[qq].alive]
+    for qq in goods[2:]:
+        g.kill_player(qq, "投票")
+    g.game_state = "discussion"  # 跳过描述
+    room.handle_message(HOST, "#结束讨论")
+    for qq in g.seat_order:
+        if g.players[qq].alive:
+            room.handle_message(qq, f"#投票{g.players[goods[0]].number}")
+    room.handle_message(HOST, "#结束投票")
+    assert g.game_state == "ended"
+    assert len(writer.pending) == 1
+    room.handle_message(HOST, "#结束游戏副本")
+    assert len(writer.pending) == 1  # 分出胜负时已打包，结束时不再重复
+    writer.flush()
+    (header, *_), = read_records(str(tmp_path))
+    assert header[6] == WIN_WOLF
+
+
+def test_aborted_game_is_recorded_without_winner(tmp_path):
+    room, writer = finished_room(tmp_path)
+    room.close()
+    (header, *_), = unpack_records(b"".join(writer.pending))
+    assert header[6] == WIN_NONE
@@ -0,0 +1,102 @@
+import asyncio
+
+from conftest import FIRST_QQ, HOST
+
+import game
+from journal import Journal
+from rooms import RoomRegistry
+
+
+def play(registry, group_id=7):
+    registry.handle_message(HOST, "#创建游戏副本", group_id=group_id)
+    for qq in range(FIRST_QQ, FIRST_QQ + 8):
+        registry.handle_message(qq, "#加入游戏副本", group_id=group_id)
+    registry.handle_message(HOST, "#开始游戏副本", group_id=group_id)
+    for qq in range(FIRST_QQ, FIRST_QQ + 8):
+        registry.handle_message(qq, f"#设置XP 猫耳{qq}", True)
+    room = registry.get(group_id)
+    wolf = room.game.wolf_players[0]
+    target = next(qq for qq in room.game.seat_order if not room.game.players[qq].is_wolf)
+    registry.handle_message(wolf, f"#袭击{room.game.players[target].number}", True)
+    registry.handle_message(HOST, "#结束夜晚", group_id=group_id)
+    return room
+
+
+def restored(directory):
+    journal = Journal(str(directory))
+    registry = RoomRegistry(lambda gid: game.XPLangBotPlugin(gid, journal=journal))
+    return registry, registry.restore(journal)
+
+
+def test_log_round_trip(tmp_path):
+    journal = Journal(str(tmp_path))
+    registry = RoomRegistry(lambda gid: game.XPLangBotPlugin(gid, journal=journal))
+    room = play(registry)
+    journal.flush()
+
+    copy, count = restored(tmp_path)
+    assert count == 1
+    assert copy.get(7).to_state() == room.to_state()
+    assert copy.room_of(FIRST_QQ) == 7
+
+
+def test_snapshot_plus_log_round_trip(tmp_path):
+    # 频繁写快照，恢复时从快照读起，再重放其后的几条日志
+    journal = Journal(str(tmp_path), snapshot_every=3)
+    registry = RoomRegistry(lambda gid: game.XPLangBotPlugin(gid, journal=journal))
+    room = play(registry)
+    journal.flush()
+    assert (tmp_path / "7.snap.json").exists()
+
+    copy, _ = restored(tmp_path)
+    assert copy.get(7).to_state() == room.to_state()
+
+
+def test_replies_match_after_restore(tmp_path):
+    journal = Journal(str(tmp_path))
+    registry = RoomRegistry(lambda gid: game.XPLangBotPlugin(gid, journal=journal))
+    room = play(registry)
+    journal.flush()
+    copy, _ = restored(tmp_path)
+
+    speaker = room.game.discussion_order[0]
+    for r in (registry, copy):
+        r.handle_message(speaker, "#描述 我喜欢猫", group_id=7)
+    assert copy.get(7).to_state() == room.to_state()
+
+
+def test_closed_room_is_dropped(tmp_path):
+    journal = Journal(str(tmp_path))
+    registry = RoomRegistry(lambda gid: game.XPLangBotPlugin(gid, journal=journal))
+    play(registry)
+    journal.flush()
+    registry.evict(7)
+    journal.flush()
+    assert restored(tmp_path)[1] == 0
+
+
+def test_failed_commit_keeps_writer_running(tmp_path, caplog):
+    journal = Journal(str(tmp_path), flush_interval=0.001)
+    write_batch = journal.write_batch
+    failures = [OSError("磁盘已满")]
+
+    def flaky(batch):
+        if failures:
+            raise failures.pop()
+        write_batch(batch)
+
+    journal.write_batch = flaky
+
+    async def main():
+        journal.start()
+        journal.append(1, ["c", 1, "#丢失", False])
+        await asyncio.sleep(0.05)
+        journal.append(1, ["c", 1, "#写入", False])
+        await asyncio.sleep(0.05)
+        assert not journal._task.done()
+        journal.stop()
+
+    asyncio.run(main())
+    assert "写入事件日志失败" in caplog.text
+    (_, _, entries), = journal.load()
+    assert [entry[2] for entry in entries] == ["#写入"]
@@ -0,0 +1,71 @@
+from conftest import start_room
+
+import game
+
+
+def mega_game():
+    # 12 名狼人加 1 名狼王，分成 3 支狼队
+    g = start_room(40, arg="狼人12").game
+    for qq in g.seat_order:
+        g.set_player_xp(qq, f"xp{qq}")
+    return g
+
+
+def test_wolves_are_split_into_teams():
+    g = mega_game()
+    assert g.mega
+    assert len(g.wolf_teams) == 3
+    members = [qq for team in g.wolf_teams for qq in team]
+    assert sorted(members) == sorted(qq for qq in g.seat_order if g.players[qq].is_wolf)
+    assert max(map(len, g.wolf_teams)) - min(map(len, g.wolf_teams)) <= 1
+    assert all(g.team_of[qq] == team for team, team_members in enumerate(g.wolf_teams) for qq in team_members)
+
+
+def test_each_team_attacks_separately():
+    g = mega_game()
+    goods = [qq for qq in g.seat_order if not g.players[qq].is_wolf]
+    first, second, third = (team[0] for team in g.wolf_teams)
+    g.wolf_attack(first, goods[0])
+    g.wolf_attack(second, goods[1])
+    # 第三队还没定目标，仍在等待名单中
+    pending = g.pending_actors()
+    assert set(g.wolf_teams[2]) & set(pending)
+    assert not set(g.wolf_teams[0]) & set(pending)
+    g.wolf_attack(third, goods[0])  # 与第一队同一目标，只死一次
+    g.end_night()
+    assert set(g.dead_players) == {goods[0], goods[1]}
+    assert g.last_words_qq is None  # 大型房间夜间出局不安排遗言
+
+
+def test_speaking_is_grouped():
+    g = mega_game()
+    g.end_night()
+    group = g.speaking_group()
+    assert len(group) == game.MEGA_SPEAK_GROUP
+    outsider = g.discussion_order[game.MEGA_SPEAK_GROUP]
+    assert g.player_describe(outsider, "x") == "还没轮到你描述"
+    for qq in group[:-1]:
+        assert "本组还剩" in g.player_describe(qq, "x")
+    assert g.player_describe(group[0], "x") == "你已经描述过了"
+    info = g.player_describe(group[-1], "x")
+    assert g.current_player_index == game.MEGA_SPEAK_GROUP
+    assert g.numbers_text(g.speaking_group()) in info
+
+
+def test_silent_group_times_out():
+    g = mega_game()
+    g.end_night()
+    group = g.speaking_group()
+    g.player_describe(group[0], "x")
+    info = g.skip_speaker()
+    assert info.startswith("本组描述时间到")
+    assert g.numbers_text(group[1:]) in info
+    assert g.current_player_index == game.MEGA_SPEAK_GROUP
+
+
+def test_wolf_override_below_one_is_rejected():
+    g = game.XPLangGame()
+    players = [(1000 + i, i + 1) for i in range(21)]
+    assert g.start_game(players, {"狼人": 0, "狼王": 0}) == "狼人阵营至少需要1人"
+    assert g.game_state == "waiting"
+    assert not g.players
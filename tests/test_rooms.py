@@ -0,0 +1,29 @@
+from conftest import HOST
+
+import game
+from rooms import NO_ROOM_REPLY, RoomRegistry
+
+
+def registry(**kwargs):
+    return RoomRegistry(game.XPLangBotPlugin, queries=game.READ_ONLY_COMMANDS, **kwargs)
+
+
+def test_only_create_allocates_a_room():
+    r = registry()
+    assert r.handle_message(HOST, "#加入游戏副本", group_id=1) == NO_ROOM_REPLY
+    assert r.handle_message(HOST, "#随便什么", group_id=1) == NO_ROOM_REPLY
+    assert r.handle_message(HOST, "#战绩排行", group_id=1) == "未启用战绩统计"
+    assert len(r) == 0
+    r.handle_message(HOST, "#创建游戏副本", group_id=1)
+    assert len(r) == 1
+    assert r.handle_message(2, "#加入游戏副本", group_id=1) == "你已加入游戏副本，当前人数: 1"
+    assert r.room_of(2) == 1
+
+
+def test_stray_commands_do_not_evict_live_rooms():
+    r = registry(max_rooms=1, shard_count=1)
+    r.handle_message(HOST, "#创建游戏副本", group_id=1)
+    for group_id in range(2, 50):
+        r.handle_message(HOST, "#查看状态", group_id=group_id)
+    assert r.get(1) is not None
+    assert r.evicted_count == 0
@@ -0,0 +1,50 @@
+from conftest import start_room
+
+
+def voting_game(players=8):
+    g = start_room(players).game
+    g.start_voting()
+    return g
+
+
+def test_no_votes_goes_to_night():
+    g = voting_game()
+    assert g.end_voting() == "无人投票，进入夜晚"
+    assert g.game_state == "night"
+    assert not g.dead_players
+
+
+def test_tie_kills_nobody():
+    g = voting_game()
+    a, b, c, d = g.seat_order[:4]
+    g.vote(a, c)
+    g.vote(b, d)
+    info = g.end_voting()
+    assert info.startswith("平票，无人出局")
+    assert g.game_state == "night"
+    assert not g.dead_players
+    assert g.last_words_qq is None
+
+
+def test_changed_vote_breaks_the_tie():
+    g = voting_game()
+    a, b, c, d = g.seat_order[:4]
+    g.vote(a, c)
+    g.vote(b, d)
+    g.vote(b, c)  # 改票
+    assert g.tally.counts == {c: 2}
+    info = g.end_voting()
+    assert info.startswith(f"{g.players[c].number}号玩家被投票出局")
+    assert not g.players[c].alive
+    assert g.death_causes[c] == "投票"
+    assert g.last_words_qq == c
+    assert not g.check_consistency()
+
+
+def test_dead_players_cannot_vote_or_be_voted():
+    g = voting_game()
+    a, b, c = g.seat_order[:3]
+    g.kill_player(c, "投票")
+    assert g.vote(c, a) == "你已死亡，无法投票"
+    assert g.vote(a, c) == "目标玩家不存在或已死亡"
+    assert not g.votes
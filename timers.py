@@ -0,0 +1,140 @@
+"""
+分层时间轮：所有房间的发言、讨论、遗言倒计时共用一个 asyncio 任务
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """时间轮中的一个定时器，cancel() 为 O(1)"""
+    __slots__ = ("wheel", "expires", "callback", "args", "cancelled", "bucket")
+
+    def __init__(self, wheel: "TimingWheel", expires: int, callback: Callable, args: tuple):
+        self.wheel = wheel
+        self.expires = expires  # 到期的刻度序号
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.bucket: Optional[Set["TimerHandle"]] = None
+
+    def cancel(self):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self.bucket is not None:
+            self.bucket.discard(self)
+            self.bucket = None
+        self.wheel.pending -= 1
+        self.callback = None
+        self.args = ()
+
+
+class TimingWheel:
+    """
+    分层时间轮。
+
+    第0层每格一个刻度，第n层每格 slots**n 个刻度；定时器按剩余刻度放入
+    能容纳它的最低一层，低层转完一圈时把上一层当前格中的定时器下放。
+    插入和取消都是 O(1)，推进一个刻度只处理当格的定时器，与挂起的
+    定时器总数无关。
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 3,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.origin = clock()
+        self.current_tick = 0
+        self.wheels: List[List[Set[TimerHandle]]] = [
+            [set() for _ in range(slots)] for _ in range(levels)
+        ]
+        self.spans = [slots ** level for level in range(levels + 1)]
+        self.pending = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """delay 秒后调用 callback(*args)，精度为一个刻度"""
+        ticks = max(1, -int(-delay // self.tick))  # 向上取整，至少一个刻度
+        elapsed = (self.clock() - self.origin) / self.tick
+        handle = TimerHandle(self, max(self.current_tick, int(elapsed)) + ticks, callback, args)
+        self._insert(handle)
+        self.pending += 1
+        return handle
+
+    def _insert(self, handle: TimerHandle):
+        delta = handle.expires - self.current_tick
+        spans = self.spans
+        for level in range(self.levels):
+            if delta < spans[level + 1]:
+                break
+        else:
+            level = self.levels - 1  # 超出范围的放在最高层最远的格，下放时重新计算
+        expires = min(handle.expires, self.current_tick + spans[self.levels] - 1)
+        bucket = self.wheels[level][(expires // spans[level]) % self.slots]
+        bucket.add(handle)
+        handle.bucket = bucket
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """推进到当前时间，触发所有到期定时器，返回触发数量"""
+        if now is None:
+            now = self.clock()
+        target = int((now - self.origin) / self.tick)
+        fired = 0
+        while self.current_tick < target:
+            self.current_tick += 1
+            fired += self._run_tick(self.current_tick)
+        return fired
+
+    def _run_tick(self, tick: int) -> int:
+        # 从高层到低层依次下放，保证下放到当格的定时器本刻度就能触发
+        for level in range(self.levels - 1, 0, -1):
+            if tick % self.spans[level] == 0:
+                index = (tick // self.spans[level]) % self.slots
+                bucket = self.wheels[level][index]
+                self.wheels[level][index] = set()
+                for handle in bucket:
+                    self._insert(handle)
+
+        index = tick % self.slots
+        bucket = self.wheels[0][index]
+        self.wheels[0][index] = set()
+        fired = 0
+        for handle in tuple(bucket):  # 回调中可能取消同一格的其他定时器
+            if handle.cancelled:
+                continue
+            if handle.expires > tick:
+                self._insert(handle)  # 还没到期（超出范围后被下放的定时器）
+                continue
+            callback, args = handle.callback, handle.args
+            handle.bucket = None
+            handle.cancel()
+            fired += 1
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("定时器回调出错")
+        return fired
+
+    async def run(self):
+        """在事件循环中按刻度推进时间轮"""
+        while True:
+            next_at = self.origin + (self.current_tick + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_at - self.clock()))
+            self.advance()
+
+    def start(self):
+        """在当前事件循环上启动时间轮任务"""
+        if self._task is None or self._task.done():
+            self.origin = self.clock() - self.current_tick * self.tick
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
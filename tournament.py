@@ -0,0 +1,343 @@
+"""
+策略锦标赛：让脚本玩家策略在真实的 XPLangGame 上两两对战，给出 Elo 等级分
+
+每场对局一方策略操控全部好人，另一方操控全部狼人；每对策略交换阵营
+各打一遍，且两遍使用相同的种子，抵消阵营本身的胜率差。对局按批分给
+进程池，每个工作进程只导入一次游戏模块，并复用同一个游戏实例；结果
+按批流式汇总，最后用 Bradley-Terry 模型拟合出 Elo 风格的等级分。
+
+用法:
+  python tournament.py [--games N] [--workers K] [--strategies random,quiet,...]
+"""
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from game import XPLangGame  # noqa: E402
+
+
+class Table:
+    """一局中所有玩家都能看到的公开信息，策略只应通过它做决定"""
+
+    def __init__(self, game: XPLangGame, rnd: random.Random):
+        self.game = game
+        self.rnd = rnd
+        self.talk: Dict[int, int] = {}  # {qq: 描述累计字数}
+        self.revealed: Dict[int, str] = {}  # {qq: 已公开的身份}
+
+    def alive(self, exclude: Optional[int] = None) -> List[int]:
+        return [qq for qq in self.game.seat_order if self.game.is_alive(qq) and qq != exclude]
+
+    def teammates(self, wolf_qq: int) -> List[int]:
+        """狼人彼此知道身份"""
+        return [qq for qq, p in self.game.players.items() if p.is_wolf and qq != wolf_qq]
+
+    def suspects(self, qq_id: int) -> List[int]:
+        """可以投票或下手的对象：除自己外的存活玩家，狼人另外排除队友"""
+        candidates = self.alive(exclude=qq_id)
+        if self.game.players[qq_id].is_wolf:
+            mates = set(self.teammates(qq_id))
+            candidates = [qq for qq in candidates if qq not in mates]
+        return candidates
+
+
+class Strategy:
+    """随机行动的基础策略，子类覆盖需要改变的决定；返回 None 表示不行动"""
+    name = "random"
+    poison_rate = 0.3
+    duel_rate = 0.2
+
+    def describe(self, table: Table, qq_id: int) -> str:
+        # 狼人要现编 XP，默认描述得更短
+        if table.game.players[qq_id].is_wolf:
+            return "嗯" * table.rnd.randint(5, 40)
+        return "嗯" * table.rnd.randint(10, 60)
+
+    def attack(self, table: Table, wolf_qq: int) -> Optional[int]:
+        return self.pick(table, table.suspects(wolf_qq))
+
+    def poison(self, table: Table, witch_qq: int) -> Optional[int]:
+        if table.rnd.random() < self.poison_rate:
+            return self.pick(table, table.alive(exclude=witch_qq))
+        return None
+
+    def duel(self, table: Table, knight_qq: int) -> Optional[int]:
+        if table.rnd.random() < self.duel_rate:
+            return self.pick(table, table.alive(exclude=knight_qq))
+        return None
+
+    def vote(self, table: Table, voter_qq: int) -> Optional[int]:
+        return self.pick(table, table.suspects(voter_qq))
+
+    def take(self, table: Table, king_qq: int) -> Optional[int]:
+        return self.pick(table, table.suspects(king_qq))
+
+    @staticmethod
+    def pick(table: Table, candidates: List[int]) -> Optional[int]:
+        return table.rnd.choice(candidates) if candidates else None
+
+
+class QuietVoter(Strategy):
+    """投给描述最少的玩家"""
+    name = "quiet"
+
+    def vote(self, table: Table, voter_qq: int) -> Optional[int]:
+        candidates = table.suspects(voter_qq)
+        if not candidates:
+            return None
+        least = min(table.talk.get(qq, 0) for qq in candidates)
+        return table.rnd.choice([qq for qq in candidates if table.talk.get(qq, 0) == least])
+
+
+class Bandwagon(Strategy):
+    """跟票：投给当前票数最多的玩家"""
+    name = "bandwagon"
+
+    def vote(self, table: Table, voter_qq: int) -> Optional[int]:
+        candidates = set(table.suspects(voter_qq))
+        counts: Dict[int, int] = {}
+        for target in table.game.votes.values():
+            if target in candidates:
+                counts[target] = counts.get(target, 0) + 1
+        if not counts:
+            return super().vote(table, voter_qq)
+        top = max(counts.values())
+        return table.rnd.choice([qq for qq, c in counts.items() if c == top])
+
+
+class KnightHunter(Strategy):
+    """狼人优先袭击已公开的骑士，否则袭击发言最多的好人"""
+    name = "knight_hunter"
+
+    def attack(self, table: Table, wolf_qq: int) -> Optional[int]:
+        candidates = table.suspects(wolf_qq)
+        revealed = [qq for qq in candidates if table.revealed.get(qq) == "骑士"]
+        if revealed:
+            return revealed[0]
+        if not candidates:
+            return None
+        most = max(table.talk.get(qq, 0) for qq in candidates)
+        return table.rnd.choice([qq for qq in candidates if table.talk.get(qq, 0) == most])
+
+
+class Mimic(Strategy):
+    """狼人模仿好人的描述长度"""
+    name = "mimic"
+
+    def describe(self, table: Table, qq_id: int) -> str:
+        return "嗯" * table.rnd.randint(10, 60)
+
+
+STRATEGIES = {cls.name: cls() for cls in (Strategy, QuietVoter, Bandwagon, KnightHunter, Mimic)}
+
+GOOD, WOLF, UNDECIDED = 0, 1, 2
+
+
+def play_game(game: XPLangGame, seed: int, good: Strategy, wolf: Strategy, max_days: int = 30) -> int:
+    """用两个策略在 game 上打一局，返回 GOOD / WOLF / UNDECIDED"""
+    game.reset_game()
+    game.reseed(seed)
+    # 策略与发牌各用一个随机源，同一个种子会让两者相关
+    table = Table(game, random.Random(f"strategy-{seed}"))
+    player_count = 8 + seed % 13
+    game.start_game([(qq, qq) for qq in range(1, player_count + 1)])
+
+    def strategy(qq_id: int) -> Strategy:
+        return wolf if game.players[qq_id].is_wolf else good
+
+    def after_phase() -> Optional[int]:
+        if game.game_state == "ended":
+            return GOOD if game.alive_wolf_count == 0 else WOLF
+        king = game.wolf_king_killed
+        if king is not None:
+            target = wolf.take(table, king)
+            if target is not None:
+                game.wolf_king_skill(king, target)
+        if game.last_words_qq is not None:
+            game.end_last_words()
+        return None
+
+    witch = game.special_roles.get("女巫")
+    knight = game.special_roles.get("骑士")
+    for _ in range(max_days):
+        # 袭击由狼人（不含狼王）提交
+        if game.wolf_players:
+            target = wolf.attack(table, game.wolf_players[0])
+            if target is not None:
+                game.wolf_attack(game.wolf_players[0], target)
+        if witch is not None and game.is_alive(witch) and "poison_used" not in game.night_actions:
+            target = good.poison(table, witch)
+            if target is not None:
+                game.witch_poison(witch, target)
+        game.end_night()
+        result = after_phase()
+        if result is not None:
+            return result
+
+        if knight is not None and game.is_alive(knight) and not game.knight_used:
+            target = good.duel(table, knight)
+            if target is not None:
+                game.knight_duel(knight, target)
+                table.revealed[knight] = "骑士"
+        if game.game_state == "night":
+            continue
+
+        while game.game_state == "day":
+            speaker = game.discussion_order[game.current_player_index]
+            text = strategy(speaker).describe(table, speaker)
+            table.talk[speaker] = table.talk.get(speaker, 0) + len(text)
+            game.player_describe(speaker, text)
+
+        game.start_voting()
+        for voter in table.alive():
+            target = strategy(voter).vote(table, voter)
+            if target is not None:
+                game.vote(voter, target)
+        game.end_voting()
+        result = after_phase()
+        if result is not None:
+            return result
+    return UNDECIDED
+
+
+# 工作进程里常驻的游戏实例
+_engine: Optional[XPLangGame] = None
+
+
+def _init_worker():
+    global _engine
+    _engine = XPLangGame()
+
+
+def _run_batch(task: Tuple[str, str, int, int]) -> Tuple[str, str, List[int]]:
+    """打一批对局，返回 (好人策略, 狼人策略, [好人胜, 狼人胜, 未分胜负])"""
+    good, wolf, first_seed, count = task
+    if _engine is None:
+        _init_worker()
+    counts = [0, 0, 0]
+    for seed in range(first_seed, first_seed + count):
+        counts[play_game(_engine, seed, STRATEGIES[good], STRATEGIES[wolf])] += 1
+    return good, wolf, counts
+
+
+def make_tasks(names: List[str], games: int, batch: int, seed: int = 0) -> Iterator[Tuple[str, str, int, int]]:
+    """每对策略交换阵营各打 games 局，两边用同一组种子"""
+    for index, (a, b) in enumerate(itertools.combinations(names, 2)):
+        base = seed + index * games
+        for start in range(0, games, batch):
+            count = min(batch, games - start)
+            yield a, b, base + start, count
+            yield b, a, base + start, count
+
+
+def elo_ratings(wins: Dict[Tuple[str, str], float], names: List[str], iterations: int = 200) -> Dict[str, float]:
+    """
+    由两两胜场拟合 Bradley-Terry 强度，换算成 Elo 分（平均 1500）。
+    wins[(a, b)] 为 a 胜 b 的局数，未分胜负记各半场。
+    """
+    strength = {name: 1.0 for name in names}
+    for _ in range(iterations):
+        updated = {}
+        for a in names:
+            total_wins = sum(wins.get((a, b), 0.0) for b in names if b != a)
+            denominator = sum((wins.get((a, b), 0.0) + wins.get((b, a), 0.0)) / (strength[a] + strength[b])
+                              for b in names if b != a)
+            updated[a] = max(total_wins, 1e-9) / denominator if denominator else strength[a]
+        # 几何平均归一
+        scale = math.exp(sum(math.log(s) for s in updated.values()) / len(updated))
+        strength = {name: s / scale for name, s in updated.items()}
+    return {name: 1500 + 400 * math.log10(s) for name, s in strength.items()}
+
+
+class Standings:
+    """流式汇总各批次的结果"""
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.games = 0
+        self.by_side: Dict[Tuple[str, str], List[int]] = {}  # {(好人策略, 狼人策略): 计数}
+
+    def add(self, good: str, wolf: str, counts: List[int]):
+        total = self.by_side.setdefault((good, wolf), [0, 0, 0])
+        for i, c in enumerate(counts):
+            total[i] += c
+        self.games += sum(counts)
+
+    def pairwise_wins(self) -> Dict[Tuple[str, str], float]:
+        wins: Dict[Tuple[str, str], float] = {}
+        for (good, wolf), (good_wins, wolf_wins, undecided) in self.by_side.items():
+            wins[(good, wolf)] = wins.get((good, wolf), 0.0) + good_wins + undecided / 2
+            wins[(wolf, good)] = wins.get((wolf, good), 0.0) + wolf_wins + undecided / 2
+        return wins
+
+    def ratings(self) -> Dict[str, float]:
+        return elo_ratings(self.pairwise_wins(), self.names)
+
+
+def run_tournament(names: List[str], games: int, workers: int, batch: int = 50, seed: int = 0,
+                   progress=None) -> Standings:
+    """在 workers 个进程上打完所有对局；workers 为 1 时在当前进程中执行"""
+    standings = Standings(names)
+    tasks = make_tasks(names, games, batch, seed)
+    if workers <= 1:
+        results = map(_run_batch, tasks)
+        for result in results:
+            standings.add(*result)
+            if progress:
+                progress(standings)
+        return standings
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_run_batch, tasks):
+            standings.add(*result)
+            if progress:
+                progress(standings)
+    return standings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000, help="每对策略每个阵营的局数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=50, help="每个任务包含的局数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    args = parser.parse_args()
+
+    names = args.strategies.split(",")
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown or len(names) < 2:
+        sys.exit(f"至少需要两个策略，可选: {', '.join(STRATEGIES)}")
+
+    total = len(names) * (len(names) - 1) * args.games
+    last_report = [time.perf_counter()]
+
+    def progress(standings: Standings):
+        now = time.perf_counter()
+        if now - last_report[0] >= 5:
+            last_report[0] = now
+            print(f"已完成 {standings.games}/{total} 局", file=sys.stderr)
+
+    start = time.perf_counter()
+    standings = run_tournament(names, args.games, args.workers, args.batch, args.seed, progress)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'策略':<14}{'Elo':>7}{'好人胜率':>10}{'狼人胜率':>10}")
+    ratings = standings.ratings()
+    for name in sorted(names, key=lambda n: -ratings[n]):
+        as_good = [c for (g, _), c in standings.by_side.items() if g == name]
+        as_wolf = [c for (_, w), c in standings.by_side.items() if w == name]
+        good_rate = sum(c[GOOD] for c in as_good) / max(1, sum(sum(c) for c in as_good))
+        wolf_rate = sum(c[WOLF] for c in as_wolf) / max(1, sum(sum(c) for c in as_wolf))
+        print(f"{name:<14}{ratings[name]:>7.0f}{good_rate:>12.1%}{wolf_rate:>12.1%}")
+    print(f"共 {standings.games} 局，{args.workers} 个进程，{elapsed:.1f} 秒，{standings.games / elapsed:,.0f} 局/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+描述记录：保存当天每名玩家的 #描述，供自由讨论时由主持人统一转发
+
+内存按 UTF-8 字节预算限制：每名玩家每天、以及整个房间每天各有上限，
+超出部分截断不存。记录时就把内容排进分段，每段不超过单条消息的长度
+上限，转发和查看时只需拼上页码，不必重新排版整天的记录。
+"""
+from typing import Dict, List, Tuple
+
+HEADER_RESERVE = 32  # 每段开头页码行预留的长度
+ELLIPSIS = "……"
+
+
+def cut_bytes(text: str, budget: int) -> str:
+    """截取 text 中 UTF-8 编码不超过 budget 字节的前缀，不拆开多字节字符"""
+    data = text.encode("utf-8")
+    if len(data) <= budget:
+        return text
+    return data[:max(budget, 0)].decode("utf-8", "ignore")
+
+
+class Transcript:
+    """一个房间当天的描述记录"""
+    __slots__ = ("player_budget", "day_budget", "chunk_length", "day", "entries", "spent", "total",
+                 "sealed", "tail", "truncated")
+
+    def __init__(self, player_budget: int = 600, day_budget: int = 12000, chunk_length: int = 1500):
+        self.player_budget = player_budget  # 每名玩家每天最多记录的字节数
+        self.day_budget = day_budget  # 整个房间每天最多记录的字节数
+        self.chunk_length = chunk_length  # 单条消息的长度上限，与出站队列一致
+        self.clear()
+
+    def clear(self, day: int = 0):
+        self.day = day
+        self.entries: List[Tuple[int, str, bool]] = []  # (编号, 内容, 是否被截断)
+        self.spent: Dict[int, int] = {}  # {编号: 已记录字节数}
+        self.total = 0
+        self.sealed: List[str] = []  # 已排满的分段
+        self.tail = ""  # 正在排的分段
+        self.truncated = 0  # 被截断的描述条数
+
+    def add(self, number: int, text: str, cut: bool = False) -> bool:
+        """记录一条描述，返回内容是否被截断"""
+        if not text:
+            return False
+        budget = min(self.player_budget - self.spent.get(number, 0), self.day_budget - self.total)
+        kept = cut_bytes(text, budget)
+        cut = cut or kept != text
+        if cut:
+            self.truncated += 1
+        if not kept:
+            return cut
+        size = len(kept.encode("utf-8"))
+        self.spent[number] = self.spent.get(number, 0) + size
+        self.total += size
+        self.entries.append((number, kept, cut))
+        self.append_line(f"{number}号：{kept}{ELLIPSIS if cut else ''}")
+        return cut
+
+    def append_line(self, line: str):
+        limit = self.chunk_length - HEADER_RESERVE
+        while line:
+            if self.tail and len(self.tail) + 1 + len(line) > limit:
+                self.sealed.append(self.tail)
+                self.tail = ""
+            if self.tail:
+                self.tail += "\n" + line
+                return
+            # 单行超长时硬切
+            self.tail, line = line[:limit], line[limit:]
+
+    def __len__(self) -> int:
+        """分段数"""
+        return len(self.sealed) + (1 if self.tail else 0)
+
+    def chunk(self, index: int) -> str:
+        """第 index 段（从 0 开始），带页码"""
+        count = len(self)
+        body = self.sealed[index] if index < len(self.sealed) else self.tail
+        return f"第{self.day}天描述回顾（{index + 1}/{count}）：\n{body}"
+
+    def to_state(self) -> list:
+        return [[number, text, cut] for number, text, cut in self.entries]
+
+    def load_state(self, day: int, entries: list):
+        self.clear(day)
+        for number, text, cut in entries:
+            self.add(number, text, cut)